@@ -29,6 +29,73 @@ def benchmark_encoder_isr():
     print(f"Time for {N} calls: {b-a}s")
     print(f"Time per call: {(b-a)/N}s") # ~0.06 ms per call
 
+def benchmark_pid_update():
+    from XRPLib.pid import PID
+    from XRPLib.fixed_point_pid import FixedPointPID
+    import gc
+    print("start benchmark")
+    N = 10000
+    for controller in (PID(kp=0.035, ki=0.03), FixedPointPID(kp=0.035, ki=0.03)):
+        gc.collect()
+        mem = gc.mem_alloc()
+        a = time.ticks_us()
+        for i in range(N):
+            controller.update_with_timestep(0.5, 0.02)
+        b = time.ticks_us()
+        print(f"{type(controller).__name__}: {time.ticks_diff(b, a)/N}us and {(gc.mem_alloc()-mem)/N} bytes allocated per update")
+    controller = FixedPointPID(kp=0.035, ki=0.03)
+    gc.collect()
+    mem = gc.mem_alloc()
+    a = time.ticks_us()
+    for i in range(N):
+        controller.update_fixed(128, 20000)
+    b = time.ticks_us()
+    print(f"FixedPointPID.update_fixed: {time.ticks_diff(b, a)/N}us and {(gc.mem_alloc()-mem)/N} bytes allocated per update")
+
+def benchmark_imu_read():
+    import gc
+    print("start benchmark")
+    N = 1000
+    for getter in (imu.get_acc_x, imu.get_gyro_z_rate, imu.get_acc_rates, imu.get_gyro_rates, imu.get_acc_gyro_rates):
+        gc.collect()
+        mem = gc.mem_alloc()
+        a = time.ticks_us()
+        for i in range(N):
+            getter()
+        b = time.ticks_us()
+        # Float results are heap objects in MicroPython, so the conversions still allocate a few bytes
+        print(f"{getter.__name__}: {time.ticks_diff(b, a)/N}us and {(gc.mem_alloc()-mem)/N} bytes allocated per call")
+
+def benchmark_mahony_update():
+    from XRPLib.mahony_filter import MahonyFilter
+    import gc
+    print("start benchmark")
+    fusion = MahonyFilter()
+    N = 1000
+    gc.collect()
+    mem = gc.mem_alloc()
+    a = time.ticks_us()
+    for i in range(N):
+        fusion.update(0.01, -0.02, 0.03, 0.0, 0.01, 1.0, 0.0048)
+    b = time.ticks_us()
+    print(f"MahonyFilter: {time.ticks_diff(b, a)/N}us and {(gc.mem_alloc()-mem)/N} bytes allocated per update")
+
+def benchmark_odometry_update():
+    import gc
+    print("start benchmark")
+    odometry = drivetrain.get_odometry()
+    N = 1000
+    gc.collect()
+    mem = gc.mem_alloc()
+    a = time.ticks_us()
+    for i in range(N):
+        odometry._update()
+    b = time.ticks_us()
+    print(f"Odometry: {time.ticks_diff(b, a)/N}us and {(gc.mem_alloc()-mem)/N} bytes allocated per update")
+    # The same, measured by the control scheduler while the odometry runs from it
+    time.sleep(2)
+    print(f"Odometry task: {odometry._task.runs} runs, last {odometry._task.last_us}us, max {odometry._task.max_us}us")
+
 def test_turns():
     drivetrain.turn(45, 0.5)
     time.sleep(1)
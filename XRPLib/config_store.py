@@ -0,0 +1,112 @@
+import uasyncio as asyncio
+import json
+import os
+import time
+
+class ConfigStore:
+
+    def __init__(self, path: str, defaults: dict, flush_delay_ms: int = 5000):
+        """
+        A small JSON settings file on flash.
+        The file is only read on the first get()/set(), and changes are held in RAM for up to
+        flush_delay_ms before being written, so a burst of changes costs a single flash write.
+        Writes go to a temporary file that is then renamed over the old one, so a reset
+        mid-write leaves either the old or the new settings, never a truncated file.
+
+        :param path: The file to store the settings in
+        :type path: str
+        :param defaults: The value of every setting, used for keys missing from the file
+        :type defaults: dict
+        :param flush_delay_ms: The longest a change is held in RAM before being written
+        :type flush_delay_ms: int
+        """
+        self.path = path
+        self.defaults = defaults
+        self.flush_delay_ms = flush_delay_ms
+
+        self._data = None
+        self._dirty = False
+        self._deadline = 0
+
+    def _load(self):
+        data = {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                data = {}
+        except OSError:
+            pass  # No saved settings yet
+        except ValueError as e:
+            print("Config file unreadable, using defaults:", e)
+            data = {}
+        for key in self.defaults:
+            if key not in data:
+                data[key] = self.defaults[key]
+        self._data = data
+
+    def get(self, key: str):
+        """
+        :return: The saved value of a setting, or its default
+        """
+        if self._data is None:
+            self._load()
+        return self._data[key]
+
+    def set(self, key: str, value):
+        """
+        Change a setting. The change is written to flash by the next flush(), at most
+        flush_delay_ms after the first unsaved change.
+        Setting a list that was returned by get() and then modified in place is allowed.
+
+        :param key: The setting to change
+        :type key: str
+        :param value: The new value; must be JSON serializable
+        """
+        if self._data is None:
+            self._load()
+        self._data[key] = value
+        if not self._dirty:
+            self._dirty = True
+            self._deadline = time.ticks_add(time.ticks_ms(), self.flush_delay_ms)
+
+    def is_dirty(self) -> bool:
+        """
+        :return: True if there are changes that haven't been written to flash yet
+        :rtype: bool
+        """
+        return self._dirty
+
+    def flush(self):
+        """
+        Write any unsaved changes to flash now.
+        """
+        if not self._dirty:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._data, f)
+        os.rename(tmp, self.path)
+        self._dirty = False
+
+    def flush_if_due(self):
+        """
+        Write unsaved changes to flash if they've been held for flush_delay_ms, for callers that poll
+        instead of running autosave(). A failed write is retried after another delay.
+        """
+        if self._dirty and time.ticks_diff(time.ticks_ms(), self._deadline) >= 0:
+            try:
+                self.flush()
+            except OSError as e:
+                # Keep the changes and try again after another delay
+                print("Config save failed:", e)
+                self._deadline = time.ticks_add(time.ticks_ms(), self.flush_delay_ms)
+
+    async def autosave(self, poll_ms: int = 500):
+        """
+        A task that flushes changes once their delay has passed;
+        start it once with asyncio.create_task(store.autosave()).
+        """
+        while True:
+            await asyncio.sleep_ms(poll_ms)
+            self.flush_if_due()
@@ -0,0 +1,207 @@
+from machine import Timer
+import time
+
+class ControlTask:
+
+    def __init__(self, callback, phase: int, divider: int, budget_us: int, name: str):
+        """
+        A periodic task run by the ControlScheduler. Use ControlScheduler.add_task() to create one.
+        """
+        self.callback = callback
+        self.phase = phase
+        self.divider = divider
+        self.budget_us = budget_us
+        self.name = name
+        self._countdown = 1
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.runs = 0
+        self.overruns = 0
+        self.errors = 0
+        self.last_us = 0
+        self.max_us = 0
+
+
+class ControlScheduler:
+
+    # Phases, run in this order every tick
+    ENCODER = 0
+    SPEED = 1
+    IMU = 2
+    USER = 3
+
+    _DEFAULT_CONTROL_SCHEDULER_INSTANCE = None
+
+    @classmethod
+    def get_default_control_scheduler(cls):
+        """
+        Get the default control scheduler, shared by the motors and the IMU. This is a singleton, so only one instance will ever exist.
+        """
+        if cls._DEFAULT_CONTROL_SCHEDULER_INSTANCE is None:
+            cls._DEFAULT_CONTROL_SCHEDULER_INSTANCE = cls()
+        return cls._DEFAULT_CONTROL_SCHEDULER_INSTANCE
+
+    def __init__(self, rate_hz: int = 200):
+        """
+        Runs periodic control tasks from a single virtual timer, in a fixed order every tick:
+        encoder sampling, then speed control, then IMU integration, then user tasks.
+        Tasks can run at a fraction of the base rate, and the time each task and each whole
+        tick takes is measured, so tasks that overrun their budget can be found.
+
+        :param rate_hz: The base tick rate; every task's rate is this divided by its divider
+        :type rate_hz: int
+        """
+        self.rate_hz = rate_hz
+        self.period_us = 1000000 // rate_hz
+        self._tasks = []
+        # Base ticks per timer callback: the gcd of the task dividers, so the timer
+        # doesn't fire on ticks where no task is due
+        self._step = 1
+        # Use a virtual timer so we can leave the hardware timers up for the user
+        self._timer = Timer(-1)
+        self._running = False
+        self.reset_stats()
+
+    def add_task(self, callback, phase: int = USER, divider: int = 1, budget_us: int = None, name: str = None) -> ControlTask:
+        """
+        Register a function to be called periodically. The scheduler starts with its first task.
+
+        :param callback: The function to call, with no arguments
+        :type callback: function
+        :param phase: When in each tick to run: ControlScheduler.ENCODER, SPEED, IMU or USER
+        :type phase: int
+        :param divider: Run once every this many ticks
+        :type divider: int
+        :param budget_us: The run time above which a run counts as an overrun; defaults to one base tick
+        :type budget_us: int
+        :param name: A name to report the task's stats under
+        :type name: str
+        :return: The task, for remove_task() and its stats
+        :rtype: ControlTask
+        """
+        if divider < 1:
+            raise ValueError("divider must be >= 1")
+        task = ControlTask(callback, phase, divider,
+                           self.period_us if budget_us is None else budget_us,
+                           name if name is not None else getattr(callback, "__name__", "task"))
+        # Tasks with the same divider run on the same ticks, so later phases see that tick's results
+        for other in self._tasks:
+            if other.divider == divider:
+                task._countdown = other._countdown
+                break
+        # Keep tasks sorted by phase; tasks in the same phase run in the order they were added
+        i = len(self._tasks)
+        while i > 0 and self._tasks[i - 1].phase > phase:
+            i -= 1
+        self._tasks.insert(i, task)
+        self._update_step()
+        if not self._running:
+            self.start()
+        return task
+
+    def remove_task(self, task: ControlTask):
+        """
+        Stop running a task. Removing a task that isn't registered does nothing.
+        """
+        if task in self._tasks:
+            self._tasks.remove(task)
+            self._update_step()
+
+    def _update_step(self):
+        step = 0
+        for task in self._tasks:
+            a, b = task.divider, step
+            while b:
+                a, b = b, a % b
+            step = a
+        step = max(1, step)
+        if step != self._step:
+            self._step = step
+            if self._running:
+                self.start()
+
+    def get_rate(self, task: ControlTask) -> float:
+        """
+        :return: How often the task runs, in Hz
+        :rtype: float
+        """
+        return self.rate_hz / task.divider
+
+    def start(self):
+        """
+        Start ticking; called automatically when the first task is added.
+        """
+        self._running = True
+        self._timer.init(freq=self.rate_hz / self._step, callback=lambda t: self._tick())
+
+    def stop(self):
+        """
+        Stop ticking. Registered tasks are kept and resume on start().
+        """
+        self._running = False
+        self._timer.deinit()
+
+    def reset_stats(self):
+        """
+        Clear the cycle-time stats and every task's counters.
+        """
+        self.cycles = 0
+        self.overruns = 0
+        self.last_cycle_us = 0
+        self.max_cycle_us = 0
+        self._total_cycle_us = 0
+        for task in self._tasks:
+            task.reset_stats()
+
+    def get_stats(self) -> dict:
+        """
+        :return: The number of timer callbacks, how many took longer than the time between them, the last, mean and
+                 max tick times (us), and per task its runs, overruns, errors and max run time (us)
+        :rtype: dict
+        """
+        return {
+            "cycles": self.cycles,
+            "overruns": self.overruns,
+            "last_us": self.last_cycle_us,
+            "mean_us": self._total_cycle_us // self.cycles if self.cycles else 0,
+            "max_us": self.max_cycle_us,
+            "tasks": [
+                {"name": t.name, "phase": t.phase, "rate_hz": self.get_rate(t), "runs": t.runs,
+                 "overruns": t.overruns, "errors": t.errors, "max_us": t.max_us}
+                for t in self._tasks
+            ],
+        }
+
+    def _tick(self):
+        cycle_start = time.ticks_us()
+        step = self._step
+        for task in self._tasks:
+            task._countdown -= step
+            if task._countdown > 0:
+                continue
+            task._countdown = task.divider
+            start = time.ticks_us()
+            try:
+                task.callback()
+            except Exception as e:
+                # Keep the other tasks running; only report the first failure of each task
+                if task.errors == 0:
+                    print("Control task", task.name, "failed:", e)
+                task.errors += 1
+            elapsed = time.ticks_diff(time.ticks_us(), start)
+            task.runs += 1
+            task.last_us = elapsed
+            if elapsed > task.max_us:
+                task.max_us = elapsed
+            if elapsed > task.budget_us:
+                task.overruns += 1
+
+        elapsed = time.ticks_diff(time.ticks_us(), cycle_start)
+        self.cycles += 1
+        self.last_cycle_us = elapsed
+        self._total_cycle_us += elapsed
+        if elapsed > self.max_cycle_us:
+            self.max_cycle_us = elapsed
+        if elapsed > self.period_us * step:
+            self.overruns += 1
@@ -15,6 +15,21 @@ class Controller:
         """
         pass
 
+    def update_with_timestep(self, input, timestep: float) -> float:
+        """
+        Handle a new update of this control loop, when the caller knows the time since the last update.
+        Controllers that don't depend on time can leave this as is; it calls update().
+
+        :param input: The input to this controller for a given update. Usually an error or some other correctable value
+        :type input: float
+        :param timestep: The time since the last update, in seconds
+        :type timestep: float
+
+        :return: The system output from the controller, to be used as an effort value or for any other purpose
+        :rtype: float
+        """
+        return self.update(input)
+
     def is_done(self) -> bool:
         
         """
@@ -1,8 +1,14 @@
 from .encoded_motor import EncodedMotor
+from .encoder_bank import EncoderBank
 from .imu import IMU
 from .controller import Controller
 from .pid import PID
 from .timeout import Timeout
+from .motion_profile import MotionProfile, TrapezoidProfile, SCurveProfile
+from .odometry import Odometry
+from .pure_pursuit import Path, PurePursuit
+from machine import disable_irq, enable_irq
+import uasyncio as asyncio
 import time
 import math
 
@@ -49,6 +55,13 @@ class DifferentialDrive:
         self.brake_at_zero_power = False
         self.wheel_diam = wheel_diam
         self.track_width = wheel_track
+        # Read both wheels together, so the difference between them isn't skewed by the time between reads
+        if EncoderBank.can_hold((left_motor, right_motor)):
+            self._encoders = EncoderBank((left_motor, right_motor))
+        else:
+            self._encoders = None
+        # Created by get_odometry(), so robots that never use it don't pay for its updates
+        self._odometry = None
 
     def set_effort(self, left_effort: float, right_effort: float) -> None:
         """
@@ -65,7 +78,9 @@ class DifferentialDrive:
 
     def set_speed(self, left_speed: float, right_speed: float) -> None:
         """
-        Set the speed of both motors individually
+        Set the speed of both motors individually.
+        Each motor's speed controller starts from scratch only when speed control starts (from stopped, or after a
+        speed of 0); changing the speeds while it's running keeps its history, so they can be updated every control step.
 
         :param leftSpeed: The speed (In Centimeters per Second) to set the left motor to.
         :type leftSpeed: float
@@ -117,8 +132,16 @@ class DifferentialDrive:
         Resets the position of both motors' encoders to 0
         """
 
+        # Bring the odometry up to date, reset, and take the reset encoders as its new starting point in one go:
+        # a scheduled update in between would lose the motion up to the reset, or count the jump back to 0 as motion
+        state = disable_irq()
+        if self._odometry is not None:
+            self._odometry.update()
         self.left_motor.reset_encoder_position()
         self.right_motor.reset_encoder_position()
+        if self._odometry is not None:
+            self._odometry.resync()
+        enable_irq(state)
 
     def get_left_encoder_position(self) -> float:
         """
@@ -134,6 +157,36 @@ class DifferentialDrive:
         """
         return self.right_motor.get_position()*math.pi*self.wheel_diam
 
+    def get_encoder_positions(self) -> tuple:
+        """
+        :return: the current positions of the left and right motors' encoders in cm, read at the same moment.
+        :rtype: tuple<float>
+        """
+        if self._encoders is None:
+            return self.get_left_encoder_position(), self.get_right_encoder_position()
+        self._encoders.update()
+        cm_per_rev = math.pi*self.wheel_diam
+        return self._encoders.positions[0]*cm_per_rev, self._encoders.positions[1]*cm_per_rev
+
+    def get_odometry(self) -> Odometry:
+        """
+        Get the drivetrain's odometry, which keeps track of the robot's position and heading from the moment it's
+        first asked for, at the origin facing along the x axis. Its heading comes from the IMU, if there is one
+        (see Odometry's imu_weight), and its distance from the encoders.
+
+        :return: The drivetrain's odometry
+        :rtype: Odometry
+        """
+        if self._odometry is None:
+            self._odometry = Odometry(self.left_motor, self.right_motor, self.imu, self.wheel_diam, self.track_width)
+        return self._odometry
+
+    def get_pose(self) -> tuple:
+        """
+        :return: The robot's x and y position (In Centimeters) and heading (In Degrees, counterclockwise positive), from the odometry
+        :rtype: tuple<float>
+        """
+        return self.get_odometry().get_pose()
 
     def straight(self, distance: float, max_effort: float = 0.5, timeout: float = None, main_controller: Controller = None, secondary_controller: Controller = None) -> bool:
         """
@@ -153,14 +206,27 @@ class DifferentialDrive:
         :return: if the distance was reached before the timeout
         :rtype: bool
         """
+        return self._run(self._straight_steps(distance, max_effort, timeout, main_controller, secondary_controller))
+
+    async def straight_async(self, distance: float, max_effort: float = 0.5, timeout: float = None, main_controller: Controller = None, secondary_controller: Controller = None) -> bool:
+        """
+        Like straight(), as a coroutine: go forward the specified distance in centimeters.
+        Lets other uasyncio tasks run between control updates, and stops the motors if cancelled.
+        Takes the same parameters and returns the same result as straight().
+        """
+        return await self._run_async(self._straight_steps(distance, max_effort, timeout, main_controller, secondary_controller))
+
+    def _straight_steps(self, distance: float, max_effort: float = 0.5, timeout: float = None, main_controller: Controller = None, secondary_controller: Controller = None):
+        """
+        Non-api method; the control steps of straight(), yielding the milliseconds to wait before each next step
+        """
         # ensure effort is always positive while distance could be either positive or negative
         if max_effort < 0:
             max_effort *= -1
             distance *= -1
 
         time_out = Timeout(timeout)
-        starting_left = self.get_left_encoder_position()
-        starting_right = self.get_right_encoder_position()
+        starting_left, starting_right = self.get_encoder_positions()
 
 
         if main_controller is None:
@@ -190,8 +256,9 @@ class DifferentialDrive:
         while True:
 
             # calculate the distance traveled
-            left_delta = self.get_left_encoder_position() - starting_left
-            right_delta = self.get_right_encoder_position() - starting_right
+            left_position, right_position = self.get_encoder_positions()
+            left_delta = left_position - starting_left
+            right_delta = right_position - starting_right
             dist_traveled = (left_delta + right_delta) / 2
 
             # PID for distance
@@ -212,13 +279,10 @@ class DifferentialDrive:
             
             self.set_effort(effort - headingCorrection, effort + headingCorrection)
 
-            time.sleep(0.01)
-
-        self.stop()
+            yield 10
 
         return not time_out.is_done()
 
-
     def turn(self, turn_degrees: float, max_effort: float = 0.5, timeout: float = None, main_controller: Controller = None, secondary_controller: Controller = None, use_imu:bool = True) -> bool:
         """
         Turn the robot some relative heading given in turnDegrees, and exit function when the robot has reached that heading.
@@ -240,14 +304,27 @@ class DifferentialDrive:
         :return: if the distance was reached before the timeout
         :rtype: bool
         """
+        return self._run(self._turn_steps(turn_degrees, max_effort, timeout, main_controller, secondary_controller, use_imu))
+
+    async def turn_async(self, turn_degrees: float, max_effort: float = 0.5, timeout: float = None, main_controller: Controller = None, secondary_controller: Controller = None, use_imu:bool = True) -> bool:
+        """
+        Like turn(), as a coroutine: turn the robot some relative heading given in turn_degrees.
+        Lets other uasyncio tasks run between control updates, and stops the motors if cancelled.
+        Takes the same parameters and returns the same result as turn().
+        """
+        return await self._run_async(self._turn_steps(turn_degrees, max_effort, timeout, main_controller, secondary_controller, use_imu))
+
+    def _turn_steps(self, turn_degrees: float, max_effort: float = 0.5, timeout: float = None, main_controller: Controller = None, secondary_controller: Controller = None, use_imu:bool = True):
+        """
+        Non-api method; the control steps of turn(), yielding the milliseconds to wait before each next step
+        """
 
         if max_effort < 0:
             max_effort = -max_effort
             turn_degrees = -turn_degrees
 
         time_out = Timeout(timeout)
-        starting_left = self.get_left_encoder_position()
-        starting_right = self.get_right_encoder_position()
+        starting_left, starting_right = self.get_encoder_positions()
 
         if main_controller is None:
             main_controller = PID(
@@ -277,8 +354,9 @@ class DifferentialDrive:
         while True:
             
             # calculate encoder correction to minimize drift
-            left_delta = self.get_left_encoder_position() - starting_left
-            right_delta = self.get_right_encoder_position() - starting_right
+            left_position, right_position = self.get_encoder_positions()
+            left_delta = left_position - starting_left
+            right_delta = right_position - starting_right
             encoder_correction = secondary_controller.update(left_delta + right_delta)
 
             if use_imu and (self.imu is not None):
@@ -297,8 +375,337 @@ class DifferentialDrive:
 
             self.set_effort(-turn_speed - encoder_correction, turn_speed - encoder_correction)
 
-            time.sleep(0.01)
+            yield 10
+
+        return not time_out.is_done()
+
+    def straight_profiled(self, distance: float, max_speed: float = 20, max_acceleration: float = 60, max_jerk: float = None, timeout: float = None, tolerance: float = 0.5) -> bool:
+        """
+        Go forward the specified distance in centimeters along a motion profile: the wheels' speed controllers follow
+        a planned speed that ramps up, cruises and ramps down to stop at the distance, so the move takes a known time
+        instead of overshooting and settling. Works best once the motors' feedforward is set (see
+        EncodedMotor.characterize()).
+
+        :param distance: The distance for the robot to travel (In Centimeters); negative to go backwards
+        :type distance: float
+        :param max_speed: The cruising speed (In Centimeters per Second); the XRP's wheels top out near 28 cm/s
+        :type max_speed: float
+        :param max_acceleration: The acceleration (In Centimeters per Second squared)
+        :type max_acceleration: float
+        :param max_jerk: If given, ramp the acceleration at this rate (In Centimeters per Second cubed) for a smoother
+                         S-curve profile
+        :type max_jerk: float
+        :param timeout: The amount of time before the robot stops trying to move forward and continues to the next step (In Seconds)
+        :type timeout: float
+        :param tolerance: How close (In Centimeters) to the distance to get after the profile ends before stopping
+        :type tolerance: float
+        :return: if the distance was reached before the timeout
+        :rtype: bool
+        """
+        if max_jerk is None:
+            profile = TrapezoidProfile(distance, max_speed, max_acceleration)
+        else:
+            profile = SCurveProfile(distance, max_speed, max_acceleration, max_jerk)
+        return self.follow_profile(profile, False, timeout, tolerance)
+
+    def turn_profiled(self, turn_degrees: float, max_speed: float = 120, max_acceleration: float = 360, max_jerk: float = None, timeout: float = None, tolerance: float = 1, use_imu: bool = True) -> bool:
+        """
+        Turn the robot some relative heading given in turn_degrees along a motion profile, like straight_profiled().
+        Positive turns are counterclockwise.
+
+        :param turn_degrees: The number of angle for the robot to turn (In Degrees)
+        :type turn_degrees: float
+        :param max_speed: The cruising rate of turn (In Degrees per Second)
+        :type max_speed: float
+        :param max_acceleration: The angular acceleration (In Degrees per Second squared)
+        :type max_acceleration: float
+        :param max_jerk: If given, ramp the acceleration at this rate (In Degrees per Second cubed) for a smoother
+                         S-curve profile
+        :type max_jerk: float
+        :param timeout: The amount of time before the robot stops trying to turn and continues to the next step (In Seconds)
+        :type timeout: float
+        :param tolerance: How close (In Degrees) to the angle to get after the profile ends before stopping
+        :type tolerance: float
+        :param use_imu: A boolean flag that changes if the heading is measured with the imu (True) or the encoders (False)
+        :type use_imu: bool
+        :return: if the angle was reached before the timeout
+        :rtype: bool
+        """
+        if max_jerk is None:
+            profile = TrapezoidProfile(turn_degrees, max_speed, max_acceleration)
+        else:
+            profile = SCurveProfile(turn_degrees, max_speed, max_acceleration, max_jerk)
+        return self.follow_profile(profile, True, timeout, tolerance, use_imu)
+
+    def follow_profile(self, profile: MotionProfile, turning: bool = False, timeout: float = None, tolerance: float = 0.5, use_imu: bool = True, settle_time: float = 0.5) -> bool:
+        """
+        Drive along a motion profile: straight, in centimeters, or turning in place, in degrees counterclockwise.
+        The profile's speed is fed forward to the wheels' speed controllers, and the distance (or angle) the robot
+        is behind or ahead of the profile is corrected on top, along with any drift in heading (or position).
+        After the profile ends, the robot keeps correcting until it has stopped within tolerance of the end.
+
+        :param profile: The profile to follow
+        :type profile: MotionProfile
+        :param turning: Whether the profile is a turn (in degrees) rather than a straight move (in centimeters)
+        :type turning: bool
+        :param timeout: The amount of time before the robot stops trying to follow the profile (In Seconds)
+        :type timeout: float
+        :param tolerance: How close to the end of the profile to get after it ends before stopping
+        :type tolerance: float
+        :param use_imu: Whether to measure heading with the imu, if there is one, rather than the encoders
+        :type use_imu: bool
+        :param settle_time: How long after the profile ends to keep correcting towards its end (In Seconds)
+        :type settle_time: float
+        :return: if the end of the profile was reached before the timeout
+        :rtype: bool
+        """
+        return self._run(self._follow_profile_steps(profile, turning, timeout, tolerance, use_imu, settle_time))
+
+    async def follow_profile_async(self, profile: MotionProfile, turning: bool = False, timeout: float = None, tolerance: float = 0.5, use_imu: bool = True, settle_time: float = 0.5) -> bool:
+        """
+        Like follow_profile(), as a coroutine: drive along a motion profile.
+        Lets other uasyncio tasks run between control updates, and stops the motors if cancelled.
+        Takes the same parameters and returns the same result as follow_profile().
+        """
+        return await self._run_async(self._follow_profile_steps(profile, turning, timeout, tolerance, use_imu, settle_time))
+
+    def _follow_profile_steps(self, profile: MotionProfile, turning: bool = False, timeout: float = None, tolerance: float = 0.5, use_imu: bool = True, settle_time: float = 0.5):
+        """
+        Non-api method; the control steps of follow_profile(), yielding the milliseconds to wait before each next step
+        """
+        # Gains, in speed per unit of error: (cm/s)/cm, (deg/s)/deg
+        position_gain = 6
+        heading_gain = 5
+        # Once the profile ends, the integral of the error in speed per unit of error-second, to push through the
+        # last of the error that's too small for the proportional correction to overcome the wheels' friction
+        settle_gain = 12
+
+        time_out = Timeout(timeout)
+        use_imu = use_imu and (self.imu is not None)
+        cm_per_degree = math.pi*self.track_width/360
+        starting_left, starting_right = self.get_encoder_positions()
+        initial_heading = self.imu.get_yaw() if use_imu else 0
+        start_time = time.ticks_ms()
+        # After the profile ends: how many steps in a row the robot has been settled, and the integral of the error
+        settled_count = 0
+        settle_integral = 0
+        last_error = 0
+
+        while True:
+            elapsed = time.ticks_diff(time.ticks_ms(), start_time)/1000
+            target, speed = profile.sample(elapsed)
+
+            left_position, right_position = self.get_encoder_positions()
+            left_delta = left_position - starting_left
+            right_delta = right_position - starting_right
+            if use_imu:
+                heading = self.imu.get_yaw() - initial_heading
+            else:
+                heading = ((right_delta-left_delta)/2)/cm_per_degree
+
+            if turning:
+                error = target - heading
+            else:
+                error = target - (left_delta + right_delta)/2
+            if elapsed >= profile.duration:
+                # Steps are 20 ms apart
+                settle_integral += error*0.02
+
+            if turning:
+                # Turn at the profile's rate plus a correction, while holding the robot's center in place
+                forward_speed = -position_gain*(left_delta + right_delta)/2
+                turn_speed = (speed + heading_gain*error + settle_gain*settle_integral)*cm_per_degree
+            else:
+                forward_speed = speed + position_gain*error + settle_gain*settle_integral
+                turn_speed = -heading_gain*heading*cm_per_degree
 
-        self.stop()
+            if time_out.is_done():
+                break
+            if elapsed >= profile.duration:
+                # Close the position loop: the robot can still be coasting when the profile ends, so only stop
+                # once the error has stayed within tolerance, and the robot has all but stopped, for a few steps
+                settled = abs(error) < tolerance and abs(error - last_error) < tolerance/10
+                settled_count = settled_count + 1 if settled else 0
+                if settled_count >= 3 or elapsed >= profile.duration + settle_time:
+                    break
+            last_error = error
+
+            # Updating the speeds keeps the speed controllers' history; they only start over after a stop
+            self.set_speed(forward_speed - turn_speed, forward_speed + turn_speed)
+            yield 20
 
         return not time_out.is_done()
+
+    def go_to_point(self, x: float, y: float, max_speed: float = 20, tolerance: float = 1, timeout: float = None) -> bool:
+        """
+        Drive to a point, steering towards it as the robot goes, using the odometry's position and heading.
+        Coordinates are relative to where the odometry started (see get_odometry()), with x straight ahead and y to the left.
+
+        :param x: The x coordinate of the point (In Centimeters)
+        :type x: float
+        :param y: The y coordinate of the point (In Centimeters)
+        :type y: float
+        :param max_speed: The fastest to drive (In Centimeters per Second)
+        :type max_speed: float
+        :param tolerance: How close (In Centimeters) to get to the point before stopping
+        :type tolerance: float
+        :param timeout: The amount of time before the robot stops trying to reach the point (In Seconds)
+        :type timeout: float
+        :return: if the point was reached before the timeout
+        :rtype: bool
+        """
+        return self._run(self._go_to_points_steps(((x, y),), max_speed, tolerance, timeout))
+
+    async def go_to_point_async(self, x: float, y: float, max_speed: float = 20, tolerance: float = 1, timeout: float = None) -> bool:
+        """
+        Like go_to_point(), as a coroutine: drive to a point.
+        Lets other uasyncio tasks run between control updates, and stops the motors if cancelled.
+        Takes the same parameters and returns the same result as go_to_point().
+        """
+        return await self._run_async(self._go_to_points_steps(((x, y),), max_speed, tolerance, timeout))
+
+    def follow_waypoints(self, points, max_speed: float = 20, tolerance: float = 1, timeout: float = None, pass_radius: float = 5) -> bool:
+        """
+        Drive through a list of points in order, without stopping at each one: the robot heads for the next point
+        once it's within pass_radius of the current one, and stops at the last.
+
+        :param points: The (x, y) points to drive through (In Centimeters), in the odometry's coordinates
+        :type points: list<tuple<float>>
+        :param max_speed: The fastest to drive (In Centimeters per Second)
+        :type max_speed: float
+        :param tolerance: How close (In Centimeters) to get to the last point before stopping
+        :type tolerance: float
+        :param timeout: The amount of time before the robot stops trying to finish the path (In Seconds)
+        :type timeout: float
+        :param pass_radius: How close (In Centimeters) to get to each point before the last before heading for the next
+        :type pass_radius: float
+        :return: if the last point was reached before the timeout
+        :rtype: bool
+        """
+        return self._run(self._go_to_points_steps(points, max_speed, tolerance, timeout, pass_radius))
+
+    async def follow_waypoints_async(self, points, max_speed: float = 20, tolerance: float = 1, timeout: float = None, pass_radius: float = 5) -> bool:
+        """
+        Like follow_waypoints(), as a coroutine: drive through a list of points in order.
+        Lets other uasyncio tasks run between control updates, and stops the motors if cancelled.
+        Takes the same parameters and returns the same result as follow_waypoints().
+        """
+        return await self._run_async(self._go_to_points_steps(points, max_speed, tolerance, timeout, pass_radius))
+
+    def _go_to_points_steps(self, points, max_speed: float = 20, tolerance: float = 1, timeout: float = None, pass_radius: float = 5):
+        """
+        Non-api method; the control steps of go_to_point() and follow_waypoints(), yielding the milliseconds to wait
+        before each next step
+        """
+        # Gains, in speed per unit of error: (cm/s)/cm, (deg/s)/deg
+        position_gain = 4
+        heading_gain = 3
+
+        time_out = Timeout(timeout)
+        odometry = self.get_odometry()
+        cm_per_degree = math.pi*self.track_width/360
+        last = len(points) - 1
+
+        for i in range(len(points)):
+            target_x, target_y = points[i]
+            radius = tolerance if i == last else pass_radius
+            while True:
+                x, y, heading = odometry.get_pose()
+                dx = target_x - x
+                dy = target_y - y
+                distance = math.sqrt(dx*dx + dy*dy)
+                if distance < radius or time_out.is_done():
+                    break
+
+                heading_error = (math.degrees(math.atan2(dy, dx)) - heading + 180) % 360 - 180
+                # Slow down for the last point only, and don't drive on while facing away from the point
+                forward_speed = min(max_speed, position_gain*distance) if i == last else max_speed
+                forward_speed *= max(0.0, math.cos(math.radians(heading_error)))
+                turn_speed = heading_gain*heading_error*cm_per_degree
+                turn_speed = max(-max_speed, min(max_speed, turn_speed))
+
+                # Updating the speeds keeps the speed controllers' history; they only start over after a stop
+                self.set_speed(forward_speed - turn_speed, forward_speed + turn_speed)
+                yield 20
+
+        return not time_out.is_done()
+
+    def follow_path(self, path, max_speed: float = 20, lookahead: float = 8, max_acceleration: float = 40, tolerance: float = 1, timeout: float = None) -> bool:
+        """
+        Drive along a path through waypoints without stopping at them, steering with pure pursuit from the odometry's
+        pose and slowing down for sharp corners and the end. Coordinates are the odometry's (see get_odometry()).
+
+        :param path: The (x, y) waypoints to drive through (In Centimeters), starting from where the robot is;
+                     or a Path, to reuse one computed ahead of time
+        :type path: list<tuple<float>> or Path
+        :param max_speed: The fastest either wheel may go (In Centimeters per Second)
+        :type max_speed: float
+        :param lookahead: How far ahead along the path to steer towards (In Centimeters); larger is smoother but cuts corners more
+        :type lookahead: float
+        :param max_acceleration: The deceleration to plan with (In Centimeters per Second squared)
+        :type max_acceleration: float
+        :param tolerance: How close (In Centimeters) to the end of the path to get before stopping, measured along the
+                          path: the robot can also end up off to one side of it, by however far it was when it got there
+        :type tolerance: float
+        :param timeout: The amount of time before the robot stops trying to finish the path (In Seconds)
+        :type timeout: float
+        :return: if the end of the path was reached before the timeout
+        :rtype: bool
+        """
+        return self._run(self._follow_path_steps(path, max_speed, lookahead, max_acceleration, tolerance, timeout))
+
+    async def follow_path_async(self, path, max_speed: float = 20, lookahead: float = 8, max_acceleration: float = 40, tolerance: float = 1, timeout: float = None) -> bool:
+        """
+        Like follow_path(), as a coroutine: drive along a path through waypoints.
+        Lets other uasyncio tasks run between control updates, and stops the motors if cancelled.
+        Takes the same parameters and returns the same result as follow_path().
+        """
+        return await self._run_async(self._follow_path_steps(path, max_speed, lookahead, max_acceleration, tolerance, timeout))
+
+    def _follow_path_steps(self, path, max_speed: float = 20, lookahead: float = 8, max_acceleration: float = 40, tolerance: float = 1, timeout: float = None):
+        """
+        Non-api method; the control steps of follow_path(), yielding the milliseconds to wait before each next step
+        """
+        time_out = Timeout(timeout)
+        odometry = self.get_odometry()
+        if not isinstance(path, Path):
+            # Start the path from where the robot is
+            x, y, _ = odometry.get_pose()
+            path = Path([(x, y)] + list(path))
+        tracker = PurePursuit(path, self.track_width, lookahead, max_speed, max_acceleration)
+
+        while True:
+            x, y, heading = odometry.get_pose()
+            left_speed, right_speed = tracker.update(x, y, heading)
+            if tracker.remaining() < tolerance or time_out.is_done():
+                break
+            # Updating the speeds keeps the speed controllers' history; they only start over after a stop
+            self.set_speed(left_speed, right_speed)
+            yield 20
+
+        return not time_out.is_done()
+
+    def _run(self, steps) -> bool:
+        """
+        Non-api method; runs a motion's control steps to the end, and stops the motors however it ends
+        """
+        try:
+            while True:
+                time.sleep_ms(next(steps))
+        except StopIteration as e:
+            return e.value
+        finally:
+            self.stop()
+
+    async def _run_async(self, steps) -> bool:
+        """
+        Non-api method; runs a motion's control steps to the end, yielding to other tasks between them,
+        and stops the motors however it ends, including being cancelled
+        """
+        try:
+            while True:
+                await asyncio.sleep_ms(next(steps))
+        except StopIteration as e:
+            return e.value
+        finally:
+            self.stop()
@@ -1,15 +1,32 @@
 from .motor import SinglePWMMotor, DualPWMMotor
 from .encoder import Encoder
-from machine import Timer
+from .encoder_bank import EncoderBank
+from .control_scheduler import ControlScheduler
 from .controller import Controller
 from .pid import PID
+from array import array
+from micropython import const
 import sys
+import time
+
+# Speed estimation state, indexes into EncodedMotor._speed_state
+_PREV_COUNTS = const(0)  # Count at the last sample
+_PREV_US = const(1)      # Time of the last sample (ticks_us)
+_DT_US = const(2)        # Time between the last two samples
+_EDGE_COUNTS = const(3)  # Count at the last sample where it had changed
+_EDGE_US = const(4)      # Time of that sample
 
 class EncodedMotor:
 
     ZERO_EFFORT_BREAK = True
     ZERO_EFFORT_COAST = False
 
+    # Rate of encoder sampling and speed control
+    UPDATE_HZ = 50
+
+    # With period-based estimation, a motor that hasn't moved a count in this long is taken to be stopped
+    STOPPED_TIMEOUT_US = 200000
+
     _DEFAULT_LEFT_MOTOR_INSTANCE = None
     _DEFAULT_RIGHT_MOTOR_INSTANCE = None
     _DEFAULT_MOTOR_THREE_INSTANCE = None
@@ -60,6 +77,8 @@ class EncodedMotor:
             motor = cls._DEFAULT_MOTOR_FOUR_INSTANCE
         else:
             return Exception("Invalid motor index")
+        # The default motors are sampled together; adding a motor the bank already holds does nothing
+        EncoderBank.get_default_encoder_bank().add_motor(motor)
         return motor
     
     def __init__(self, motor, encoder: Encoder):
@@ -76,12 +95,26 @@ class EncodedMotor:
             kd=0,
         )
         self.speedController = self.DEFAULT_SPEED_CONTROLLER
-        self.prev_position = 0
+        # Speed in counts per nominal update period (20ms), measured over the real time between samples
         self.speed = 0
-        # Use a virtual timer so we can leave the hardware timers up for the user
-        self.updateTimer = Timer(-1)
-        # If the update timer is not running, start it at 50 Hz (20ms updates)
-        self.updateTimer.init(period=20, callback=lambda t:self._update())
+        self._raw_speed = 0
+        self._nominal_period_us = 1000000 // self.UPDATE_HZ
+        self._speed_state = array('i', [0] * 5)
+        self._period_below_counts = 0
+        self._speed_filter = 1.0
+        self._reset_speed_estimate(0)
+        # Feedforward for speed control, in effort per rpm (and per rpm/s); all 0 is off
+        self._ks = 0.0
+        self._kv = 0.0
+        self._ka = 0.0
+        self._target_rpm = None
+        self._prev_target_rpm = 0.0
+        # Sample the encoder and run speed control at 50 Hz (20ms updates) from the shared control scheduler.
+        # An EncoderBank that samples this motor along with others removes the encoder task.
+        scheduler = ControlScheduler.get_default_control_scheduler()
+        divider = max(1, scheduler.rate_hz // self.UPDATE_HZ)
+        self._encoder_task = scheduler.add_task(self._sample_encoder, ControlScheduler.ENCODER, divider, name="encoder")
+        self._speed_task = scheduler.add_task(self._update_speed_control, ControlScheduler.SPEED, divider, name="speed")
 
 
     def set_effort(self, effort: float):
@@ -143,6 +176,7 @@ class EncodedMotor:
         Resets the encoder position back to zero.
         """
         self._encoder.reset_encoder_position()
+        self._reset_speed_estimate(0)
 
     def get_speed(self) -> float:
         """
@@ -150,24 +184,33 @@ class EncodedMotor:
         :rtype: float
         """
         # Convert from counts per 20ms to rpm (60 sec/min, 50 Hz)
-        return self.speed*(60*50)/self._encoder.resolution
+        return self.speed*(60*self.UPDATE_HZ)/self._encoder.resolution
 
     def set_speed(self, speed_rpm: float = None):
         """
         Sets target speed (in rpm) to be maintained passively
         Call with no parameters or 0 to turn off speed control
+        The speed controller's history is cleared only when speed control starts; changing the target while it's
+        running keeps it, so the target can be updated every tick. Turn speed control off first to start over.
 
         :param target_speed_rpm: The target speed for the motor in rpm, or None
         :type target_speed_rpm: float, or None
         """
         if speed_rpm is None or speed_rpm == 0:
             self.target_speed = None
+            self._target_rpm = None
             self.set_effort(0)
             return
+        if self.target_speed is None:
+            # Starting speed control; changing the target of a running one keeps its history, so targets can be
+            # updated every tick (e.g. to follow a motion profile).
+            # Feedforward acceleration is measured from the speed the motor is at now
+            self._prev_target_rpm = self.get_speed()
+            self.speedController.clear_history()
+            self._reset_speed_estimate(self.get_position_counts())
+        self._target_rpm = speed_rpm
         # Convert from rev per min to counts per 20ms (60 sec/min, 50 Hz)
-        self.target_speed = speed_rpm*self._encoder.resolution/(60*50)
-        self.speedController.clear_history()
-        self.prev_position = self.get_position_counts()
+        self.target_speed = speed_rpm*self._encoder.resolution/(60*self.UPDATE_HZ)
 
     def set_speed_controller(self, new_controller: Controller):
         """
@@ -179,14 +222,170 @@ class EncodedMotor:
         self.speedController = new_controller
         self.speedController.clear_history()
 
-    def _update(self):
+    def set_speed_estimation(self, period_below_counts: int = 0, filter_alpha: float = 1.0):
         """
-        Non-api method; used for updating motor efforts for speed control
+        Tunes how speed is measured from the encoder. Speed is always measured over the real time between samples.
+
+        :param period_below_counts: When fewer counts than this pass between samples, measure over the time since the
+                                    count last changed instead, which resolves low speeds better. 0 turns this off.
+        :type period_below_counts: int
+        :param filter_alpha: The weight of each new measurement in a low-pass filter on the speed, from 0 to 1.
+                             1 turns the filter off; lower values smooth more but react slower.
+        :type filter_alpha: float
+        """
+        self._period_below_counts = period_below_counts
+        self._speed_filter = filter_alpha
+
+    def set_feedforward(self, ks: float = 0.0, kv: float = 0.0, ka: float = 0.0):
+        """
+        Adds a feedforward term to speed control, so the motor gets close to the effort a target speed needs at
+        once, and the speed controller only corrects what's left:
+        effort = ks*sign(speed) + kv*speed + ka*acceleration, with the target speed in rpm and its change in rpm/s.
+        Use characterize() to measure the constants. Call with no parameters to turn feedforward off.
+
+        :param ks: The effort needed to overcome friction and start moving
+        :type ks: float
+        :param kv: The effort per rpm of speed
+        :type kv: float
+        :param ka: The effort per rpm/s of acceleration
+        :type ka: float
+        """
+        self._ks = ks
+        self._kv = kv
+        self._ka = ka
+
+    def characterize(self, max_effort: float = 0.8, ramp_time: float = 4, step_effort: float = 0.5) -> tuple:
+        """
+        Measures the feedforward constants for this motor and applies them with set_feedforward(). The effort is
+        ramped slowly up to max_effort to fit ks and kv, then stepped to step_effort to time how fast the speed
+        responds, for ka. The motor turns forward for about ramp_time + 2 seconds, so lift the robot's wheels off the
+        ground (or leave it plenty of room) first.
+
+        :param max_effort: The effort to ramp up to
+        :type max_effort: float
+        :param ramp_time: How long the ramp takes, in seconds; slower ramps fit ks and kv more closely
+        :type ramp_time: float
+        :param step_effort: The effort of the step
+        :type step_effort: float
+        :return: The constants (ks, kv, ka)
+        :rtype: tuple<float>
+        """
+        period = 1 / self.UPDATE_HZ
+        self.set_speed()
+
+        # Quasi-static ramp: fit effort = ks + kv*speed by least squares, over the samples where the motor turns
+        n = sum_v = sum_e = sum_vv = sum_ve = 0
+        steps = int(ramp_time / period)
+        for i in range(1, steps + 1):
+            effort = max_effort * i / steps
+            self.set_effort(effort)
+            time.sleep(period)
+            speed = self.get_speed()
+            if speed > 1:
+                n += 1
+                sum_v += speed
+                sum_e += effort
+                sum_vv += speed * speed
+                sum_ve += speed * effort
+        self.set_effort(0)
+        if n < 2 or n * sum_vv == sum_v * sum_v:
+            print("Motor characterization failed: the motor didn't turn")
+            return (0.0, 0.0, 0.0)
+        kv = (n * sum_ve - sum_v * sum_e) / (n * sum_vv - sum_v * sum_v)
+        ks = max(0.0, (sum_e - kv * sum_v) / n)
+        time.sleep(1)
+
+        # Step: the speed settles like a first-order lag, reaching 63% of its final value after one time constant
+        samples = int(1 / period)
+        speeds = [0.0] * samples
+        self.set_effort(step_effort)
+        for i in range(samples):
+            time.sleep(period)
+            speeds[i] = self.get_speed()
+        self.set_effort(0)
+        final_speed = sum(speeds[samples * 3 // 4:]) / (samples - samples * 3 // 4)
+        time_constant = period
+        for i in range(samples):
+            if speeds[i] >= 0.632 * final_speed:
+                time_constant = (i + 1) * period
+                break
+        ka = kv * time_constant
+
+        self.set_feedforward(ks, kv, ka)
+        return (ks, kv, ka)
+
+    def _reset_speed_estimate(self, current_position: int):
+        """
+        Non-api method; restarts speed measurement from the given position, now
+        """
+        now = time.ticks_us()
+        state = self._speed_state
+        state[_PREV_COUNTS] = current_position
+        state[_PREV_US] = now
+        state[_DT_US] = self._nominal_period_us
+        state[_EDGE_COUNTS] = current_position
+        state[_EDGE_US] = now
+
+    def _sample_encoder(self):
+        """
+        Non-api method; the ENCODER phase task, measures the speed over the last update period
         """
         current_position = self.get_position_counts()
-        self.speed = current_position - self.prev_position
+        self._record_position(current_position, time.ticks_us())
+
+    def _record_position(self, current_position: int, sample_us: int):
+        """
+        Non-api method; measures the speed from a new position sample, read here or by an EncoderBank
+        """
+        state = self._speed_state
+        dt_us = time.ticks_diff(sample_us, state[_PREV_US])
+        if dt_us <= 0:
+            return
+        delta = current_position - state[_PREV_COUNTS]
+        state[_PREV_COUNTS] = current_position
+        state[_PREV_US] = sample_us
+        state[_DT_US] = dt_us
+
+        if abs(delta) < self._period_below_counts:
+            # Too few counts to measure over one sample; measure over the time since the count last changed
+            edge_us = time.ticks_diff(sample_us, state[_EDGE_US])
+            if delta != 0:
+                speed = (current_position - state[_EDGE_COUNTS])*self._nominal_period_us/edge_us
+            elif edge_us < self.STOPPED_TIMEOUT_US:
+                # The next count hasn't come yet, so the speed is at most one count in the time since the last
+                bound = self._nominal_period_us/edge_us
+                speed = max(-bound, min(bound, self._raw_speed))
+            else:
+                speed = 0
+        else:
+            # Normalize to counts per nominal period, so late or missed samples don't read as speed changes
+            speed = delta*self._nominal_period_us/dt_us
+        if delta != 0:
+            state[_EDGE_COUNTS] = current_position
+            state[_EDGE_US] = sample_us
+
+        self._raw_speed = speed
+        self.speed += self._speed_filter*(speed - self.speed)
+
+    def _update_speed_control(self):
+        """
+        Non-api method; the SPEED phase task, updates the motor effort for speed control
+        """
         if self.target_speed is not None:
+            timestep = self._speed_state[_DT_US]/1000000
             error = self.target_speed - self.speed
-            effort = self.speedController.update(error)
+            effort = self.speedController.update_with_timestep(error, timestep)
+            if self._kv or self._ks:
+                target_rpm = self._target_rpm
+                effort += self._kv*target_rpm + self._ka*(target_rpm - self._prev_target_rpm)/timestep
+                effort += self._ks if target_rpm > 0 else -self._ks
+                self._prev_target_rpm = target_rpm
+                effort = max(-1, min(1, effort))
             self._motor.set_effort(effort)
-        self.prev_position = current_position
\ No newline at end of file
+
+    def _update(self):
+        """
+        Non-api method; used for updating motor efforts for speed control
+        """
+        self._sample_encoder()
+        self._update_speed_control()
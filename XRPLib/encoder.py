@@ -26,6 +26,7 @@ class Encoder:
         basePin = machine.Pin(min(encAPin, encBPin), machine.Pin.IN)
         nextPin = machine.Pin(max(encAPin, encBPin), machine.Pin.IN)
         self.sm = rp2.StateMachine(index, self._encoder, in_base=basePin)
+        self._last_counts = 0
         self.reset_encoder_position()
         self.sm.active(1)
     
@@ -38,18 +39,35 @@ class Encoder:
         # problem, an alternative solution is to stop the state machine, then
         # reset both x and the program counter. But that's excessive.
         self.sm.exec("set(x, 0)")
-    
+        # Drop any count left over from a read that was interrupted between its put and get
+        while self.sm.rx_fifo():
+            self.sm.get()
+        self._last_counts = 0
+
     def get_position_counts(self):
         """
         :return: The position of the encoded motor, in counts, relative to the last time reset was called.
         :rtype: int
         """
-        # Read 5 times for it to get past the buffer
-        counts = self.sm.get()
-        counts = self.sm.get()
-        counts = self.sm.get()
-        counts = self.sm.get()
+        self.request_counts()
+        return self.receive_counts()
+
+    def request_counts(self):
+        """
+        Ask the state machine for its count, to be collected with receive_counts().
+        Requesting from several encoders before receiving from any latches their counts almost together.
+        """
+        # The state machine only pushes the count when asked. Any request word that differs
+        # from the current count works; the last count with its top bit flipped always does.
+        self.sm.put(self._last_counts ^ 0x80000000)
+
+    def receive_counts(self):
+        """
+        :return: The count requested by request_counts()
+        :rtype: int
+        """
         counts = self.sm.get()
+        self._last_counts = counts
         if(counts > 2**31):
             counts -= 2**32
         return counts
@@ -65,6 +83,7 @@ class Encoder:
     def _encoder():
         # Register descriptions:
         # X - Encoder count, as a 32-bit number
+        # Y - Scratch, for checking whether the CPU has asked for the count
         # OSR - Previous pin values, only last 2 bits are used
         # ISR - Push encoder count, and combine pin states together
         
@@ -91,18 +110,24 @@ class Encoder:
         jmp("decr") # 11 -> 10 Reverse, decrement count
         jmp("read") # 11 -> 11 No change, continue
         
+        label("decr")           # There is no explicite increment intruction, but X can be
+        jmp(x_dec, "read")      # decremented in the jump instruction. Either way the jump
+                                # falls through or goes to "read", which is next
         label("read")
-        mov(osr, isr)   # Store previous pin states in OSR
-        mov(isr, x)     # Copy encoder count to ISR
-        push(noblock)   # Push count to RX buffer, and reset ISR to 0
-        out(isr, 2)     # Shift previous pin states into ISR
-        in_(pins, 2)    # Shift current pin states into ISR
-        mov(pc, isr)    # Move PC to jump table to determine what to do next
+        pull(noblock)           # Take a request from the TX FIFO; with none, OSR = X
+        mov(y, osr)
+        mov(osr, isr)           # Store previous pin states in OSR
+        jmp(x_not_y, "push")    # A request is anything other than X: send the count
+        mov(isr, null)          # Otherwise just clear ISR for the pin states
+        label("sample")
+        out(isr, 2)             # Shift previous pin states into ISR
+        in_(pins, 2)            # Shift current pin states into ISR
+        mov(pc, isr)            # Move PC to jump table to determine what to do next
         
-        label("decr")           # There is no explicite increment intruction, but X can be
-        jmp(x_dec, "decr_nop")  # decremented in the jump instruction. So we use that and jump
-        label("decr_nop")       # to the next instruction, which is equivalent to just decrementing
-        jmp("read")
+        label("push")
+        mov(isr, x)             # Copy encoder count to ISR
+        push(noblock)           # Push count to RX buffer, and reset ISR to 0
+        jmp("sample")
         
         label("incr")           # There is no explicite increment intruction, but X can be
         mov(x, invert(x))       # decremented in the jump instruction. So we invert X, decrement, 
@@ -110,10 +135,5 @@ class Encoder:
         label("incr_nop")
         mov(x, invert(x))
         jmp("read")
-        
-        # Fill remaining instruction memory with jumps to ensure nothing bad happens
-        # For some reason, weird behavior happens if the instruction memory isn't full
-        jmp("read")
-        jmp("read")
-        jmp("read")
-        jmp("read")
\ No newline at end of file
+        # This fills all 32 instructions of the PIO memory, which avoids weird behavior
+        # seen when the instruction memory isn't full
@@ -0,0 +1,162 @@
+from .control_scheduler import ControlScheduler
+from array import array
+import time
+
+class EncoderBank:
+
+    # The PIO block has four state machines, one per motor port
+    DEFAULT_CAPACITY = 4
+
+    _DEFAULT_ENCODER_BANK_INSTANCE = None
+
+    @classmethod
+    def get_default_encoder_bank(cls):
+        """
+        Get the default encoder bank, which holds the default XRP motors as they are created and samples them for
+        speed control. This is a singleton, so only one instance will ever exist.
+        """
+        if cls._DEFAULT_ENCODER_BANK_INSTANCE is None:
+            cls._DEFAULT_ENCODER_BANK_INSTANCE = cls()
+            cls._DEFAULT_ENCODER_BANK_INSTANCE.start_sampling()
+        return cls._DEFAULT_ENCODER_BANK_INSTANCE
+
+    @staticmethod
+    def can_hold(motors) -> bool:
+        """
+        :return: Whether every motor reads its own encoder (a MotorGroup, for one, doesn't), so a bank can hold them
+        :rtype: bool
+        """
+        for motor in motors:
+            if getattr(motor, "_encoder", None) is None:
+                return False
+        return True
+
+    def __init__(self, motors: tuple = (), capacity: int = None):
+        """
+        Reads the encoders of several motors together: every state machine is asked for its count before any count
+        is collected, so the counts are latched microseconds apart rather than one full read apart. The direction
+        flip and the conversion to revolutions are applied in the same pass, into preallocated arrays, and the
+        snapshot is timestamped.
+
+        :param motors: The EncodedMotors to hold, in index order
+        :type motors: tuple<EncodedMotor>
+        :param capacity: The most motors the bank can hold; defaults to 4, or the number of motors if that's more
+        :type capacity: int
+        """
+        if capacity is None:
+            capacity = max(self.DEFAULT_CAPACITY, len(motors))
+        self.capacity = capacity
+        self.size = 0
+        self._motors = []
+        self._encoders = []
+        self._sign = array('b', [1] * capacity)
+        self._scale = array('f', [0] * capacity)
+        # The latest snapshot: counts with the motor's direction applied, and revolutions
+        self.counts = array('i', [0] * capacity)
+        self.positions = array('f', [0] * capacity)
+        self.timestamp_us = time.ticks_us()
+        self._sampling_task = None
+        for motor in motors:
+            self.add_motor(motor)
+
+    def add_motor(self, motor) -> int:
+        """
+        Add a motor to the bank. Its direction (flip_dir) is read now.
+
+        :param motor: The motor to add
+        :type motor: EncodedMotor
+        :return: The motor's index in the snapshot arrays
+        :rtype: int
+        """
+        if motor in self._motors:
+            return self._motors.index(motor)
+        if self.size >= self.capacity:
+            raise ValueError("Encoder bank is full")
+        encoder = getattr(motor, "_encoder", None)
+        if encoder is None:
+            raise TypeError("Motor has no encoder of its own")
+        i = self.size
+        self._motors.append(motor)
+        self._encoders.append(encoder)
+        self._sign[i] = -1 if motor._motor.flip_dir else 1
+        self._scale[i] = 1 / encoder.resolution
+        self.size += 1
+        if self._sampling_task is not None:
+            self._take_over_sampling(motor)
+        return i
+
+    def index_of(self, motor) -> int:
+        """
+        :return: The motor's index in the snapshot arrays
+        :rtype: int
+        """
+        return self._motors.index(motor)
+
+    def holds(self, motor) -> bool:
+        """
+        :return: Whether the motor is in the bank
+        :rtype: bool
+        """
+        return motor in self._motors
+
+    def get_sampling_divider(self) -> int:
+        """
+        :return: The control scheduler divider the bank samples at, or None if it isn't sampling
+        :rtype: int
+        """
+        if self._sampling_task is None:
+            return None
+        return self._sampling_task.divider
+
+    def update(self) -> int:
+        """
+        Take a snapshot of every encoder in the bank, into counts, positions and timestamp_us.
+
+        :return: The time of the snapshot, from time.ticks_us()
+        :rtype: int
+        """
+        encoders = self._encoders
+        for encoder in encoders:
+            encoder.request_counts()
+        # The state machines answer within a few cycles of the request, so this is when the counts were taken
+        self.timestamp_us = time.ticks_us()
+        counts = self.counts
+        positions = self.positions
+        sign = self._sign
+        scale = self._scale
+        for i in range(self.size):
+            c = encoders[i].receive_counts() * sign[i]
+            counts[i] = c
+            positions[i] = c * scale[i]
+        return self.timestamp_us
+
+    def start_sampling(self, update_hz: int = 50):
+        """
+        Take a snapshot from the control scheduler's ENCODER phase and hand each motor its count for speed
+        measurement, in place of each motor reading its own encoder.
+
+        :param update_hz: How often to sample, matching the motors' speed control rate
+        :type update_hz: int
+        """
+        if self._sampling_task is not None:
+            return
+        scheduler = ControlScheduler.get_default_control_scheduler()
+        divider = max(1, scheduler.rate_hz // update_hz)
+        self._sampling_task = scheduler.add_task(self._sample, ControlScheduler.ENCODER, divider, name="encoder bank")
+        for motor in self._motors:
+            self._take_over_sampling(motor)
+
+    def _take_over_sampling(self, motor):
+        if motor._encoder_task is not None:
+            ControlScheduler.get_default_control_scheduler().remove_task(motor._encoder_task)
+            motor._encoder_task = None
+
+    def _sample(self):
+        """
+        Non-api method; the ENCODER phase task, snapshots the bank and records each motor's position for its speed
+        """
+        sample_us = self.update()
+        counts = self.counts
+        motors = self._motors
+        for i in range(self.size):
+            motors[i]._record_position(counts[i], sample_us)
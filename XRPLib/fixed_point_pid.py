@@ -0,0 +1,180 @@
+from .controller import Controller
+from array import array
+from micropython import const
+
+"""
+PID controller with exit condition, in integer fixed-point math
+"""
+
+# Fixed-point formats: errors and the integral are in 1/256ths, gains and outputs in 1/65536ths,
+# and time in 64us steps (15625 to the second), so the products stay within MicroPython's small ints
+# (no heap allocation) for errors up to a few hundred and outputs of a few units.
+ERROR_BITS = const(8)
+GAIN_BITS = const(16)
+OUTPUT_BITS = const(16)
+_TIME_SHIFT = const(6)
+_STEPS_PER_SECOND = const(15625)
+# Keep the integral within an array('i') slot, and within small ints
+_INTEGRAL_LIMIT = const(0x3FFFFFFF)
+
+# State, indexes into FixedPointPID._state
+_PREV_ERROR = const(0)
+_INTEGRAL = const(1)
+_PREV_OUTPUT = const(2)
+_TIMES = const(3)
+
+class FixedPointPID(Controller):
+
+    def __init__(self,
+                 kp = 1.0,
+                 ki = 0.0,
+                 kd = 0.0,
+                 min_output = 0.0,
+                 max_output = 1.0,
+                 max_derivative = None,
+                 max_integral = None,
+                 tolerance = 0.1,
+                 tolerance_count = 1,
+                 timestep = 0.02
+                 ):
+        """
+        A drop-in replacement for PID that does its math in integers. Only update_fixed(), which takes and returns
+        fixed-point ints, is allocation-free, so use it from timer callbacks; update() and update_with_timestep()
+        take and return floats, which allocate on MicroPython. Instead of reading the clock, it uses the timestep
+        the caller passes, or a fixed one for update().
+
+        :param kp: proportional gain
+        :param ki: integral gain
+        :param kd: derivative gain
+        :param min_output: minimum output
+        :param max_output: maximum output
+        :param max_derivative: maximum derivative (change per second)
+        :param max_integral: maximum integral windup allowed (will cap integral at this value)
+        :param tolerance: tolerance for exit condition
+        :param tolerance_count: number of times the error needs to be within tolerance for is_done to return True
+        :param timestep: the time between updates, in seconds, assumed by update()
+        """
+        self.kp = round(kp * (1 << GAIN_BITS))
+        self.ki = round(ki * (1 << GAIN_BITS))
+        self.kd = round(kd * (1 << GAIN_BITS))
+        self.min_output = round(min_output * (1 << OUTPUT_BITS))
+        self.max_output = round(max_output * (1 << OUTPUT_BITS))
+        # Output change per second; each update may change by this times its timestep
+        self.max_derivative = None if max_derivative is None else round(max_derivative * (1 << OUTPUT_BITS))
+        # Stored in the integral's own units: 1/256ths of the error times 64us steps
+        if max_integral is None:
+            self.max_integral = _INTEGRAL_LIMIT
+        else:
+            self.max_integral = min(_INTEGRAL_LIMIT, round(max_integral * (1 << ERROR_BITS) * _STEPS_PER_SECOND))
+        self.tolerance = round(tolerance * (1 << ERROR_BITS))
+        self.tolerance_count = tolerance_count
+        self.timestep_us = round(timestep * 1000000)
+
+        self._state = array('i', [0] * 4)
+
+    def update(self, error: float) -> float:
+        """
+        Handle a new update of this PID loop given an error, a fixed timestep after the last.
+
+        :param error: The error of the system being controlled by this PID controller
+        :type error: float
+
+        :return: The system output from the controller, to be used as an effort value or for any other purpose
+        :rtype: float
+        """
+        return self.update_fixed(round(error * (1 << ERROR_BITS)), self.timestep_us) / (1 << OUTPUT_BITS)
+
+    def update_with_timestep(self, error: float, timestep: float) -> float:
+        """
+        Handle a new update of this PID loop given an error and the time since the last update.
+
+        :param error: The error of the system being controlled by this PID controller
+        :type error: float
+        :param timestep: The time since the last update, in seconds
+        :type timestep: float
+
+        :return: The system output from the controller, to be used as an effort value or for any other purpose
+        :rtype: float
+        """
+        return self.update_fixed(round(error * (1 << ERROR_BITS)), int(timestep * 1000000)) / (1 << OUTPUT_BITS)
+
+    def update_fixed(self, error: int, timestep_us: int) -> int:
+        """
+        Handle a new update of this PID loop in fixed point, without allocating.
+
+        :param error: The error, in 1/256ths (the error times 2**ERROR_BITS)
+        :type error: int
+        :param timestep_us: The time since the last update, in microseconds
+        :type timestep_us: int
+
+        :return: The output, in 1/65536ths (the output times 2**OUTPUT_BITS)
+        :rtype: int
+        """
+        state = self._state
+        steps = timestep_us >> _TIME_SHIFT
+        if steps < 1:
+            steps = 1
+
+        if -self.tolerance < error < self.tolerance:
+            # Stop counting once done, so the count can't outgrow its slot
+            if state[_TIMES] < self.tolerance_count:
+                state[_TIMES] += 1
+        else:
+            state[_TIMES] = 0
+
+        integral = state[_INTEGRAL] + error * steps
+        if integral > self.max_integral:
+            integral = self.max_integral
+        elif integral < -self.max_integral:
+            integral = -self.max_integral
+
+        # In 1/256ths per second
+        derivative = (error - state[_PREV_ERROR]) * _STEPS_PER_SECOND // steps
+
+        # Gains times 1/256ths are in 2**-24ths; shift down to the output's 2**-16ths
+        output = (self.kp * error
+                  + self.ki * (integral // _STEPS_PER_SECOND)
+                  + self.kd * derivative) >> (GAIN_BITS + ERROR_BITS - OUTPUT_BITS)
+        state[_PREV_ERROR] = error
+        state[_INTEGRAL] = integral
+
+        # Bound output by minimum
+        if output > 0:
+            if output < self.min_output:
+                output = self.min_output
+        elif output > -self.min_output:
+            output = -self.min_output
+
+        # Bound output by maximum
+        if output > self.max_output:
+            output = self.max_output
+        elif output < -self.max_output:
+            output = -self.max_output
+
+        # Bound output by maximum acceleration
+        if self.max_derivative is not None:
+            change = self.max_derivative * steps // _STEPS_PER_SECOND
+            prev_output = state[_PREV_OUTPUT]
+            if output > prev_output + change:
+                output = prev_output + change
+            elif output < prev_output - change:
+                output = prev_output - change
+
+        # cache output for next update
+        state[_PREV_OUTPUT] = output
+
+        return output
+
+    def is_done(self) -> bool:
+        """
+        :return: if error is within tolerance for numTimesInTolerance consecutive times
+        :rtype: bool
+        """
+        return self._state[_TIMES] >= self.tolerance_count
+
+    def clear_history(self):
+        state = self._state
+        state[_PREV_ERROR] = 0
+        state[_INTEGRAL] = 0
+        state[_PREV_OUTPUT] = 0
+        state[_TIMES] = 0
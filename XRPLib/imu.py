@@ -9,29 +9,97 @@ try:
 except (TypeError, ModuleNotFoundError):
     # Import wrapped in a try/except so that autodoc generation can process properly
     pass
-from machine import I2C, Pin, Timer, disable_irq, enable_irq
+from machine import I2C, Pin, disable_irq, enable_irq, unique_id
+from binascii import hexlify
+from .config_store import ConfigStore
+from .control_scheduler import ControlScheduler
+from .mahony_filter import MahonyFilter
+from array import array
 import time, math
 
 class IMU():
 
+    # How often to drain the FIFO, and the most words to read in one burst
+    FIFO_READ_HZ = 50
+    FIFO_READ_WORDS = 64
+
+    # Gyro bias tracking: the robot counts as still while each drain's samples stay within STILL_DPS of each
+    # other for STILL_TIME seconds. The first still window after moving lets the robot settle, and each one
+    # after that moves the gyro offsets BIAS_GAIN of the way to its mean.
+    # A window further than BIAS_STEP_DPS from known offsets, or MAX_BIAS_DPS from zero, is a steady turn instead,
+    # unless the windows keep agreeing with each other for RELEARN_TIME seconds: then the offsets were stale
+    STILL_DPS = 1.0
+    STILL_TIME = 0.5
+    BIAS_GAIN = 0.25
+    BIAS_STEP_DPS = 0.5
+    MAX_BIAS_DPS = 3.0
+    RELEARN_TIME = 5.0
+
+    # Where the offsets are saved, how far the gyro offsets move before the saved copy is updated,
+    # and how long autosave_calibration() holds an update before writing it to flash
+    CALIBRATION_PATH = "imu_calibration.json"
+    CALIBRATION_SAVE_DPS = 0.05
+    CALIBRATION_SAVE_DELAY_MS = 60000
+
     _DEFAULT_IMU_INSTANCE = None
 
     @classmethod
-    def get_default_imu(cls):
+    def get_default_imu(cls, calibrate: bool = None):
         """
         Get the default XRP IMU instance. This is a singleton, so only one instance of the drivetrain will ever exist.
+
+        The first call loads the offsets saved for this board, so a warm start is ready at once. Only when none have
+        been saved does it block in calibrate() for a second, which needs the robot to stay still. Either way, the
+        gyro offsets keep being refined whenever the robot is still. The refined offsets are only written to flash
+        by save_calibration() or the autosave_calibration() task, never from the control loop.
+
+        :param calibrate: True to calibrate on the first call even with saved offsets, False to never block and
+                          start from the saved offsets (or none), or None to calibrate only without saved offsets
+        :type calibrate: bool
         """
 
         if cls._DEFAULT_IMU_INSTANCE is None:
-            cls._DEFAULT_IMU_INSTANCE = cls()  
-            cls._DEFAULT_IMU_INSTANCE.calibrate()
+            cls._DEFAULT_IMU_INSTANCE = cls()
+            loaded = cls._DEFAULT_IMU_INSTANCE.load_calibration()
+            if calibrate or (calibrate is None and not loaded):
+                cls._DEFAULT_IMU_INSTANCE.calibrate()
         return cls._DEFAULT_IMU_INSTANCE
 
-    def __init__(self, scl_pin: int|str = "I2C_SCL_1", sda_pin: int|str = "I2C_SDA_1", addr=LSM_ADDR_PRIMARY):
+    def __init__(self, scl_pin: int|str = "I2C_SCL_1", sda_pin: int|str = "I2C_SDA_1", addr=LSM_ADDR_PRIMARY, use_fifo: bool = True, use_fusion: bool = True):
+        """
+        The LSM6DSO IMU. The pitch, yaw and roll are tracked from the gyroscope in the background.
+
+        By default, each gyroscope sample is fused with the accelerometer by a MahonyFilter, so pitch and roll
+        are held to gravity instead of drifting with the gyro's bias, and the yaw is the heading about the vertical
+        even on a slope. With use_fusion False, the gyroscope's rates are just integrated about each axis.
+
+        By default, the gyroscope's samples are batched in the sensor's FIFO, with a timestamp every 8 samples,
+        and drained in one burst read FIFO_READ_HZ times a second. Every sample is integrated, over the sample
+        period the timestamps measure, so no angle is lost when a drain runs late, and higher data rates don't
+        cost more wakeups. With use_fifo False, the output registers are read and integrated once per sample instead.
+
+        The gyroscope's offsets are also tracked in the background: whenever the robot has been still for
+        STILL_TIME, they're nudged towards the average rate it measured, or replaced by it if it has disagreed
+        with them for RELEARN_TIME. Set track_bias False to keep the offsets from calibrate() fixed.
+
+        :param use_fifo: Whether to batch the gyroscope's samples in the sensor's FIFO
+        :type use_fifo: bool
+        :param use_fusion: Whether to fuse the accelerometer with the gyroscope
+        :type use_fusion: bool
+        """
         # I2C values
         self.i2c = I2C(id=1, scl=Pin(scl_pin), sda=Pin(sda_pin), freq=400000)
         self.addr = addr
 
+        # Orientation filter, reset with the member variables
+        self.fusion = MahonyFilter() if use_fusion else None
+
+        # Background bias tracking, and the saved offsets (only used once loaded or saved)
+        self.track_bias = True
+        self._calibration = None
+        self._calibration_key = hexlify(unique_id()).decode()
+        self._saved_gyro_offsets = None
+
         # Initialize member variables
         self._reset_member_variables()
 
@@ -39,17 +107,42 @@ class IMU():
         self.tb = bytearray(1)
         self.rb = bytearray(1)
 
+        # FIFO status and burst read buffers
+        self.use_fifo = use_fifo
+        self._fifo_status = bytearray(2)
+        self._fifo_buf = bytearray(LSM_FIFO_WORD_BYTES * self.FIFO_READ_WORDS)
+        # One view per burst length, so draining doesn't allocate them
+        fifo_view = memoryview(self._fifo_buf)
+        self._fifo_views = [fifo_view[:n * LSM_FIFO_WORD_BYTES] for n in range(self.FIFO_READ_WORDS + 1)]
+
+        # Output register buffers. The registers are little-endian int16s, like array('h') on the RP2040/RP2350,
+        # so the I2C reads decode every axis in place
+        self._raw_axis = array('h', [0])
+        self._raw_acc = array('h', [0] * 3)
+        self._raw_gyro = array('h', [0] * 3)
+        self._raw_gyro_acc = array('h', [0] * 6)
+
         # Copies of registers. Bytes and structs share the same memory
         # addresses, so changing one changes the other
         self.reg_ctrl1_xl_byte   = bytearray(1)
         self.reg_ctrl2_g_byte    = bytearray(1)
         self.reg_ctrl3_c_byte    = bytearray(1)
+        self.reg_ctrl10_c_byte   = bytearray(1)
         self.reg_ctrl1_xl_bits   = struct(addressof(self.reg_ctrl1_xl_byte), LSM_REG_LAYOUT_CTRL1_XL)
         self.reg_ctrl2_g_bits    = struct(addressof(self.reg_ctrl2_g_byte), LSM_REG_LAYOUT_CTRL2_G)
         self.reg_ctrl3_c_bits    = struct(addressof(self.reg_ctrl3_c_byte), LSM_REG_LAYOUT_CTRL3_C)
-
-        # Create timer
-        self.update_timer = Timer(-1)
+        self.reg_ctrl10_c_bits   = struct(addressof(self.reg_ctrl10_c_byte), LSM_REG_LAYOUT_CTRL10_C)
+
+        # Angle integration runs as a task on the shared control scheduler
+        self._scheduler = ControlScheduler.get_default_control_scheduler()
+        self._update_task = None
+        # When the output registers were last read, and the gyro rates read then, in mdps
+        self._last_update_us = 0
+        self._last_gyro = [0, 0, 0]
+        self._have_last_gyro = False
+        # The last gyro sample drained from the FIFO, raw
+        self._last_raw_x = self._last_raw_y = self._last_raw_z = 0
+        self._have_last_raw = False
 
         # Check if the IMU is connected
         if not self.is_connected():
@@ -93,6 +186,31 @@ class IMU():
         self.running_yaw = 0
         self.running_roll = 0
 
+        # Fused orientation: pitch and roll are the filter's plus these offsets, and yaw follows the filter's changes
+        self._pitch_offset = 0
+        self._roll_offset = 0
+        self._fused_yaw = 0
+        self._gravity = [0, 0, 0]
+        self._linear_acc = [0, 0, 0]
+        if self.fusion is not None:
+            self.fusion.reset()
+
+        # FIFO sample accounting: gyro samples integrated, and drains that found samples had been overwritten
+        self.fifo_samples = 0
+        self.fifo_overruns = 0
+
+        # Zero-velocity detection: gyro samples summed over the current still window, whether it's the first
+        # since moving, whether the offsets have been measured yet, and how many still windows have updated them
+        self._still_x = self._still_y = self._still_z = self._still_count = 0
+        self._still_settling = True
+        self._offsets_known = False
+        self.bias_updates = 0
+        # The rate of the first of a run of still windows that disagree with the offsets, and how many there were
+        self._relearn_x = self._relearn_y = self._relearn_z = 0
+        self._relearn_count = 0
+        # Gyro samples read per second, which sizes the still windows
+        self._samples_per_second = 1
+
     def _int16(self, d):
         return d if d < 0x8000 else d - 0x10000
 
@@ -104,10 +222,9 @@ class IMU():
         self.i2c.readfrom_mem_into(self.addr, reg, self.rb)
         return self.rb[0]
 
-    def _getregs(self, reg, num_bytes):
-        rx_buf = bytearray(num_bytes)
-        self.i2c.readfrom_mem_into(self.addr, reg, rx_buf)
-        return rx_buf
+    def _getregs_into(self, reg, buf):
+        self.i2c.readfrom_mem_into(self.addr, reg, buf)
+        return buf
 
     def _get2reg(self, reg):
         return self._getreg(reg) + self._getreg(reg+1) * 256
@@ -125,6 +242,14 @@ class IMU():
         self.reg_ctrl3_c_bits.BDU = bdu
         self._setreg(LSM_REG_CTRL3_C, self.reg_ctrl3_c_byte[0])
 
+    def _set_timestamp_en(self, timestamp_en = True):
+        """
+        Sets TIMESTAMP_EN bit
+        """
+        self.reg_ctrl10_c_byte[0] = self._getreg(LSM_REG_CTRL10_C)
+        self.reg_ctrl10_c_bits.TIMESTAMP_EN = timestamp_en
+        self._setreg(LSM_REG_CTRL10_C, self.reg_ctrl10_c_byte[0])
+
     def _set_if_inc(self, if_inc = True):
         """
         Sets InterFace INCrement bit
@@ -134,10 +259,10 @@ class IMU():
         self._setreg(LSM_REG_CTRL3_C, self.reg_ctrl3_c_byte[0])
 
     def _raw_to_mg(self, raw):
-        return self._int16((raw[1] << 8) | raw[0]) * LSM_MG_PER_LSB_2G * self._acc_scale_factor
+        return raw * LSM_MG_PER_LSB_2G * self._acc_scale_factor
 
     def _raw_to_mdps(self, raw):
-        return self._int16((raw[1] << 8) | raw[0]) * LSM_MDPS_PER_LSB_125DPS * self._gyro_scale_factor
+        return raw * LSM_MDPS_PER_LSB_125DPS * self._gyro_scale_factor
     
     """
         Public facing API Methods
@@ -180,7 +305,7 @@ class IMU():
         if wait_for_reset:
             # Loop with timeout
             t0 = time.ticks_ms()
-            while time.ticks_ms() < (t0 + wait_timeout_ms):
+            while time.ticks_diff(time.ticks_ms(), t0) < wait_timeout_ms:
                 # Check if register has returned to default value (0x04)
                 self.reg_ctrl3_c_byte[0] = self._getreg(LSM_REG_CTRL3_C)
                 if self.reg_ctrl3_c_byte[0] == 0x04:
@@ -203,10 +328,10 @@ class IMU():
         :rtype: int
         """
         # Burst read data registers
-        raw_bytes = self._getregs(LSM_REG_OUTX_L_A, 2)
+        raw = self._getregs_into(LSM_REG_OUTX_L_A, self._raw_axis)
 
         # Convert raw data to mg's
-        return self._raw_to_mg(raw_bytes[0:2]) - self.acc_offsets[0]
+        return self._raw_to_mg(raw[0]) - self.acc_offsets[0]
 
     def get_acc_y(self):
         """
@@ -214,10 +339,10 @@ class IMU():
         :rtype: int
         """
         # Burst read data registers
-        raw_bytes = self._getregs(LSM_REG_OUTY_L_A, 2)
+        raw = self._getregs_into(LSM_REG_OUTY_L_A, self._raw_axis)
 
         # Convert raw data to mg's
-        return self._raw_to_mg(raw_bytes[0:2]) - self.acc_offsets[1]
+        return self._raw_to_mg(raw[0]) - self.acc_offsets[1]
 
     def get_acc_z(self):
         """
@@ -225,10 +350,10 @@ class IMU():
         :rtype: int
         """
         # Burst read data registers
-        raw_bytes = self._getregs(LSM_REG_OUTZ_L_A, 2)
+        raw = self._getregs_into(LSM_REG_OUTZ_L_A, self._raw_axis)
 
         # Convert raw data to mg's
-        return self._raw_to_mg(raw_bytes[0:2]) - self.acc_offsets[2]
+        return self._raw_to_mg(raw[0]) - self.acc_offsets[2]
     
     def get_acc_rates(self):
         """
@@ -236,12 +361,12 @@ class IMU():
         :rtype: list<int>
         """
         # Burst read data registers
-        raw_bytes = self._getregs(LSM_REG_OUTX_L_A, 6)
+        raw = self._getregs_into(LSM_REG_OUTX_L_A, self._raw_acc)
 
         # Convert raw data to mg's
-        self.irq_v[0][0] = self._raw_to_mg(raw_bytes[0:2]) - self.acc_offsets[0]
-        self.irq_v[0][1] = self._raw_to_mg(raw_bytes[2:4]) - self.acc_offsets[1]
-        self.irq_v[0][2] = self._raw_to_mg(raw_bytes[4:6]) - self.acc_offsets[2]
+        self.irq_v[0][0] = self._raw_to_mg(raw[0]) - self.acc_offsets[0]
+        self.irq_v[0][1] = self._raw_to_mg(raw[1]) - self.acc_offsets[1]
+        self.irq_v[0][2] = self._raw_to_mg(raw[2]) - self.acc_offsets[2]
 
         return self.irq_v[0]
 
@@ -250,30 +375,30 @@ class IMU():
             Individual axis read for the Gyroscope's X-axis, in mdps
         """
         # Burst read data registers
-        raw_bytes = self._getregs(LSM_REG_OUTX_L_G, 2)
+        raw = self._getregs_into(LSM_REG_OUTX_L_G, self._raw_axis)
 
         # Convert raw data to mdps
-        return self._raw_to_mdps(raw_bytes[0:2]) - self.gyro_offsets[0]
+        return self._raw_to_mdps(raw[0]) - self.gyro_offsets[0]
 
     def get_gyro_y_rate(self):
         """
             Individual axis read for the Gyroscope's Y-axis, in mdps
         """
         # Burst read data registers
-        raw_bytes = self._getregs(LSM_REG_OUTY_L_G, 2)
+        raw = self._getregs_into(LSM_REG_OUTY_L_G, self._raw_axis)
 
         # Convert raw data to mdps
-        return self._raw_to_mdps(raw_bytes[0:2]) - self.gyro_offsets[1]
+        return self._raw_to_mdps(raw[0]) - self.gyro_offsets[1]
 
     def get_gyro_z_rate(self):
         """
             Individual axis read for the Gyroscope's Z-axis, in mdps
         """
         # Burst read data registers
-        raw_bytes = self._getregs(LSM_REG_OUTZ_L_G, 2)
+        raw = self._getregs_into(LSM_REG_OUTZ_L_G, self._raw_axis)
 
         # Convert raw data to mdps
-        return self._raw_to_mdps(raw_bytes[0:2]) - self.gyro_offsets[2]
+        return self._raw_to_mdps(raw[0]) - self.gyro_offsets[2]
 
     def get_gyro_rates(self):
         """
@@ -281,12 +406,12 @@ class IMU():
             The order of the values is x, y, z.
         """
         # Burst read data registers
-        raw_bytes = self._getregs(LSM_REG_OUTX_L_G, 6)
+        raw = self._getregs_into(LSM_REG_OUTX_L_G, self._raw_gyro)
 
         # Convert raw data to mdps
-        self.irq_v[1][0] = self._raw_to_mdps(raw_bytes[0:2]) - self.gyro_offsets[0]
-        self.irq_v[1][1] = self._raw_to_mdps(raw_bytes[2:4]) - self.gyro_offsets[1]
-        self.irq_v[1][2] = self._raw_to_mdps(raw_bytes[4:6]) - self.gyro_offsets[2]
+        self.irq_v[1][0] = self._raw_to_mdps(raw[0]) - self.gyro_offsets[0]
+        self.irq_v[1][1] = self._raw_to_mdps(raw[1]) - self.gyro_offsets[1]
+        self.irq_v[1][2] = self._raw_to_mdps(raw[2]) - self.gyro_offsets[2]
 
         return self.irq_v[1]
 
@@ -297,21 +422,53 @@ class IMU():
             The order of the values is x, y, z.
         """
         # Burst read data registers
-        raw_bytes = self._getregs(LSM_REG_OUTX_L_G, 12)
+        raw = self._getregs_into(LSM_REG_OUTX_L_G, self._raw_gyro_acc)
 
         # Convert raw data to mg's and mdps
-        self.irq_v[0][0] = self._raw_to_mg(raw_bytes[6:8]) - self.acc_offsets[0]
-        self.irq_v[0][1] = self._raw_to_mg(raw_bytes[8:10]) - self.acc_offsets[1]
-        self.irq_v[0][2] = self._raw_to_mg(raw_bytes[10:12]) - self.acc_offsets[2]
-        self.irq_v[1][0] = self._raw_to_mdps(raw_bytes[0:2]) - self.gyro_offsets[0]
-        self.irq_v[1][1] = self._raw_to_mdps(raw_bytes[2:4]) - self.gyro_offsets[1]
-        self.irq_v[1][2] = self._raw_to_mdps(raw_bytes[4:6]) - self.gyro_offsets[2]
+        self.irq_v[0][0] = self._raw_to_mg(raw[3]) - self.acc_offsets[0]
+        self.irq_v[0][1] = self._raw_to_mg(raw[4]) - self.acc_offsets[1]
+        self.irq_v[0][2] = self._raw_to_mg(raw[5]) - self.acc_offsets[2]
+        self.irq_v[1][0] = self._raw_to_mdps(raw[0]) - self.gyro_offsets[0]
+        self.irq_v[1][1] = self._raw_to_mdps(raw[1]) - self.gyro_offsets[1]
+        self.irq_v[1][2] = self._raw_to_mdps(raw[2]) - self.gyro_offsets[2]
 
         return self.irq_v
     
+    def get_gravity(self):
+        """
+        Get the direction of gravity estimated by the fusion filter, in the IMU's axes: the reaction to it, which
+        the accelerometer reads as +1000 mg along z when level. The order of the values is x, y, z.
+
+        :return: The gravity vector in mg, or None without fusion
+        :rtype: list<float>
+        """
+        if self.fusion is None:
+            return None
+        gravity = self.fusion.get_gravity()
+        self._gravity[0] = gravity[0] * 1000
+        self._gravity[1] = gravity[1] * 1000
+        self._gravity[2] = gravity[2] * 1000
+        return self._gravity
+
+    def get_linear_acceleration(self):
+        """
+        Get the latest acceleration with gravity taken out, in the IMU's axes. The order of the values is x, y, z.
+
+        :return: The linear acceleration in mg, or None without fusion
+        :rtype: list<float>
+        """
+        gravity = self.get_gravity()
+        if gravity is None:
+            return None
+        acc = self.irq_v[0]
+        self._linear_acc[0] = acc[0] - gravity[0]
+        self._linear_acc[1] = acc[1] - gravity[1]
+        self._linear_acc[2] = acc[2] - gravity[2]
+        return self._linear_acc
+
     def get_pitch(self):
         """
-        Get the pitch of the IMU in degrees. Unbounded in range
+        Get the pitch of the IMU in degrees. Unbounded in range without fusion; with it, measured from gravity
 
         :return: The pitch of the IMU in degrees
         :rtype: float
@@ -338,7 +495,7 @@ class IMU():
     
     def get_roll(self):
         """
-        Get the roll of the IMU in degrees. Unbounded in range
+        Get the roll of the IMU in degrees. Unbounded in range without fusion; with it, measured from gravity
 
         :return: The roll of the IMU in degrees
         :rtype: float
@@ -349,7 +506,7 @@ class IMU():
         """
         Reset the pitch to 0
         """
-        self.running_pitch = 0
+        self.set_pitch(0)
 
     def reset_yaw(self):
         """
@@ -361,7 +518,7 @@ class IMU():
         """
         Reset the roll to 0
         """
-        self.running_roll = 0
+        self.set_roll(0)
 
     def set_pitch(self, pitch):
         """
@@ -370,6 +527,7 @@ class IMU():
         :param pitch: The pitch to set the IMU to
         :type pitch: float
         """
+        self._pitch_offset += pitch - self.running_pitch
         self.running_pitch = pitch
 
     def set_yaw(self, yaw):
@@ -388,6 +546,7 @@ class IMU():
         :param roll: The roll to set the IMU to
         :type roll: float
         """
+        self._roll_offset += roll - self.running_roll
         self.running_roll = roll
 
     def temperature(self):
@@ -509,8 +668,10 @@ class IMU():
         num_vals = 0
         # Wait a bit for sensor to start measuring (data registers may default to something nonsensical)
         time.sleep(.1)
+        period_us = 1000000 // self.timer_frequency
         start_time = time.ticks_ms()
-        while time.ticks_ms() < start_time + calibration_time*1000:
+        next_us = time.ticks_us()
+        while time.ticks_diff(time.ticks_ms(), start_time) < calibration_time*1000:
             cur_vals = self.get_acc_gyro_rates()
             # Accelerometer averages
             avg_vals[0][0] += cur_vals[0][0]
@@ -520,9 +681,12 @@ class IMU():
             avg_vals[1][0] += cur_vals[1][0]
             avg_vals[1][1] += cur_vals[1][1]
             avg_vals[1][2] += cur_vals[1][2]
-            # Increment counter and wait for next loop
+            # Increment counter and wait for the next sample, keeping to the data rate however long reading took
             num_vals += 1
-            time.sleep(1 / self.timer_frequency)
+            next_us = time.ticks_add(next_us, period_us)
+            wait_us = time.ticks_diff(next_us, time.ticks_us())
+            if wait_us > 0:
+                time.sleep_us(wait_us)
 
         # Compute averages
         avg_vals[0][0] /= num_vals
@@ -536,20 +700,369 @@ class IMU():
 
         self.acc_offsets = avg_vals[0]
         self.gyro_offsets = avg_vals[1]
+        self._offsets_known = True
+        self._still_count = 0
+        self._still_settling = True
+        self._relearn_count = 0
+        if self._calibration is not None:
+            self.save_calibration()
         self._start_timer()
 
+    def _calibration_store(self):
+        # The offsets of every board this file has been on, keyed by its unique ID
+        if self._calibration is None:
+            self._calibration = ConfigStore(self.CALIBRATION_PATH, {self._calibration_key: None},
+                                            self.CALIBRATION_SAVE_DELAY_MS)
+        return self._calibration
+
+    def load_calibration(self) -> bool:
+        """
+        Use the offsets saved for this board by an earlier calibrate() or background tracking, instead of
+        calibrating again. From then on, calibrate() and the bias tracking keep the saved offsets up to date.
+
+        :return: True if offsets were saved for this board, otherwise False
+        :rtype: bool
+        """
+        saved = self._calibration_store().get(self._calibration_key)
+        try:
+            gyro_offsets = [float(v) for v in saved["gyro"][:3]]
+            acc_offsets = [float(v) for v in saved["acc"][:3]]
+        except (TypeError, KeyError, ValueError):
+            return False
+        if len(gyro_offsets) != 3 or len(acc_offsets) != 3:
+            return False
+        self.gyro_offsets = gyro_offsets
+        self.acc_offsets = acc_offsets
+        self._saved_gyro_offsets = list(gyro_offsets)
+        # The bias may have shifted since they were saved (e.g. at another temperature), so rather than being
+        # checked against them, the first still window replaces them
+        self._offsets_known = False
+        self._still_count = 0
+        self._still_settling = True
+        self._relearn_count = 0
+        return True
+
+    def save_calibration(self, flush: bool = True):
+        """
+        Save the current offsets for this board, so the next start can load them instead of calibrating.
+
+        :param flush: Whether to write them to flash now, rather than after CALIBRATION_SAVE_DELAY_MS
+        :type flush: bool
+        """
+        store = self._calibration_store()
+        self._saved_gyro_offsets = list(self.gyro_offsets)
+        store.set(self._calibration_key, {"gyro": list(self.gyro_offsets), "acc": list(self.acc_offsets)})
+        if flush:
+            try:
+                store.flush()
+            except OSError as e:
+                print("IMU calibration save failed:", e)
+
+    async def autosave_calibration(self, poll_ms: int = 500):
+        """
+        A task that writes the offsets the bias tracking has refined to flash, CALIBRATION_SAVE_DELAY_MS after
+        they change; start it once with asyncio.create_task(imu.autosave_calibration()). Programs without an
+        event loop can call save_calibration() instead, e.g. once the robot has finished moving.
+        """
+        await self._calibration_store().autosave(poll_ms)
+
     def _start_timer(self):
-        self.update_timer.init(freq=self.timer_frequency, callback=lambda t:self._update_imu_readings())
+        self._stop_timer()
+        if self.fusion is not None:
+            # Offsets may have changed (calibrate()), so start again from level, keeping the angles
+            self.fusion.reset()
+            self._fused_yaw = 0
+            self._pitch_offset = self.running_pitch
+            self._roll_offset = self.running_roll
+        if self.use_fifo:
+            self._start_fifo()
+            self._samples_per_second = self.timer_frequency
+            # Drain the FIFO in batches of several samples
+            divider = max(1, round(self._scheduler.rate_hz / min(self.FIFO_READ_HZ, self.timer_frequency)))
+            self._update_task = self._scheduler.add_task(self._drain_fifo, ControlScheduler.IMU, divider, name="imu")
+            return
+        # Run at the sensor's data rate, or as close as the scheduler's base rate allows
+        self._have_last_gyro = False
+        divider = max(1, round(self._scheduler.rate_hz / self.timer_frequency))
+        self._samples_per_second = self._scheduler.rate_hz / divider
+        self._update_task = self._scheduler.add_task(self._update_imu_readings, ControlScheduler.IMU, divider, name="imu")
 
     def _stop_timer(self):
-        self.update_timer.deinit()
+        if self._update_task is not None:
+            self._scheduler.remove_task(self._update_task)
+            self._update_task = None
+            if self.use_fifo:
+                self._stop_fifo()
+
+    def _start_fifo(self):
+        # Start from an empty FIFO, so samples from before (e.g. while calibrating) aren't integrated
+        self._stop_fifo()
+        self._reset_sample_period()
+        self._have_last_raw = False
+        # The watermark flags a drain's worth of samples and their timestamps
+        words_per_sample = 17 if self.fusion is not None else 9
+        watermark = min(0x1FF, max(1, self.timer_frequency // self.FIFO_READ_HZ) * words_per_sample // 8)
+        self._setreg(LSM_REG_FIFO_CTRL1, watermark & 0xFF)
+        self._setreg(LSM_REG_FIFO_CTRL2, watermark >> 8)
+        self._set_timestamp_en()
+        # Batch the gyroscope at its data rate, and the accelerometer at its own if fusing
+        batch_rates = self._getreg(LSM_REG_CTRL2_G) & 0xF0
+        if self.fusion is not None:
+            batch_rates |= self._getreg(LSM_REG_CTRL1_XL) >> 4
+        self._setreg(LSM_REG_FIFO_CTRL3, batch_rates)
+        self._setreg(LSM_REG_FIFO_CTRL4, LSM_FIFO_DEC_TS_BATCH_8 | LSM_FIFO_MODE_CONTINUOUS)
+
+    def _stop_fifo(self):
+        # Bypass mode stops batching and empties the FIFO
+        self._setreg(LSM_REG_FIFO_CTRL4, LSM_FIFO_MODE_BYPASS)
+
+    def _reset_sample_period(self):
+        # Until two timestamps have been seen, assume the nominal data rate
+        self._sample_period = 1 / self.timer_frequency
+        self._last_timestamp = None
+        self._samples_since_timestamp = 0
+
+    def _drain_fifo(self):
+        # Called at FIFO_READ_HZ from the IMU phase of the control scheduler
+        status = self._fifo_status
+        self.i2c.readfrom_mem_into(self.addr, LSM_REG_FIFO_STATUS1, status)
+        if status[1] & LSM_FIFO_STATUS2_OVR:
+            self.fifo_overruns += 1
+        words = status[0] | (status[1] & LSM_FIFO_STATUS2_DIFF_MSB) << 8
+        while words > 0:
+            n = min(words, self.FIFO_READ_WORDS)
+            # The sensor wraps the register address back to the tag after each word, so one read gets them all
+            self.i2c.readfrom_mem_into(self.addr, LSM_REG_FIFO_DATA_OUT_TAG, self._fifo_views[n])
+            self._integrate_fifo_words(n)
+            words -= n
+
+    def _integrate_fifo_words(self, n):
+        buf = self._fifo_buf
+        fusion = self.fusion
+        # Each sample is integrated with the trapezoid rule, from the one before it to itself: as raw units
+        # are ints, the rate over each interval is kept doubled, as the sum of the two samples.
+        # Without fusion, sum the raw gyro samples between timestamps, and integrate each run at once
+        sum_x = sum_y = sum_z = count = 0
+        last_x = self._last_raw_x
+        last_y = self._last_raw_y
+        last_z = self._last_raw_z
+        have_last = self._have_last_raw
+        # Every gyro sample's sum and spread, for the zero-velocity detector
+        total_x = total_y = total_z = total = 0
+        lo_x = lo_y = lo_z = 32767
+        hi_x = hi_y = hi_z = -32768
+        for i in range(0, n * LSM_FIFO_WORD_BYTES, LSM_FIFO_WORD_BYTES):
+            tag = buf[i] >> 3
+            if tag == LSM_FIFO_TAG_GYRO:
+                raw_x = self._int16((buf[i+2] << 8) | buf[i+1])
+                raw_y = self._int16((buf[i+4] << 8) | buf[i+3])
+                raw_z = self._int16((buf[i+6] << 8) | buf[i+5])
+                total_x += raw_x
+                total_y += raw_y
+                total_z += raw_z
+                total += 1
+                if raw_x < lo_x: lo_x = raw_x
+                if raw_x > hi_x: hi_x = raw_x
+                if raw_y < lo_y: lo_y = raw_y
+                if raw_y > hi_y: hi_y = raw_y
+                if raw_z < lo_z: lo_z = raw_z
+                if raw_z > hi_z: hi_z = raw_z
+                if not have_last:
+                    # The first sample since the FIFO started has nothing before it
+                    last_x = raw_x
+                    last_y = raw_y
+                    last_z = raw_z
+                    have_last = True
+                if fusion is not None:
+                    self._fuse_sample(raw_x + last_x, raw_y + last_y, raw_z + last_z, self._sample_period)
+                    self._samples_since_timestamp += 1
+                    self.fifo_samples += 1
+                else:
+                    sum_x += raw_x + last_x
+                    sum_y += raw_y + last_y
+                    sum_z += raw_z + last_z
+                    count += 1
+                last_x = raw_x
+                last_y = raw_y
+                last_z = raw_z
+            elif tag == LSM_FIFO_TAG_TIMESTAMP:
+                self._add_gyro_samples(sum_x, sum_y, sum_z, count)
+                sum_x = sum_y = sum_z = count = 0
+                # Only the low 30 bits, which stay a small int; intervals are far shorter than they wrap
+                self._update_sample_period(buf[i+1] | (buf[i+2] << 8) | (buf[i+3] << 16) | ((buf[i+4] & 0x3F) << 24))
+            elif tag == LSM_FIFO_TAG_ACCEL:
+                self.irq_v[0][0] = self._raw_to_mg(self._int16((buf[i+2] << 8) | buf[i+1])) - self.acc_offsets[0]
+                self.irq_v[0][1] = self._raw_to_mg(self._int16((buf[i+4] << 8) | buf[i+3])) - self.acc_offsets[1]
+                self.irq_v[0][2] = self._raw_to_mg(self._int16((buf[i+6] << 8) | buf[i+5])) - self.acc_offsets[2]
+        self._add_gyro_samples(sum_x, sum_y, sum_z, count)
+        self._last_raw_x = last_x
+        self._last_raw_y = last_y
+        self._last_raw_z = last_z
+        self._have_last_raw = have_last
+        if fusion is not None:
+            self._update_fused_angles()
+        if total > 0 and self.track_bias:
+            spread = max(hi_x - lo_x, hi_y - lo_y, hi_z - lo_z) * LSM_MDPS_PER_LSB_125DPS * self._gyro_scale_factor
+            self._track_bias(total_x, total_y, total_z, total, spread)
+
+    def _track_bias(self, sum_x, sum_y, sum_z, count, spread):
+        # Zero-velocity detection: while the robot is still, the gyro's average rate is its bias.
+        # Takes raw gyro samples summed over a batch, and how far apart they were in mdps
+        scale = LSM_MDPS_PER_LSB_125DPS * self._gyro_scale_factor
+        if spread > self.STILL_DPS * 1000:
+            self._still_count = 0
+            self._still_settling = True
+            self._relearn_count = 0
+            return
+        if self._still_count == 0:
+            self._still_x = self._still_y = self._still_z = 0
+        self._still_x += sum_x
+        self._still_y += sum_y
+        self._still_z += sum_z
+        self._still_count += count
+        if self._still_count < self.STILL_TIME * self._samples_per_second:
+            return
+        n = self._still_count
+        self._still_count = 0
+        if self._still_settling:
+            # The robot may still be coasting to a stop
+            self._still_settling = False
+            return
+        scale /= n
+        rate_x = self._still_x * scale
+        rate_y = self._still_y * scale
+        rate_z = self._still_z * scale
+
+        # Still, but turning steadily, isn't bias; once the offsets are known, they only move a little at a time
+        offsets = self.gyro_offsets
+        limit = self.MAX_BIAS_DPS * 1000
+        if abs(rate_x) > limit or abs(rate_y) > limit or abs(rate_z) > limit:
+            return
+        limit = self.BIAS_STEP_DPS * 1000
+        gain = self.BIAS_GAIN if self._offsets_known else 1
+        if self._offsets_known and (abs(rate_x - offsets[0]) > limit or abs(rate_y - offsets[1]) > limit
+                                    or abs(rate_z - offsets[2]) > limit):
+            # A robot doesn't turn steadily for long without moving, so windows that keep agreeing with each other
+            # but not with the offsets mean the offsets are stale
+            if self._relearn_count == 0 or abs(rate_x - self._relearn_x) > limit \
+                    or abs(rate_y - self._relearn_y) > limit or abs(rate_z - self._relearn_z) > limit:
+                self._relearn_x = rate_x
+                self._relearn_y = rate_y
+                self._relearn_z = rate_z
+                self._relearn_count = 0
+            self._relearn_count += 1
+            if self._relearn_count * self.STILL_TIME < self.RELEARN_TIME:
+                return
+            gain = 1
+        self._relearn_count = 0
+        offsets[0] += gain * (rate_x - offsets[0])
+        offsets[1] += gain * (rate_y - offsets[1])
+        offsets[2] += gain * (rate_z - offsets[2])
+        self._offsets_known = True
+        self.bias_updates += 1
+
+        # Keep the saved offsets up to date in RAM; writing them to flash would stall the control loop, so that's
+        # left to save_calibration() or autosave_calibration() from the program
+        if self._calibration is None:
+            return
+        saved = self._saved_gyro_offsets
+        limit = self.CALIBRATION_SAVE_DPS * 1000
+        if saved is None or abs(offsets[0] - saved[0]) > limit or abs(offsets[1] - saved[1]) > limit \
+                or abs(offsets[2] - saved[2]) > limit:
+            self.save_calibration(flush=False)
+
+    def _update_sample_period(self, timestamp):
+        # The timestamp counts 25us ticks of the sensor's own clock, which also paces its samples
+        if self._last_timestamp is not None and self._samples_since_timestamp > 0:
+            ticks = (timestamp - self._last_timestamp) & 0x3FFFFFFF
+            period = ticks * LSM_TIMESTAMP_US_PER_LSB / 1000000 / self._samples_since_timestamp
+            # Ignore intervals that span an overrun
+            nominal = 1 / self.timer_frequency
+            if nominal / 2 < period < nominal * 2:
+                self._sample_period = period
+        self._last_timestamp = timestamp
+        self._samples_since_timestamp = 0
+
+    def _add_gyro_samples(self, sum_x, sum_y, sum_z, count):
+        if count == 0:
+            return
+        self._samples_since_timestamp += count
+        self.fifo_samples += count
+        # From summed pairs of raw readings to degrees over count sample periods
+        scale = LSM_MDPS_PER_LSB_125DPS * self._gyro_scale_factor / 2
+        seconds = self._sample_period / 1000
+        delta_pitch = (sum_x * scale - count * self.gyro_offsets[0]) * seconds
+        delta_roll = (sum_y * scale - count * self.gyro_offsets[1]) * seconds
+        delta_yaw = (sum_z * scale - count * self.gyro_offsets[2]) * seconds
+
+        state = disable_irq()
+        self.running_pitch += delta_pitch
+        self.running_roll += delta_roll
+        self.running_yaw += delta_yaw
+        enable_irq(state)
+
+    def _fuse_sample(self, raw_x, raw_y, raw_z, dt):
+        # One gyro sample, summed with the one before, fused with the latest accelerometer reading
+        to_rad = LSM_MDPS_PER_LSB_125DPS * self._gyro_scale_factor * math.pi / 360000
+        offset_to_rad = math.pi / 180000
+        acc = self.irq_v[0]
+        self.fusion.update(raw_x * to_rad - self.gyro_offsets[0] * offset_to_rad,
+                           raw_y * to_rad - self.gyro_offsets[1] * offset_to_rad,
+                           raw_z * to_rad - self.gyro_offsets[2] * offset_to_rad,
+                           acc[0] / 1000, acc[1] / 1000, acc[2] / 1000, dt)
+
+    def _update_fused_angles(self):
+        about_x, about_y, about_z = self.fusion.get_angles()
+        # The filter's heading wraps, so follow its changes to keep the yaw unbounded
+        delta_yaw = (about_z - self._fused_yaw + 180) % 360 - 180
+        self._fused_yaw = about_z
+
+        state = disable_irq()
+        self.running_pitch = about_x + self._pitch_offset
+        self.running_roll = about_y + self._roll_offset
+        self.running_yaw += delta_yaw
+        enable_irq(state)
 
     def _update_imu_readings(self):
-        # Called every tick through a callback timer
-        self.get_gyro_rates()
-        delta_pitch = self.irq_v[1][0] / 1000 / self.timer_frequency
-        delta_roll = self.irq_v[1][1] / 1000 / self.timer_frequency
-        delta_yaw = self.irq_v[1][2] / 1000 / self.timer_frequency
+        # Called every IMU phase of the control scheduler. A busy program can delay or swallow runs, so the rates
+        # are integrated over the time measured since the last reading, with the trapezoid rule
+        if self.fusion is not None:
+            self.get_acc_gyro_rates()
+        else:
+            self.get_gyro_rates()
+        now = time.ticks_us()
+        gyro = self.irq_v[1]
+        last = self._last_gyro
+        dt = time.ticks_diff(now, self._last_update_us) / 1000000 if self._have_last_gyro else 0
+        self._last_update_us = now
+        self._have_last_gyro = True
+        if self.track_bias:
+            # Read one sample at a time, so the spread is how far it is from the last one
+            raw = self._raw_gyro_acc if self.fusion is not None else self._raw_gyro
+            spread = 0
+            if dt > 0:
+                spread = max(abs(gyro[0] - last[0]), abs(gyro[1] - last[1]), abs(gyro[2] - last[2]))
+            self._track_bias(raw[0], raw[1], raw[2], 1, spread)
+        rate_x = (gyro[0] + last[0]) / 2
+        rate_y = (gyro[1] + last[1]) / 2
+        rate_z = (gyro[2] + last[2]) / 2
+        last[0] = gyro[0]
+        last[1] = gyro[1]
+        last[2] = gyro[2]
+        if dt <= 0:
+            # The first reading since starting, with nothing to integrate from
+            return
+
+        if self.fusion is not None:
+            to_rad = math.pi / 180000
+            acc = self.irq_v[0]
+            self.fusion.update(rate_x * to_rad, rate_y * to_rad, rate_z * to_rad,
+                               acc[0] / 1000, acc[1] / 1000, acc[2] / 1000, dt)
+            self._update_fused_angles()
+            return
+        delta_pitch = rate_x / 1000 * dt
+        delta_roll = rate_y / 1000 * dt
+        delta_yaw = rate_z / 1000 * dt
 
         state = disable_irq()
         self.running_pitch += delta_pitch
@@ -10,10 +10,15 @@ LSM_ADDR_SECONDARY = const(0x6A)
 """
 	Register addresses
 """
+LSM_REG_FIFO_CTRL1       = const(0x07)
+LSM_REG_FIFO_CTRL2       = const(0x08)
+LSM_REG_FIFO_CTRL3       = const(0x09)
+LSM_REG_FIFO_CTRL4       = const(0x0A)
 LSM_REG_WHO_AM_I         = const(0x0F)
 LSM_REG_CTRL1_XL         = const(0x10)
 LSM_REG_CTRL2_G          = const(0x11)
 LSM_REG_CTRL3_C          = const(0x12)
+LSM_REG_CTRL10_C         = const(0x19)
 LSM_REG_OUT_TEMP_L       = const(0x20)
 LSM_REG_OUT_TEMP_H       = const(0x21)
 LSM_REG_OUTX_L_G         = const(0x22)
@@ -22,6 +27,9 @@ LSM_REG_OUTZ_L_G         = const(0x26)
 LSM_REG_OUTX_L_A         = const(0x28)
 LSM_REG_OUTY_L_A         = const(0x2A)
 LSM_REG_OUTZ_L_A         = const(0x2C)
+LSM_REG_FIFO_STATUS1     = const(0x3A)
+LSM_REG_FIFO_STATUS2     = const(0x3B)
+LSM_REG_FIFO_DATA_OUT_TAG = const(0x78)
 
 """
 	Bit field struct definitions of registers
@@ -44,6 +52,28 @@ LSM_REG_LAYOUT_CTRL3_C = {
     "IF_INC"    : BFUINT8 | 2 << BF_POS | 1 << BF_LEN,
     "SW_RESET"  : BFUINT8 | 0 << BF_POS | 1 << BF_LEN,
 }
+LSM_REG_LAYOUT_CTRL10_C = {
+    "TIMESTAMP_EN" : BFUINT8 | 5 << BF_POS | 1 << BF_LEN,
+}
+
+"""
+	FIFO settings and status bits
+"""
+# FIFO_CTRL4
+LSM_FIFO_MODE_BYPASS     = const(0x0)
+LSM_FIFO_MODE_CONTINUOUS = const(0x6)
+LSM_FIFO_DEC_TS_BATCH_8  = const(0x2 << 6)
+# FIFO_STATUS2
+LSM_FIFO_STATUS2_WTM      = const(0x80)
+LSM_FIFO_STATUS2_OVR      = const(0x40)
+LSM_FIFO_STATUS2_DIFF_MSB = const(0x03)
+# FIFO_DATA_OUT_TAG sensor tags (bits 7:3)
+LSM_FIFO_TAG_GYRO        = const(0x01)
+LSM_FIFO_TAG_ACCEL       = const(0x02)
+LSM_FIFO_TAG_TIMESTAMP   = const(0x04)
+# Each FIFO word is a tag byte and six data bytes
+LSM_FIFO_WORD_BYTES      = const(7)
+LSM_TIMESTAMP_US_PER_LSB = const(25)
 
 """
 	Dictionaries for possible register settings
@@ -0,0 +1,142 @@
+from array import array
+from micropython import const
+import math
+
+"""
+Mahony orientation filter, fusing a gyroscope and an accelerometer into a quaternion
+"""
+
+# State, indexes into MahonyFilter._state: the orientation quaternion, then the integral of the error
+_W = const(0)
+_X = const(1)
+_Y = const(2)
+_Z = const(3)
+_IX = const(4)
+_IY = const(5)
+_IZ = const(6)
+
+class MahonyFilter:
+
+    def __init__(self, kp: float = 1.0, ki: float = 0.02, accel_tolerance: float = 0.15):
+        """
+        Tracks orientation by integrating the gyroscope into a quaternion, and steering it so the gravity it
+        predicts lines up with what the accelerometer measures. That bounds pitch and roll drift from gyro bias,
+        while the gyro rides through bumps and acceleration. Heading can't be seen by the accelerometer, so
+        it's gyro-only, but it's integrated about the vertical axis even when the sensor is tilted.
+
+        Axes are the sensor's: the accelerometer reads +1 g along z when level.
+
+        :param kp: How strongly to steer towards the accelerometer, in rad/s per unit of error; the filter's
+                   time constant is about 1/kp seconds
+        :type kp: float
+        :param ki: How strongly to learn the gyro's bias from the error, in rad/s^2 per unit of error
+        :type ki: float
+        :param accel_tolerance: Skip the correction while the acceleration's magnitude is further than this
+                                from 1 g, as the robot is then accelerating rather than just feeling gravity
+        :type accel_tolerance: float
+        """
+        self.kp = kp
+        self.ki = ki
+        self.accel_tolerance = accel_tolerance
+        self._state = array('f', [1, 0, 0, 0, 0, 0, 0])
+
+    def reset(self):
+        """
+        Return to level, with no learned bias.
+        """
+        state = self._state
+        state[_W] = 1
+        for i in range(_X, _IZ + 1):
+            state[i] = 0
+
+    def update(self, gx: float, gy: float, gz: float, ax: float, ay: float, az: float, dt: float):
+        """
+        Advance the orientation by one sample.
+
+        :param gx, gy, gz: The angular rate, in rad/s
+        :type gx, gy, gz: float
+        :param ax, ay, az: The acceleration, in g
+        :type ax, ay, az: float
+        :param dt: The time since the last sample, in seconds
+        :type dt: float
+        """
+        state = self._state
+        w = state[_W]
+        x = state[_X]
+        y = state[_Y]
+        z = state[_Z]
+
+        norm_sq = ax*ax + ay*ay + az*az
+        tolerance = self.accel_tolerance
+        if (1 - tolerance)**2 < norm_sq < (1 + tolerance)**2:
+            inv_norm = 1/math.sqrt(norm_sq)
+            ax *= inv_norm
+            ay *= inv_norm
+            az *= inv_norm
+            # The error is the rotation from the measured gravity to the predicted one
+            vx = 2*(x*z - w*y)
+            vy = 2*(w*x + y*z)
+            vz = w*w - x*x - y*y + z*z
+            ex = ay*vz - az*vy
+            ey = az*vx - ax*vz
+            ez = ax*vy - ay*vx
+            if self.ki:
+                state[_IX] += self.ki*ex*dt
+                state[_IY] += self.ki*ey*dt
+                state[_IZ] += self.ki*ez*dt
+            gx += self.kp*ex
+            gy += self.kp*ey
+            gz += self.kp*ez
+        gx += state[_IX]
+        gy += state[_IY]
+        gz += state[_IZ]
+
+        # q += q * (0, g) * dt/2
+        half_dt = 0.5*dt
+        gx *= half_dt
+        gy *= half_dt
+        gz *= half_dt
+        nw = w - x*gx - y*gy - z*gz
+        nx = x + w*gx + y*gz - z*gy
+        ny = y + w*gy - x*gz + z*gx
+        nz = z + w*gz + x*gy - y*gx
+        inv_norm = 1/math.sqrt(nw*nw + nx*nx + ny*ny + nz*nz)
+        state[_W] = nw*inv_norm
+        state[_X] = nx*inv_norm
+        state[_Y] = ny*inv_norm
+        state[_Z] = nz*inv_norm
+
+    def get_quaternion(self) -> tuple:
+        """
+        :return: The orientation, as a unit quaternion (w, x, y, z)
+        :rtype: tuple<float>
+        """
+        state = self._state
+        return state[_W], state[_X], state[_Y], state[_Z]
+
+    def get_angles(self) -> tuple:
+        """
+        :return: The rotation about the x, y and z axes, in degrees (z-y-x order)
+        :rtype: tuple<float>
+        """
+        state = self._state
+        w = state[_W]
+        x = state[_X]
+        y = state[_Y]
+        z = state[_Z]
+        about_x = math.atan2(2*(w*x + y*z), 1 - 2*(x*x + y*y))
+        about_y = math.asin(max(-1.0, min(1.0, 2*(w*y - z*x))))
+        about_z = math.atan2(2*(w*z + x*y), 1 - 2*(y*y + z*z))
+        return math.degrees(about_x), math.degrees(about_y), math.degrees(about_z)
+
+    def get_gravity(self) -> tuple:
+        """
+        :return: The direction of gravity's reaction (up) in the sensor's axes, as a unit vector
+        :rtype: tuple<float>
+        """
+        state = self._state
+        w = state[_W]
+        x = state[_X]
+        y = state[_Y]
+        z = state[_Z]
+        return 2*(x*z - w*y), 2*(w*x + y*z), w*w - x*x - y*y + z*z
@@ -0,0 +1,161 @@
+from array import array
+import time
+
+class MoistureHistory:
+
+    RAW = 0
+    MINUTE = 1
+    HOUR = 2
+
+    def __init__(self, n_plants: int, sample_period_ms: int, raw_len: int = 240, minute_len: int = 60, hour_len: int = 48):
+        """
+        Fixed-size moisture history for a set of plants, kept at three resolutions:
+        the last raw_len raw samples, and min/mean/max rollups for each of the last
+        minute_len minutes and hour_len hours. Everything is stored in arrays allocated
+        up front, so add() never allocates.
+
+        Memory use is about n_plants * (2*raw_len + 6*minute_len + 6*hour_len + 16) bytes:
+        roughly 1.1 KB per plant with the defaults (2 minutes of raw samples at 500 ms,
+        1 hour of minutes and 2 days of hours).
+
+        :param n_plants: The number of plants sampled together on every add()
+        :type n_plants: int
+        :param sample_period_ms: The interval between add() calls, used to report sample ages
+        :type sample_period_ms: int
+        :param raw_len: The number of raw samples kept per plant
+        :type raw_len: int
+        :param minute_len: The number of 1-minute rollups kept per plant
+        :type minute_len: int
+        :param hour_len: The number of 1-hour rollups kept per plant
+        :type hour_len: int
+        """
+        self.n_plants = n_plants
+        self.sample_period_ms = sample_period_ms
+        self._len = (raw_len, minute_len, hour_len)
+        self._step_ms = (sample_period_ms, 60_000, 3_600_000)
+
+        self._raw = self._u16(n_plants * raw_len)
+        # Rollups for the minute and hour tiers, indexed [tier - 1]
+        self._lo = (self._u16(n_plants * minute_len), self._u16(n_plants * hour_len))
+        self._mean = (self._u16(n_plants * minute_len), self._u16(n_plants * hour_len))
+        self._hi = (self._u16(n_plants * minute_len), self._u16(n_plants * hour_len))
+
+        # Running accumulators for the minute/hour in progress, indexed (tier - 1) * n_plants + plant
+        self._acc_sum = array('I', bytes(4 * 2 * n_plants))
+        self._acc_lo = self._u16(2 * n_plants)
+        self._acc_hi = self._u16(2 * n_plants)
+        self._acc_count = [0, 0]
+
+        # Ring position and fill level per tier
+        self._head = [0, 0, 0]
+        self._count = [0, 0, 0]
+        self._minute_start = time.ticks_ms()
+        self._minutes_in_hour = 0
+
+        self._reset_acc(0)
+        self._reset_acc(1)
+
+    @staticmethod
+    def _u16(length):
+        return array('H', bytes(2 * length))
+
+    def _reset_acc(self, acc: int):
+        base = acc * self.n_plants
+        for p in range(self.n_plants):
+            self._acc_sum[base + p] = 0
+            self._acc_lo[base + p] = 0xFFFF
+            self._acc_hi[base + p] = 0
+        self._acc_count[acc] = 0
+
+    def add(self, values):
+        """
+        Record one sample for every plant.
+
+        :param values: The raw readings (0-65535), one per plant
+        :type values: list<int>
+        """
+        raw_len = self._len[0]
+        head = self._head[0]
+        n = self.n_plants
+        for p in range(n):
+            v = values[p]
+            self._raw[p * raw_len + head] = v
+            # Both the minute (k = p) and the hour (k = n + p) accumulators see every raw sample
+            k = p
+            while k < 2 * n:
+                self._acc_sum[k] += v
+                if v < self._acc_lo[k]:
+                    self._acc_lo[k] = v
+                if v > self._acc_hi[k]:
+                    self._acc_hi[k] = v
+                k += n
+        self._acc_count[0] += 1
+        self._acc_count[1] += 1
+        self._advance(0)
+
+        now = time.ticks_ms()
+        if time.ticks_diff(now, self._minute_start) >= 60_000:
+            self._minute_start = time.ticks_add(self._minute_start, 60_000)
+            if time.ticks_diff(now, self._minute_start) >= 60_000:
+                # Sampling stalled for more than a minute; don't try to catch up
+                self._minute_start = now
+            self._rollup(self.MINUTE)
+            self._minutes_in_hour += 1
+            if self._minutes_in_hour >= 60:
+                self._minutes_in_hour = 0
+                self._rollup(self.HOUR)
+
+    def _advance(self, tier: int):
+        self._head[tier] = (self._head[tier] + 1) % self._len[tier]
+        if self._count[tier] < self._len[tier]:
+            self._count[tier] += 1
+
+    def _rollup(self, tier: int):
+        acc = tier - 1
+        count = self._acc_count[acc]
+        if count == 0:
+            return
+        length = self._len[tier]
+        head = self._head[tier]
+        base = acc * self.n_plants
+        for p in range(self.n_plants):
+            slot = p * length + head
+            self._lo[acc][slot] = self._acc_lo[base + p]
+            self._mean[acc][slot] = self._acc_sum[base + p] // count
+            self._hi[acc][slot] = self._acc_hi[base + p]
+        self._reset_acc(acc)
+        self._advance(tier)
+
+    def count(self, tier: int = RAW) -> int:
+        """
+        :return: The number of entries currently stored per plant at this resolution
+        :rtype: int
+        """
+        return self._count[tier]
+
+    def rows(self, plant: int, tier: int = RAW):
+        """
+        Iterate over one plant's history at one resolution, oldest first.
+        Raw rows are (age_ms, value); rollup rows are (age_ms, min, mean, max),
+        where age_ms is how long before the newest entry the row was recorded.
+
+        :param plant: The plant index
+        :type plant: int
+        :param tier: MoistureHistory.RAW, MoistureHistory.MINUTE or MoistureHistory.HOUR
+        :type tier: int
+        """
+        if plant < 0 or plant >= self.n_plants:
+            raise ValueError("bad plant index")
+        length = self._len[tier]
+        count = self._count[tier]
+        head = self._head[tier]
+        step = self._step_ms[tier]
+        base = plant * length
+        for k in range(count):
+            slot = base + (head - count + k) % length
+            age = (count - 1 - k) * step
+            if tier == self.RAW:
+                yield age, self._raw[slot]
+            else:
+                acc = tier - 1
+                yield age, self._lo[acc][slot], self._mean[acc][slot], self._hi[acc][slot]
@@ -0,0 +1,149 @@
+from array import array
+import math
+
+"""
+Time-parameterized motion profiles, for moving a set distance within speed, acceleration and jerk limits
+"""
+
+class MotionProfile:
+
+    def __init__(self, distance: float, durations, accelerations, jerks):
+        """
+        A profile made of segments of constant jerk, starting and ending at rest. Use TrapezoidProfile or
+        SCurveProfile to create one.
+
+        :param distance: The signed distance to move
+        :type distance: float
+        :param durations: How long each segment lasts, in seconds
+        :type durations: list<float>
+        :param accelerations: The acceleration at the start of each segment
+        :type accelerations: list<float>
+        :param jerks: The (constant) jerk through each segment
+        :type jerks: list<float>
+        """
+        n = len(durations)
+        self.distance = distance
+        self._sign = -1 if distance < 0 else 1
+        self._durations = array('f', durations)
+        self._jerks = array('f', jerks)
+        # The time, position, velocity and acceleration at the start of each segment
+        self._t0 = array('f', [0] * n)
+        self._p0 = array('f', [0] * n)
+        self._v0 = array('f', [0] * n)
+        self._a0 = array('f', accelerations)
+        t = p = v = 0.0
+        for i in range(n):
+            self._t0[i] = t
+            self._p0[i] = p
+            self._v0[i] = v
+            dt = self._durations[i]
+            a = self._a0[i]
+            j = self._jerks[i]
+            p += v*dt + a*dt*dt/2 + j*dt*dt*dt/6
+            v += a*dt + j*dt*dt/2
+            t += dt
+        self.duration = t
+        self._segment = 0
+
+    def sample(self, t: float) -> tuple:
+        """
+        :param t: The time since the start of the profile, in seconds
+        :type t: float
+        :return: The position and velocity at time t; before the start and after the end, the profile is at rest
+        :rtype: tuple<float>
+        """
+        if t <= 0:
+            return 0.0, 0.0
+        if t >= self.duration:
+            return self.distance, 0.0
+        # Profiles are usually sampled in order, so carry on from the last segment
+        i = self._segment
+        if t < self._t0[i]:
+            i = 0
+        while i + 1 < len(self._t0) and t >= self._t0[i + 1]:
+            i += 1
+        self._segment = i
+        dt = t - self._t0[i]
+        a = self._a0[i]
+        j = self._jerks[i]
+        position = self._p0[i] + self._v0[i]*dt + a*dt*dt/2 + j*dt*dt*dt/6
+        velocity = self._v0[i] + a*dt + j*dt*dt/2
+        return self._sign*position, self._sign*velocity
+
+
+class TrapezoidProfile(MotionProfile):
+
+    def __init__(self, distance: float, max_velocity: float, max_acceleration: float):
+        """
+        Accelerates at max_acceleration up to max_velocity, cruises, then decelerates to stop at the distance.
+        Short moves that can't reach max_velocity become triangles, and a distance of 0 takes no time.
+        Raises ValueError if a limit isn't positive.
+
+        :param distance: The distance to move; negative to move backwards
+        :type distance: float
+        :param max_velocity: The cruising speed, in distance units per second
+        :type max_velocity: float
+        :param max_acceleration: The acceleration, in distance units per second squared
+        :type max_acceleration: float
+        """
+        if max_velocity <= 0 or max_acceleration <= 0:
+            raise ValueError("max_velocity and max_acceleration must be > 0")
+        if distance == 0:
+            # Already there
+            super().__init__(0, [], [], [])
+            return
+        d = abs(distance)
+        v = max_velocity
+        a = max_acceleration
+        if v*v/a > d:
+            # Triangle: start decelerating halfway
+            v = math.sqrt(d*a)
+        t_accel = v/a
+        t_cruise = (d - v*t_accel)/v if v > 0 else 0
+        super().__init__(distance, [t_accel, t_cruise, t_accel], [a, 0, -a], [0, 0, 0])
+
+
+class SCurveProfile(MotionProfile):
+
+    def __init__(self, distance: float, max_velocity: float, max_acceleration: float, max_jerk: float):
+        """
+        Like a TrapezoidProfile, but the acceleration ramps up and down at max_jerk instead of switching
+        instantly, which avoids jolts that make the wheels slip. Short moves reduce the speed (and then the
+        acceleration) they reach, and a distance of 0 takes no time. Raises ValueError if a limit isn't positive.
+
+        :param distance: The distance to move; negative to move backwards
+        :type distance: float
+        :param max_velocity: The cruising speed, in distance units per second
+        :type max_velocity: float
+        :param max_acceleration: The acceleration, in distance units per second squared
+        :type max_acceleration: float
+        :param max_jerk: The rate of change of acceleration, in distance units per second cubed
+        :type max_jerk: float
+        """
+        if max_velocity <= 0 or max_acceleration <= 0 or max_jerk <= 0:
+            raise ValueError("max_velocity, max_acceleration and max_jerk must be > 0")
+        if distance == 0:
+            # Already there
+            super().__init__(0, [], [], [])
+            return
+        d = abs(distance)
+        v = max_velocity
+        a = max_acceleration
+        j = max_jerk
+        if v < a*a/j:
+            # The acceleration never reaches its limit before the speed does
+            a = math.sqrt(v*j)
+        # Speeding up to v, and slowing down again, each cover v*(a/j + v/a)/2
+        if v*(a/j + v/a) > d:
+            # Too short to cruise: find the speed at which they add up to the distance
+            v = (math.sqrt((a/j)**2 + 4*d/a) - a/j)*a/2
+            if v < a*a/j:
+                v = (d*math.sqrt(j)/2)**(2/3)
+                a = math.sqrt(v*j)
+        t_jerk = a/j
+        t_accel = max(0.0, v/a - t_jerk)
+        t_cruise = max(0.0, (d - v*(t_jerk + v/a))/v) if v > 0 else 0
+        super().__init__(distance,
+                         [t_jerk, t_accel, t_jerk, t_cruise, t_jerk, t_accel, t_jerk],
+                         [0, a, a, 0, 0, -a, -a],
+                         [j, 0, -j, 0, -j, 0, j])
@@ -1,4 +1,5 @@
 from .encoded_motor import EncodedMotor
+from .encoder_bank import EncoderBank
 class MotorGroup(EncodedMotor):
     def __init__(self, *motors: EncodedMotor):
         """
@@ -8,6 +9,7 @@ class MotorGroup(EncodedMotor):
         :type motors: tuple<EncodedMotor>
         """
         self.motors = []
+        self._bank = None
         for motor in motors:
             self.add_motor(motor)
 
@@ -17,6 +19,7 @@ class MotorGroup(EncodedMotor):
         :type motor: EncodedMotor
         """
         self.motors.append(motor)
+        self._update_bank()
 
     def remove_motor(self, motor:EncodedMotor):
         """
@@ -27,6 +30,16 @@ class MotorGroup(EncodedMotor):
             self.motors.remove(motor)
         except:
             print("Failed to remove motor from Motor Group")
+        self._update_bank()
+
+    def _update_bank(self):
+        """
+        Non-api method; reads all the motors' encoders together when they each have one (nested groups don't)
+        """
+        if self.motors and EncoderBank.can_hold(self.motors):
+            self._bank = EncoderBank(self.motors)
+        else:
+            self._bank = None
 
     def set_effort(self, effort: float):
         """
@@ -42,8 +55,14 @@ class MotorGroup(EncodedMotor):
         :rtype: float
         """
         avg = 0
-        for motor in self.motors:
-            avg += motor.get_position()
+        if self._bank is not None:
+            self._bank.update()
+            positions = self._bank.positions
+            for i in range(self._bank.size):
+                avg += positions[i]
+        else:
+            for motor in self.motors:
+                avg += motor.get_position()
         return avg / len(self.motors)
 
     def get_position_counts(self) -> int:
@@ -52,8 +71,14 @@ class MotorGroup(EncodedMotor):
         :rtype: int
         """
         avg = 0
-        for motor in self.motors:
-            avg += motor.get_position_counts()
+        if self._bank is not None:
+            self._bank.update()
+            counts = self._bank.counts
+            for i in range(self._bank.size):
+                avg += counts[i]
+        else:
+            for motor in self.motors:
+                avg += motor.get_position_counts()
         return round(avg / len(self.motors))
 
     def reset_encoder_position(self):
@@ -78,6 +103,8 @@ class MotorGroup(EncodedMotor):
         """
         Sets target speed (in rpm) to be maintained passively by all motors in this group
         Call with no parameters to turn off speed control
+        As with EncodedMotor.set_speed(), changing the target while speed control is running keeps each motor's
+        controller history; it's only cleared when speed control starts
 
         :param target_speed_rpm: The target speed for these motors in rpm, or None
         :type target_speed_rpm: float, or None
@@ -91,4 +118,29 @@ class MotorGroup(EncodedMotor):
         :type new_controller: Controller
         """
         for motor in self.motors:
-            motor.set_speed_controller(new_controller)
\ No newline at end of file
+            motor.set_speed_controller(new_controller)
+
+    def set_speed_estimation(self, period_below_counts: int = 0, filter_alpha: float = 1.0):
+        """
+        :param period_below_counts: Below this many counts per sample, measure speed over the time since the count last changed. 0 turns this off.
+        :type period_below_counts: int
+        :param filter_alpha: The weight of each new speed measurement in a low-pass filter, from 0 to 1; 1 turns it off
+        :type filter_alpha: float
+        """
+        for motor in self.motors:
+            motor.set_speed_estimation(period_below_counts, filter_alpha)
+
+    def set_feedforward(self, ks: float = 0.0, kv: float = 0.0, ka: float = 0.0):
+        """
+        Sets the speed control feedforward of all motors in this group. characterize() measures the group as one
+        motor and applies the result here.
+
+        :param ks: The effort needed to overcome friction and start moving
+        :type ks: float
+        :param kv: The effort per rpm of speed
+        :type kv: float
+        :param ka: The effort per rpm/s of acceleration
+        :type ka: float
+        """
+        for motor in self.motors:
+            motor.set_feedforward(ks, kv, ka)
\ No newline at end of file
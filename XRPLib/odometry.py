@@ -0,0 +1,183 @@
+from .control_scheduler import ControlScheduler
+from .encoder_bank import EncoderBank
+from array import array
+from machine import disable_irq, enable_irq
+from micropython import const
+import math
+
+# Pose state, indexes into Odometry._pose
+_X = const(0)        # cm
+_Y = const(1)        # cm
+_HEADING = const(2)  # degrees, counterclockwise positive, unbounded
+_LEFT = const(3)     # Left wheel travel at the last update, cm
+_RIGHT = const(4)    # Right wheel travel at the last update, cm
+_YAW = const(5)      # IMU yaw at the last update, degrees
+
+class Odometry:
+
+    def __init__(self, left_motor, right_motor, imu = None, wheel_diam: float = 6.0, track_width: float = 15.5, imu_weight: float = 1.0, update_hz: int = 50):
+        """
+        Keeps track of the robot's position and heading as it drives, from the control scheduler. Each update adds
+        the distance the wheels rolled since the last, along the heading halfway through it. The change in heading
+        is taken from the IMU, the encoders, or a blend of the two. Reading the pose just returns the latest update.
+
+        If the encoders are reset or the IMU's yaw is changed other than through DifferentialDrive, call update() just
+        before and resync() just after, with interrupts disabled across all three so no update runs in between, as
+        DifferentialDrive.reset_encoder_position() does.
+
+        :param left_motor: The left motor of the drivetrain
+        :type left_motor: EncodedMotor
+        :param right_motor: The right motor of the drivetrain
+        :type right_motor: EncodedMotor
+        :param imu: The IMU, or None to measure heading with the encoders alone
+        :type imu: IMU
+        :param wheel_diam: The diameter of the wheels, in cm
+        :type wheel_diam: float
+        :param track_width: The distance between the wheels, in cm
+        :type track_width: float
+        :param imu_weight: How much of each change in heading to take from the IMU rather than the encoders, from 0 to 1.
+                           The default, 1, takes the heading from the IMU alone, with the encoders only measuring
+                           distance: wheels slip and scrub when turning, which the gyro doesn't see. Lower it on
+                           surfaces where the wheels grip well and the gyro drifts; 0 uses the encoders alone.
+        :type imu_weight: float
+        :param update_hz: How often to update the pose
+        :type update_hz: int
+        """
+        self.left_motor = left_motor
+        self.right_motor = right_motor
+        self.imu = imu
+        self.imu_weight = imu_weight if imu is not None else 0
+        self._cm_per_rev = math.pi*wheel_diam
+        # Degrees turned per cm of (right - left)/2 wheel travel
+        self._degrees_per_cm = 360/(math.pi*track_width)
+
+        scheduler = ControlScheduler.get_default_control_scheduler()
+        divider = max(1, scheduler.rate_hz // update_hz)
+        # Reuse the snapshot speed control takes on the same ticks, if it holds both wheels
+        bank = EncoderBank.get_default_encoder_bank()
+        if bank.holds(left_motor) and bank.holds(right_motor) and bank.get_sampling_divider() == divider:
+            self._shares_bank = True
+        elif EncoderBank.can_hold((left_motor, right_motor)):
+            bank = EncoderBank((left_motor, right_motor))
+            self._shares_bank = False
+        else:
+            bank = None
+            self._shares_bank = False
+        self._bank = bank
+        if bank is not None:
+            self._left_index = bank.index_of(left_motor)
+            self._right_index = bank.index_of(right_motor)
+
+        self._pose = array('f', [0] * 6)
+        self.reset_pose()
+        self._task = scheduler.add_task(self._update, ControlScheduler.USER, divider, name="odometry")
+
+    def get_pose(self) -> tuple:
+        """
+        :return: The robot's x and y position (In Centimeters) and heading (In Degrees, counterclockwise positive, unbounded)
+        :rtype: tuple<float>
+        """
+        pose = self._pose
+        return pose[_X], pose[_Y], pose[_HEADING]
+
+    def get_x(self) -> float:
+        """
+        :return: The robot's x position, in cm
+        :rtype: float
+        """
+        return self._pose[_X]
+
+    def get_y(self) -> float:
+        """
+        :return: The robot's y position, in cm
+        :rtype: float
+        """
+        return self._pose[_Y]
+
+    def get_heading(self) -> float:
+        """
+        :return: The robot's heading, in degrees (counterclockwise positive, unbounded)
+        :rtype: float
+        """
+        return self._pose[_HEADING]
+
+    def reset_pose(self, x: float = 0, y: float = 0, heading: float = 0):
+        """
+        Sets where the robot is now. By default, the robot is at the origin facing along the x axis.
+
+        :param x: The x position, in cm
+        :type x: float
+        :param y: The y position, in cm
+        :type y: float
+        :param heading: The heading, in degrees
+        :type heading: float
+        """
+        pose = self._pose
+        pose[_X] = x
+        pose[_Y] = y
+        pose[_HEADING] = heading
+        self.resync()
+
+    def resync(self):
+        """
+        Takes the wheels' and IMU's current readings as the starting point for the next update, without moving
+        the pose. Call after resetting the encoders or changing the IMU's yaw.
+        """
+        state = disable_irq()
+        left, right = self._read_wheels(True)
+        pose = self._pose
+        pose[_LEFT] = left
+        pose[_RIGHT] = right
+        if self.imu is not None:
+            pose[_YAW] = self.imu.get_yaw()
+        enable_irq(state)
+
+    def update(self):
+        """
+        Adds the motion since the last update to the pose now, rather than at the next scheduled update.
+        Call before resetting the encoders, so the motion up to the reset isn't lost.
+        """
+        state = disable_irq()
+        self._update(True)
+        enable_irq(state)
+
+    def stop(self):
+        """
+        Stop updating the pose.
+        """
+        if self._task is not None:
+            ControlScheduler.get_default_control_scheduler().remove_task(self._task)
+            self._task = None
+
+    def _read_wheels(self, fresh: bool = False) -> tuple:
+        bank = self._bank
+        if bank is None:
+            return self.left_motor.get_position()*self._cm_per_rev, self.right_motor.get_position()*self._cm_per_rev
+        if fresh or not self._shares_bank:
+            bank.update()
+        positions = bank.positions
+        return positions[self._left_index]*self._cm_per_rev, positions[self._right_index]*self._cm_per_rev
+
+    def _update(self, fresh: bool = False):
+        """
+        Non-api method; the USER phase task, adds the motion since the last update to the pose
+        """
+        pose = self._pose
+        left, right = self._read_wheels(fresh)
+        d_left = left - pose[_LEFT]
+        d_right = right - pose[_RIGHT]
+        pose[_LEFT] = left
+        pose[_RIGHT] = right
+
+        d_heading = (d_right - d_left)/2*self._degrees_per_cm
+        if self.imu_weight:
+            yaw = self.imu.get_yaw()
+            d_heading += self.imu_weight*(yaw - pose[_YAW] - d_heading)
+            pose[_YAW] = yaw
+
+        heading = pose[_HEADING]
+        distance = (d_left + d_right)/2
+        middle = math.radians(heading + d_heading/2)
+        pose[_X] += distance*math.cos(middle)
+        pose[_Y] += distance*math.sin(middle)
+        pose[_HEADING] = heading + d_heading
@@ -77,6 +77,21 @@ class PID(Controller):
             timestep = time.ticks_diff(current_time, self.prev_time) / 1000
         self.prev_time = current_time # cache time for next update
 
+        return self.update_with_timestep(error, timestep, debug)
+
+    def update_with_timestep(self, error: float, timestep: float, debug: bool = False) -> float:
+        """
+        Handle a new update of this PID loop given an error and the time since the last update, for callers that
+        measure it more precisely than update() can.
+
+        :param error: The error of the system being controlled by this PID controller
+        :type error: float
+        :param timestep: The time since the last update, in seconds
+        :type timestep: float
+
+        :return: The system output from the controller, to be used as an effort value or for any other purpose
+        :rtype: float
+        """
         self._handle_exit_condition(error)
 
         integral = self.prev_integral + error * timestep
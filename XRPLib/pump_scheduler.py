@@ -0,0 +1,254 @@
+import uasyncio as asyncio
+import time
+
+class PumpJob:
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+    def __init__(self, job_id: int, pump: int, seconds: float):
+        """
+        A single request to run one pump for a fixed amount of time.
+
+        :param job_id: The id handed back to the caller of PumpScheduler.submit()
+        :type job_id: int
+        :param pump: The index of the pump to run
+        :type pump: int
+        :param seconds: How long to run the pump for
+        :type seconds: float
+        """
+        self.id = job_id
+        self.pump = pump
+        self.seconds = seconds
+        self.state = PumpJob.QUEUED
+
+    def is_finished(self) -> bool:
+        return self.state in (PumpJob.DONE, PumpJob.CANCELLED, PumpJob.FAILED)
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "pump": self.pump, "seconds": self.seconds, "state": self.state}
+
+
+class PumpScheduler:
+
+    def __init__(self, pumps: list, max_running: int = 1, max_on_seconds: float = 60,
+                 duty_window: float = 300, max_queued: int = 8, max_jobs: int = 16, on_change = None):
+        """
+        Owns a set of pump motors and runs watering jobs on them in the background, so callers
+        (e.g. an HTTP handler) can hand off a job and return immediately.
+        Jobs for the same pump run one after another; jobs for different pumps run concurrently,
+        up to max_running at once to limit current draw.
+        The duty cycle is a sliding window: no pump runs more than max_on_seconds within any duty_window
+        seconds, counting the time cancelled jobs actually ran. A job that would break it waits until it fits.
+
+        :param pumps: The pump motors, anything with set_effort() (e.g. EncodedMotor)
+        :type pumps: list
+        :param max_running: The maximum number of pumps allowed to run at the same time
+        :type max_running: int
+        :param max_on_seconds: The maximum total run time of one pump within any duty_window
+        :type max_on_seconds: float
+        :param duty_window: The length of the duty-cycle window, in seconds
+        :type duty_window: float
+        :param max_queued: The maximum number of jobs waiting to run
+        :type max_queued: int
+        :param max_jobs: The number of jobs (including finished ones) kept for status queries
+        :type max_jobs: int
+        :param on_change: Called as on_change(pump_index, running) whenever a pump starts or stops
+        :type on_change: function
+        """
+        self.pumps = pumps
+        self.max_running = max_running
+        self.max_on_ms = int(max_on_seconds * 1000)
+        self.duty_window_ms = int(duty_window * 1000)
+        self.max_queued = max_queued
+        self.max_jobs = max_jobs
+        self.on_change = on_change
+
+        self._next_id = 1
+        self._jobs = {}       # job id -> PumpJob, pruned to max_jobs
+        self._queue = []      # PumpJobs waiting to start, oldest first
+        self._tasks = [None] * len(pumps)   # running task per pump
+        self._task_jobs = [None] * len(pumps)   # the job each of those tasks runs
+        self._running = 0
+        self._runs = [[] for _ in pumps]   # per pump, [start, end] ticks_ms of recent runs, oldest first
+        self._wake = asyncio.Event()
+
+    def submit(self, pump: int, seconds: float) -> int:
+        """
+        Queue a job to run a pump. Raises ValueError if the job can never be run or the queue is full.
+
+        :param pump: The index of the pump to run
+        :type pump: int
+        :param seconds: How long to run the pump for
+        :type seconds: float
+        :return: The id of the new job, for use with status()
+        :rtype: int
+        """
+        if pump < 0 or pump >= len(self.pumps):
+            raise ValueError("bad pump index")
+        if seconds <= 0:
+            raise ValueError("seconds must be > 0")
+        if seconds * 1000 > self.max_on_ms:
+            raise ValueError("seconds exceeds pump duty-cycle limit")
+        if len(self._queue) >= self.max_queued:
+            raise ValueError("pump queue full")
+
+        job = PumpJob(self._next_id, pump, seconds)
+        self._next_id += 1
+        self._jobs[job.id] = job
+        self._queue.append(job)
+        self._prune_jobs()
+        self._wake.set()
+        return job.id
+
+    def status(self, job_id: int):
+        """
+        :return: The job with this id, or None if it is unknown or has been pruned
+        :rtype: PumpJob
+        """
+        return self._jobs.get(job_id)
+
+    def is_busy(self, pump: int) -> bool:
+        """
+        :return: True if the pump is running or has a job waiting to run
+        :rtype: bool
+        """
+        if self._tasks[pump] is not None:
+            return True
+        for job in self._queue:
+            if job.pump == pump:
+                return True
+        return False
+
+    def cancel_all(self):
+        """
+        Cancels all queued and running jobs, and turns every pump off immediately.
+        """
+        for job in self._queue:
+            job.state = PumpJob.CANCELLED
+        self._queue.clear()
+        for i in range(len(self.pumps)):
+            task = self._tasks[i]
+            if task is not None:
+                task.cancel()
+                job = self._task_jobs[i]
+                if job.state == PumpJob.QUEUED:
+                    # Cancelled before its first step, so _run_job() never runs, and never cleans up after itself
+                    job.state = PumpJob.CANCELLED
+                    self._tasks[i] = None
+                    self._task_jobs[i] = None
+                    self._running -= 1
+                    self._wake.set()
+            # Don't wait for the task to notice the cancellation
+            self.pumps[i].set_effort(0.0)
+
+    async def run(self):
+        """
+        The scheduler task; start it once with asyncio.create_task(scheduler.run()).
+        """
+        while True:
+            self._wake.clear()
+            wait_ms = self._dispatch()
+            if wait_ms is None:
+                # Only a new or finished job can change anything
+                await self._wake.wait()
+                continue
+            try:
+                # ...or the duty cycle letting a held job run
+                await asyncio.wait_for(self._wake.wait(), wait_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self):
+        # Starts every job that can run; returns the ms until the first job held back by the duty cycle can,
+        # or None if there are none
+        wait_ms = None
+        i = 0
+        while i < len(self._queue) and self._running < self.max_running:
+            job = self._queue[i]
+            if self._tasks[job.pump] is not None:
+                i += 1
+                continue
+            duty_wait_ms = self._duty_wait_ms(job.pump, job.seconds)
+            if duty_wait_ms > 0:
+                if wait_ms is None or duty_wait_ms < wait_ms:
+                    wait_ms = duty_wait_ms
+                i += 1
+                continue
+            self._queue.pop(i)
+            self._running += 1
+            self._task_jobs[job.pump] = job
+            self._tasks[job.pump] = asyncio.create_task(self._run_job(job))
+        return wait_ms
+
+    def _duty_wait_ms(self, pump: int, seconds: float) -> int:
+        # How long until the pump (not running now) can run for seconds without running more than max_on_ms
+        # in any duty window: the window that ends with the job can hold max_on_ms - on_ms of earlier runs
+        now = time.ticks_ms()
+        runs = self._runs[pump]
+        while runs and time.ticks_diff(now, runs[0][1]) >= self.duty_window_ms:
+            runs.pop(0)
+        on_ms = int(seconds * 1000)
+        since = time.ticks_add(now, on_ms - self.duty_window_ms)
+        excess = -(self.max_on_ms - on_ms)
+        for start, end in runs:
+            if time.ticks_diff(start, since) < 0:
+                start = since
+            if time.ticks_diff(end, start) > 0:
+                excess += time.ticks_diff(end, start)
+        if excess <= 0:
+            return 0
+        # Slide the window's start on until enough of the earlier runs have left it
+        for start, end in runs:
+            if time.ticks_diff(start, since) < 0:
+                start = since
+            length = time.ticks_diff(end, start)
+            if length <= 0:
+                continue
+            if length >= excess:
+                return time.ticks_diff(start, since) + excess
+            excess -= length
+        return 0
+
+    async def _run_job(self, job: PumpJob):
+        pump = job.pump
+        job.state = PumpJob.RUNNING
+        # Charged for the time it actually runs, which is less if it's cancelled
+        run = [time.ticks_ms(), None]
+        self._runs[pump].append(run)
+        try:
+            self._set_pump(pump, True)
+            await asyncio.sleep(job.seconds)
+            job.state = PumpJob.DONE
+        except asyncio.CancelledError:
+            job.state = PumpJob.CANCELLED
+        except Exception as e:
+            print("Pump job error:", e)
+            job.state = PumpJob.FAILED
+        finally:
+            run[1] = time.ticks_ms()
+            try:
+                self._set_pump(pump, False)
+            finally:
+                self._tasks[pump] = None
+                self._task_jobs[pump] = None
+                self._running -= 1
+                self._wake.set()
+
+    def _set_pump(self, pump: int, on: bool):
+        self.pumps[pump].set_effort(1.0 if on else 0.0)
+        if self.on_change is not None:
+            self.on_change(pump, on)
+
+    def _prune_jobs(self):
+        # Job ids increase monotonically, so the smallest finished ids are the oldest
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in sorted(self._jobs):
+            if self._jobs[job_id].is_finished():
+                del self._jobs[job_id]
+                if len(self._jobs) <= self.max_jobs:
+                    return
@@ -0,0 +1,173 @@
+from array import array
+import math
+
+"""
+Pure pursuit path following: steering a differential drive through a list of waypoints without stopping
+"""
+
+class Path:
+
+    def __init__(self, points):
+        """
+        A polyline through waypoints, with each segment's length, the distance along the path to each waypoint, and
+        how sharply the path turns at each waypoint precomputed into arrays, so following it never rescans them.
+
+        :param points: The (x, y) waypoints, in cm, at least two
+        :type points: list<tuple<float>>
+        """
+        n = len(points)
+        if n < 2:
+            raise ValueError("A path needs at least two points")
+        self.size = n
+        self.xs = array('f', [p[0] for p in points])
+        self.ys = array('f', [p[1] for p in points])
+        # Length of the segment from each waypoint to the next (the last is 0)
+        self.lengths = array('f', [0] * n)
+        # Distance along the path to each waypoint
+        self.distances = array('f', [0] * n)
+        # Change in heading at each waypoint, in radians, counterclockwise positive (0 at the ends)
+        self.turns = array('f', [0] * n)
+        # Change in heading per cm of path around each waypoint (0 at the ends)
+        self.curvatures = array('f', [0] * n)
+
+        total = 0.0
+        for i in range(n - 1):
+            length = math.sqrt((self.xs[i + 1] - self.xs[i])**2 + (self.ys[i + 1] - self.ys[i])**2)
+            self.lengths[i] = length
+            self.distances[i] = total
+            total += length
+        self.distances[n - 1] = total
+        self.length = total
+
+        for i in range(1, n - 1):
+            before = math.atan2(self.ys[i] - self.ys[i - 1], self.xs[i] - self.xs[i - 1])
+            after = math.atan2(self.ys[i + 1] - self.ys[i], self.xs[i + 1] - self.xs[i])
+            turn = (after - before + math.pi) % (2*math.pi) - math.pi
+            self.turns[i] = turn
+            around = (self.lengths[i - 1] + self.lengths[i])/2
+            self.curvatures[i] = turn/around if around > 0 else 0
+
+
+class PurePursuit:
+
+    def __init__(self, path: Path, track_width: float = 15.5, lookahead: float = 8, max_speed: float = 20,
+                 max_acceleration: float = 40, max_lateral_acceleration: float = 40):
+        """
+        Follows a Path with pure pursuit: each update steers along the circular arc from the robot to the point a
+        lookahead distance further along the path than the robot is. The robot's place on the path and the lookahead
+        point only ever move forwards, so they're carried from one update to the next rather than searched for, and
+        each update does a constant amount of work however long the path is.
+
+        The speed is limited so the robot can slow down in time for the end of the path and for the next waypoint's
+        corner, and so it doesn't skid on the arc it's steering along.
+
+        :param path: The path to follow
+        :type path: Path
+        :param track_width: The distance between the wheels, in cm
+        :type track_width: float
+        :param lookahead: How far ahead along the path to steer towards, in cm; larger is smoother but cuts corners more
+        :type lookahead: float
+        :param max_speed: The fastest either wheel may go, in cm/s
+        :type max_speed: float
+        :param max_acceleration: The deceleration to plan with, in cm/s^2
+        :type max_acceleration: float
+        :param max_lateral_acceleration: The sideways acceleration allowed through curves, in cm/s^2
+        :type max_lateral_acceleration: float
+        """
+        self.path = path
+        self.track_width = track_width
+        self.lookahead = lookahead
+        self.max_speed = max_speed
+        self.max_acceleration = max_acceleration
+        self.max_lateral_acceleration = max_lateral_acceleration
+        self.reset()
+
+    def reset(self):
+        """
+        Start again from the beginning of the path.
+        """
+        # The segment the robot is on, and how far along the path it is
+        self._segment = 0
+        self.progress = 0.0
+        # The segment the lookahead point is on
+        self._target = 0
+
+    def remaining(self) -> float:
+        """
+        :return: How much further along the path the end is than the robot, in cm
+        :rtype: float
+        """
+        return self.path.length - self.progress
+
+    def update(self, x: float, y: float, heading: float) -> tuple:
+        """
+        :param x: The robot's x position, in cm
+        :type x: float
+        :param y: The robot's y position, in cm
+        :type y: float
+        :param heading: The robot's heading, in degrees counterclockwise
+        :type heading: float
+        :return: The speeds to set the left and right wheels to, in cm/s
+        :rtype: tuple<float>
+        """
+        path = self.path
+        xs = path.xs
+        ys = path.ys
+        lengths = path.lengths
+        last = path.size - 2
+
+        # Project the robot onto its segment, moving on to the next segments once it's past their start
+        i = self._segment
+        while True:
+            length = lengths[i]
+            t = 0.0
+            if length > 0:
+                t = ((x - xs[i])*(xs[i + 1] - xs[i]) + (y - ys[i])*(ys[i + 1] - ys[i]))/(length*length)
+            if t < 1 or i == last:
+                break
+            i += 1
+        self._segment = i
+        progress = path.distances[i] + min(1.0, max(0.0, t))*length
+        if progress > self.progress:
+            self.progress = progress
+
+        # Find the lookahead point, clamped to the end of the path
+        goal = min(self.progress + self.lookahead, path.length)
+        j = max(self._target, i)
+        while j < last and path.distances[j + 1] < goal:
+            j += 1
+        self._target = j
+        along = (goal - path.distances[j])/lengths[j] if lengths[j] > 0 else 1.0
+        goal_x = xs[j] + along*(xs[j + 1] - xs[j])
+        goal_y = ys[j] + along*(ys[j + 1] - ys[j])
+
+        # Curvature of the arc through the lookahead point, tangent to the robot's heading
+        dx = goal_x - x
+        dy = goal_y - y
+        h = math.radians(heading)
+        sideways = dy*math.cos(h) - dx*math.sin(h)
+        if dx*math.cos(h) + dy*math.sin(h) < 0:
+            # The lookahead point is behind the robot: turn towards it on the spot first
+            spin = self.max_speed/2 if sideways >= 0 else -self.max_speed/2
+            return -spin, spin
+        distance_sq = dx*dx + dy*dy
+        curvature = 2*sideways/distance_sq if distance_sq > 1e-6 else 0.0
+
+        # Slow down in time for the end, and for the corner at the next waypoint, which the lookahead
+        # rounds off into a curve about a lookahead long
+        speed = min(self.max_speed, math.sqrt(2*self.max_acceleration*self.remaining()))
+        k = i + 1
+        if k <= last:
+            corner = max(abs(path.curvatures[k]), abs(path.turns[k])/self.lookahead)
+            if corner > 0:
+                corner_speed_sq = self.max_lateral_acceleration/corner
+                speed = min(speed, math.sqrt(corner_speed_sq + 2*self.max_acceleration*max(0.0, path.distances[k] - self.progress)))
+        if curvature != 0:
+            speed = min(speed, math.sqrt(self.max_lateral_acceleration/abs(curvature)))
+
+        # Split into wheel speeds, keeping the faster wheel within max_speed
+        turn = curvature*self.track_width/2
+        fastest = 1 + abs(turn)
+        if speed*fastest > self.max_speed:
+            speed = self.max_speed/fastest
+        return speed*(1 - turn), speed*(1 + turn)
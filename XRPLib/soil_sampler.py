@@ -0,0 +1,104 @@
+from array import array
+
+class SoilSampler:
+
+    def __init__(self, adcs: list, burst: int = 5, ema_shift: int = 2, hysteresis: int = 200):
+        """
+        Oversampled, filtered acquisition for a set of analog soil sensors.
+        Each call to sample() reads a burst of samples from one sensor, takes the median
+        (rejecting single-sample spikes) and feeds it into an exponential moving average.
+        A running variance of the median around the average is kept as a noise estimate.
+        All filtering uses integer math on preallocated arrays.
+
+        :param adcs: The ADC objects to sample, one per plant
+        :type adcs: list<ADC>
+        :param burst: The number of raw samples taken per reading; odd numbers give a true median
+        :type burst: int
+        :param ema_shift: The EMA smoothing, as a power of two: each reading moves the average 1/2^ema_shift of the way
+        :type ema_shift: int
+        :param hysteresis: The width of the band around a threshold within which is_dry() keeps its previous answer
+        :type hysteresis: int
+        """
+        self.adcs = adcs
+        self.burst = burst
+        self.ema_shift = ema_shift
+        self.hysteresis = hysteresis
+
+        n = len(adcs)
+        self._burst = array('H', bytes(2 * burst))
+        # Averages are kept with 4 fractional bits so small steps aren't lost to rounding
+        self._ema = array('i', bytes(4 * n))
+        self._var = array('i', bytes(4 * n))
+        self._primed = bytearray(n)
+        self._dry = bytearray(n)
+
+    def sample(self, plant: int) -> int:
+        """
+        Read a burst from one sensor and update its filtered value.
+
+        :param plant: The index of the sensor to sample
+        :type plant: int
+        :return: The new filtered value (0-65535)
+        :rtype: int
+        """
+        adc = self.adcs[plant]
+        b = self._burst
+        n = self.burst
+        # Insertion sort while reading, so the median is the middle element
+        for i in range(n):
+            v = adc.read_u16()
+            j = i
+            while j > 0 and b[j - 1] > v:
+                b[j] = b[j - 1]
+                j -= 1
+            b[j] = v
+        median = b[n >> 1] << 4
+
+        if not self._primed[plant]:
+            self._primed[plant] = 1
+            self._ema[plant] = median
+            self._var[plant] = 0
+        else:
+            self._ema[plant] += (median - self._ema[plant]) >> self.ema_shift
+            # Clamp the deviation so its square stays a small int
+            d = (median - self._ema[plant]) >> 4
+            d = max(-32767, min(32767, d))
+            self._var[plant] += (d * d - self._var[plant]) >> self.ema_shift
+        return self.value(plant)
+
+    def value(self, plant: int) -> int:
+        """
+        :return: The filtered reading of one sensor (0-65535), without touching the ADC
+        :rtype: int
+        """
+        return (self._ema[plant] + 8) >> 4
+
+    def variance(self, plant: int) -> int:
+        """
+        :return: The running variance of one sensor's readings, in raw units squared
+        :rtype: int
+        """
+        return self._var[plant]
+
+    def is_dry(self, plant: int, threshold: int) -> bool:
+        """
+        Compares the filtered reading against a threshold (lower = drier) with hysteresis:
+        the sensor must fall below threshold - hysteresis/2 to become dry, and rise above
+        threshold + hysteresis/2 to become wet again, so noise near the threshold can't
+        flip the answer back and forth.
+
+        :param plant: The index of the sensor
+        :type plant: int
+        :param threshold: The dry/wet threshold, in raw units
+        :type threshold: int
+        :return: Whether the soil is dry
+        :rtype: bool
+        """
+        half = self.hysteresis >> 1
+        v = self.value(plant)
+        if self._dry[plant]:
+            if v > threshold + half:
+                self._dry[plant] = 0
+        elif v < threshold - half:
+            self._dry[plant] = 1
+        return bool(self._dry[plant])
@@ -0,0 +1,19 @@
+"""
+Host-side simulation of the XRP hardware, so XRPLib and main.py run unmodified under CPython.
+
+    import XRPSim
+    sim = XRPSim.install()             # fake machine, rp2, network, ... modules
+    from XRPLib.encoded_motor import EncodedMotor
+    motor = EncodedMotor.get_default_encoded_motor(1)
+    motor.set_effort(0.5)
+    time.sleep(1)                      # simulated; returns immediately
+    print(motor.get_position(), sim.counters)
+
+Or run a program for a fixed amount of simulated time:
+
+    python -m XRPSim main.py --seconds 60
+
+XRPLib.defaults also needs the phew web server library on the path.
+"""
+from .clock import SimulationComplete, VirtualClock
+from .simulation import Simulation, current, install, uninstall
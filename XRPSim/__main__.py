@@ -0,0 +1,61 @@
+"""
+Run a MicroPython program against the simulated robot:
+
+    python -m XRPSim main.py --seconds 60 --http-port 8080
+
+Files the program saves go to a temporary directory standing in for the board's flash, so each run starts
+from an empty filesystem; pass --flash DIR to keep them between runs.
+
+A --setup file can script the inputs, e.g. press the user button one second in:
+
+    sim.set_pin("BOARD_USER_BUTTON", lambda t: 0 if 1.0 <= t < 1.2 else 1)
+    sim.set_adc("LINE_L", 30000)
+"""
+import argparse
+import os
+import runpy
+import sys
+import time
+
+from . import install, uninstall, SimulationComplete
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m XRPSim", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("script", help="the program to run, e.g. main.py")
+    parser.add_argument("--seconds", type=float, default=60, help="simulated time to run for (default 60)")
+    parser.add_argument("--board", choices=("rp2350", "rp2040"), default="rp2350")
+    parser.add_argument("--http-port", type=int, help="serve the program's port 80 on this host port instead")
+    parser.add_argument("--realtime", action="store_true", help="let time pass at wall-clock speed")
+    parser.add_argument("--setup", help="a Python file run first with the Simulation as `sim`, to script inputs")
+    parser.add_argument("--flash", help="the directory to use as the board's flash (default: a new temporary one)")
+    args = parser.parse_args(argv)
+
+    # Resolve the paths before the working directory moves to the flash directory
+    script = os.path.abspath(args.script)
+    setup = os.path.abspath(args.setup) if args.setup else None
+    sys.path.insert(0, os.path.dirname(script))
+    sim = install(args.board, flash_dir=args.flash, realtime=args.realtime,
+                  http_ports={80: args.http_port} if args.http_port else None)
+    sim.clock.set_deadline(args.seconds)
+    if setup:
+        runpy.run_path(setup, init_globals={"sim": sim})
+
+    start = time.perf_counter()
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SimulationComplete:
+        pass
+    finally:
+        uninstall()
+    wall = time.perf_counter() - start
+    simulated = sim.clock.elapsed_us() / 1_000_000
+    print("XRPSim: %.1f s simulated in %.2f s (%.0fx real time)"
+          % (simulated, wall, simulated / wall if wall > 0 else float("inf")))
+    for name in sorted(sim.counters):
+        print("  %-20s %d" % (name, sim.counters[name]))
+    return sim
+
+
+if __name__ == "__main__":
+    main()
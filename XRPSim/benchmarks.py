@@ -0,0 +1,1773 @@
+"""
+Host-side performance benchmarks, counting accesses to the simulated hardware. Each one also
+checks the result it measures, and the run exits non-zero if any check fails. Run them all with:
+
+    python -m XRPSim.benchmarks
+"""
+import math
+import os
+import runpy
+import sys
+import time
+
+from . import install
+
+# The dashboard program, next to the XRPSim package
+_MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def _purge_xrplib():
+    # XRPLib's singletons hold timers on the clock they were created with, so each benchmark starts it afresh
+    for name in list(sys.modules):
+        if name == "XRPLib" or name.startswith("XRPLib."):
+            del sys.modules[name]
+
+
+def _install(**kwargs):
+    _purge_xrplib()
+    return install(**kwargs)
+
+
+def _check(ok, message):
+    # Each benchmark checks the result its change was made for, so a regression fails the run
+    if not ok:
+        raise AssertionError(message)
+
+
+def _fifo_ops(sim):
+    return sim.counters.get("sm.get", 0) + sim.counters.get("sm.put", 0)
+
+
+def _load_main(**kwargs):
+    # main.py imported on a new simulation without running its main loop, so its tasks can be driven one by one.
+    # Returns its live globals (run_path() returns a copy), so setting is_config_mode etc. reaches the program
+    sim = _install(**kwargs)
+    return sim, runpy.run_path(_MAIN_PY, run_name="agxrp")["main"].__globals__
+
+
+class _Reader:
+    # A connection's request, read in place like MicroPython's Stream.readinto()
+    def __init__(self, request):
+        self.request = request
+
+    async def readinto(self, buf):
+        n = len(self.request)
+        buf[:n] = self.request
+        return n
+
+    async def read(self, n):
+        # A new bytes object, as Stream.read() returns
+        return self.request[:n]
+
+
+class _Writer:
+    # Counts what a handler sends instead of keeping it, so it doesn't add to the handler's allocations
+    def __init__(self):
+        self.sent = 0
+        self.first = b""
+        self.events = 0
+
+    def write(self, data):
+        if not self.first:
+            self.first = bytes(data[:12])
+        if data == b"data: ":
+            self.events += 1
+        self.sent += len(data)
+
+    async def drain(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+def _decoding_handler(agxrp):
+    # main.py's handle_client() as it was before requests were parsed in place: the request decoded to a str,
+    # split into lines and path segments, and responses built by concatenation. Only the routes the HTTP
+    # benchmark requests are kept; anything else gets the 404 it did
+    import json
+
+    async def handle_client(reader, writer):
+        try:
+            req = await reader.read(1024)
+            if not req:
+                return
+            try:
+                req_s = req.decode()
+            except:
+                req_s = str(req)
+
+            first_line = req_s.split('\n', 1)[0].strip()
+            parts = first_line.split()
+            if len(parts) < 2:
+                return
+            method, path = parts[0], parts[1]
+
+            if method == 'POST' and path == '/api/toggle_mode':
+                agxrp["is_config_mode"] = not agxrp["is_config_mode"]
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nOK')
+                await writer.drain()
+                return
+
+            if method == 'GET' and path.startswith('/api/update_soil/'):
+                try:
+                    _, _, _, idx_str = path.split('/')
+                    idx = int(idx_str)
+                    if idx < 0 or idx >= len(agxrp["SOIL_ADCs"]):
+                        raise ValueError('bad plant index')
+                    raw_val = agxrp["SOIL_ADCs"][idx].read_u16()
+                    body = json.dumps({"raw": raw_val}).encode()
+                    hdr = (
+                        "HTTP/1.1 200 OK\r\n"
+                        "Content-Type: application/json\r\n"
+                        "Cache-Control: no-store\r\n"
+                        "Connection: close\r\n\r\n"
+                    ).encode()
+                    writer.write(hdr + body)
+                except Exception as e:
+                    writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nERR')
+                await writer.drain()
+                return
+
+            if method == 'POST' and path.startswith('/api/set_threshold/'):
+                try:
+                    _, _, _, idx_str, val_str = path.split('/')
+                    idx = int(idx_str)
+                    threshold_val = int(val_str)
+                    if idx < 0 or idx >= len(agxrp["moisture_thresholds"]):
+                        raise ValueError('bad plant index')
+                    agxrp["moisture_thresholds"][idx] = threshold_val
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nOK')
+                except Exception as e:
+                    writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nERR')
+                await writer.drain()
+                return
+
+            if method == 'POST' and path.startswith('/api/set_water/'):
+                try:
+                    _, _, _, idx_str, val_str = path.split('/')
+                    idx = int(idx_str)
+                    water_secs = float(val_str)
+                    if idx < 0 or idx >= len(agxrp["auto_water_seconds"]):
+                        raise ValueError('bad plant index')
+                    if water_secs < 0:
+                        raise ValueError('Please enter non-negative seconds')
+                    agxrp["auto_water_seconds"][idx] = water_secs
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nOK')
+                except Exception as e:
+                    writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nERR')
+                await writer.drain()
+                return
+
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nNot Found')
+            await writer.drain()
+        except Exception as e:
+            print("Error handling request:", e)
+        finally:
+            try:
+                await writer.drain()
+            except:
+                pass
+            try:
+                await writer.wait_closed()
+            except:
+                pass
+
+    return handle_client
+
+
+def benchmark_http_requests():
+    """
+    Peak heap growth while main.py's handle_client() answers each kind of request, traced by tracemalloc, and
+    the memory left allocated after 100 of each; with a handler that only reads the request as the baseline, and
+    the handler as it was before requests were parsed in place (decoding and splitting them) to compare with.
+    Then checks that numbers float() would reject are answered with 400, without changing the setting.
+    """
+    import tracemalloc
+
+    sim, agxrp = _load_main()
+    import uasyncio as asyncio
+
+    requests = (
+        b"POST /api/toggle_mode HTTP/1.1\r\nHost: 192.168.4.1\r\nContent-Length: 0\r\n\r\n",
+        b"GET /api/update_soil/1 HTTP/1.1\r\nHost: 192.168.4.1\r\nAccept: */*\r\n\r\n",
+        b"GET /api/snapshot HTTP/1.1\r\nHost: 192.168.4.1\r\nAccept: */*\r\n\r\n",
+        b"POST /api/set_threshold/0/900 HTTP/1.1\r\nHost: 192.168.4.1\r\nContent-Length: 0\r\n\r\n",
+        b"POST /api/set_water/1/2.5e0 HTTP/1.1\r\nHost: 192.168.4.1\r\nContent-Length: 0\r\n\r\n",
+        b"GET /favicon.ico HTTP/1.1\r\nHost: 192.168.4.1\r\n\r\n",
+    )
+
+    async def read_only(reader, writer):
+        await agxrp["_read_request"](reader)
+        writer.write(agxrp["_RESP_NOT_FOUND"])
+
+    async def measure(handler, request):
+        reader = _Reader(request)
+        await handler(reader, _Writer())  # the first request may fill caches
+        peak = 0
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(100):
+            writer = _Writer()
+            start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await handler(reader, writer)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - start)
+        return peak, tracemalloc.get_traced_memory()[0] - before, writer.first
+
+    decoding = _decoding_handler(agxrp)
+
+    async def run():
+        results = []
+        for request in requests:
+            results.append((request, await measure(read_only, request), await measure(decoding, request),
+                            await measure(agxrp["handle_client"], request)))
+        return results
+
+    tracemalloc.start()
+    try:
+        results = asyncio.run(run())
+    finally:
+        tracemalloc.stop()
+    for request, (base_peak, _, _), (old_peak, _, old_status), (peak, kept, status) in results:
+        line = request[:request.index(b" HTTP")].decode()
+        print("%-34s %s: peak %5d bytes over the baseline's %d (decoding handler: %s, %5d), %d bytes kept after 100"
+              % (line, status[9:12].decode(), peak - base_peak, base_peak, old_status[9:12].decode(),
+                 old_peak - base_peak, kept))
+        _check(status.startswith(b"HTTP/1.1 2") or b"favicon" in request, "%s failed: %s" % (line, status))
+        _check(peak - base_peak < 512, "%s allocated %d bytes" % (line, peak - base_peak))
+        _check(kept < 1024, "%s kept %d bytes allocated" % (line, kept))
+        # Even where it only answers 404 (/api/snapshot didn't exist), decoding and splitting costs far more
+        _check((peak - base_peak) * 2 < old_peak - base_peak,
+               "%s allocated %d bytes, against %d decoding it" % (line, peak - base_peak, old_peak - base_peak))
+    _check(agxrp["moisture_thresholds"][0] == 900, "set_threshold didn't set the threshold")
+    _check(agxrp["auto_water_seconds"][1] == 2.5, "set_water didn't parse 2.5e0")
+
+    # Numbers float() takes, and ones it rejects, which must be answered 400 and leave the setting alone
+    async def set_water(number):
+        writer = _Writer()
+        agxrp["auto_water_seconds"][0] = 3.0
+        await agxrp["handle_client"](
+            _Reader(b"POST /api/set_water/0/" + number + b" HTTP/1.1\r\nContent-Length: 0\r\n\r\n"), writer)
+        return writer.first[9:12], agxrp["auto_water_seconds"][0]
+
+    for number in (b"7", b"+2", b".5", b"-0", b"1.", b"1.25", b"2.5E-1", b"1e1", b"0.5e+1"):
+        status, value = asyncio.run(set_water(number))
+        _check(status == b"200" and abs(value - float(number)) < 1e-9,
+               "set_water/0/%s answered %s, setting %r" % (number.decode(), status.decode(), value))
+    for number in (b"1.-5", b"--3", b"+-3", b"-5.-5", b"1e+-2", b"1e", b"e5", b".", b"-", b"1..5", b"1e5.5",
+                   b"inf", b"nan", b"1e999"):
+        status, value = asyncio.run(set_water(number))
+        _check(status == b"400" and value == 3.0,
+               "set_water/0/%s answered %s, setting %r" % (number.decode(), status.decode(), value))
+    print("set_water: float() forms accepted, 14 malformed numbers answered 400")
+
+
+def benchmark_sse_events():
+    """
+    Server-Sent Events from main.py's /api/events: the memory each open subscriber holds, traced by tracemalloc,
+    and how many state changes a second reach MAX_EVENT_SUBSCRIBERS subscribers on the host; then checks that
+    one more is turned away with a 503, and that every subscriber gets every change.
+    """
+    import tracemalloc
+
+    sim, agxrp = _load_main()
+    import uasyncio as asyncio
+
+    request = b"GET /api/events HTTP/1.1\r\nHost: 192.168.4.1\r\nAccept: text/event-stream\r\n\r\n"
+    subscribers = agxrp["MAX_EVENT_SUBSCRIBERS"]
+    changes = 2000
+
+    async def run():
+        agxrp["is_config_mode"] = True
+        writers = [_Writer() for _ in range(subscribers + 1)]
+        tasks = []
+        before = tracemalloc.get_traced_memory()[0]
+        for writer in writers[:subscribers]:
+            tasks.append(asyncio.create_task(agxrp["handle_client"](_Reader(request), writer)))
+            await asyncio.sleep_ms(0)
+        per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / subscribers
+        await agxrp["handle_client"](_Reader(request), writers[-1])
+
+        start = time.perf_counter()
+        for _ in range(changes):
+            agxrp["mark_state_changed"]()
+            await asyncio.sleep_ms(10)
+        seconds = time.perf_counter() - start
+        agxrp["is_config_mode"] = False
+        agxrp["mark_state_changed"]()
+        await asyncio.gather(*tasks)
+        return writers, per_subscriber, seconds
+
+    tracemalloc.start()
+    try:
+        writers, per_subscriber, seconds = asyncio.run(run())
+    finally:
+        tracemalloc.stop()
+    delivered = sum(writer.events for writer in writers)
+    print("%d subscribers: %.0f bytes each while open, %.0f events a second delivered on the host (%d of %d)"
+          % (subscribers, per_subscriber, delivered / seconds, delivered, subscribers * (changes + 1)))
+    print("Subscriber %d: %s" % (subscribers + 1, writers[-1].first.decode()))
+    _check(writers[-1].first == b"HTTP/1.1 503", "an extra subscriber wasn't turned away")
+    # Each subscriber also gets the snapshot when it connects; the last change closes the streams instead
+    _check(all(writer.events == changes + 1 for writer in writers[:subscribers]), "subscribers missed changes")
+    _check(agxrp["_event_subscribers"] == 0, "closed subscribers weren't released")
+    _check(per_subscriber < 4096, "each subscriber holds %.0f bytes" % per_subscriber)
+
+
+def benchmark_pump_duty_cycle():
+    """
+    PumpScheduler's duty cycle (60 s in any 300 s): a pump run up to the end of 300 s and asked to run again
+    straight after, and again after a 30 s job cancelled 5 s in; the most it runs within any 300 s, when held jobs
+    start, and how many times the scheduler woke. Then cancels a job right after it's dispatched, before its task
+    has started, and checks the next job can still run.
+    """
+    sim = _install()
+    import uasyncio as asyncio
+    from XRPLib.pump_scheduler import PumpScheduler
+
+    class Pump:
+        def __init__(self):
+            self.runs = []
+
+        def set_effort(self, effort):
+            if effort:
+                self.runs.append([sim.clock.seconds(), None])
+            elif self.runs and self.runs[-1][1] is None:
+                self.runs[-1][1] = sim.clock.seconds()
+
+    pump = Pump()
+    scheduler = PumpScheduler([pump], max_on_seconds=60, duty_window=300)
+    wakes = [0]
+    wake = scheduler._wake.wait
+
+    async def counted_wait():
+        await wake()
+        wakes[0] += 1
+    scheduler._wake.wait = counted_wait
+
+    async def at(seconds):
+        await asyncio.sleep(seconds - sim.clock.seconds())
+
+    async def run():
+        task = asyncio.create_task(scheduler.run())
+        # A full run that ends as 300 s go by, then another asked for straight away
+        await at(240)
+        scheduler.submit(0, 60)
+        await at(300)
+        scheduler.submit(0, 60)
+        # Once that one's done, a 30 s job cancelled 5 s in only costs those 5 s
+        await at(1000)
+        scheduler.submit(0, 30)
+        await at(1005)
+        scheduler.cancel_all()
+        await at(1006)
+        scheduler.submit(0, 55)
+        await at(1400)
+        task.cancel()
+
+    asyncio.run(run())
+    worst = 0
+    for start, _ in pump.runs:
+        # The most run time within 300 s is in a window that starts as a run does
+        worst = max(worst, sum(max(0, min(end, start + 300) - max(begin, start)) for begin, end in pump.runs))
+    starts = [round(start, 3) for start, _ in pump.runs]
+    print("Runs start at %s s; at most %.1f s on within any 300 s; the scheduler woke %d times"
+          % (", ".join("%.3f" % t for t in starts), worst, wakes[0]))
+    _check(worst <= 60.001, "the pump ran %.1f s within 300 s" % worst)
+    # 240-300 s, then held until 300 s after 240 s; 1000-1005 s, and a 55 s job fits with those 5 s at once
+    _check(starts == [240, 540, 1000, 1006], "jobs started at %s" % starts)
+    _check(wakes[0] <= 20, "the scheduler woke %d times" % wakes[0])
+
+    # cancel_all() (e.g. main.py switching modes) between dispatching a job and its task's first step
+    pumps = [Pump(), Pump()]
+    scheduler = PumpScheduler(pumps, max_running=1)
+
+    async def cancel_after_dispatch():
+        job = scheduler.submit(0, 10)
+        scheduler._dispatch()
+        scheduler.cancel_all()
+        await asyncio.sleep(0.1)
+        state, busy = scheduler.status(job).state, scheduler.is_busy(0)
+        task = asyncio.create_task(scheduler.run())
+        after = scheduler.submit(1, 5)
+        await asyncio.sleep(1)
+        task.cancel()
+        return state, busy, scheduler.status(after).state
+
+    state, busy, after = asyncio.run(cancel_after_dispatch())
+    print("Cancelled right after dispatch: the job is %s, pump 0 busy %s, the next job %s" % (state, busy, after))
+    # It used to stay queued, with the pump busy and its running slot taken for good
+    _check(state == "cancelled" and not busy, "a job cancelled before its task started was left %s" % state)
+    _check(after == "running", "the next job was left %s after cancelling one before it started" % after)
+
+
+def benchmark_soil_false_triggers():
+    """
+    Dry/wet decisions on a replayed soil sensor trace: an hour of soil slowly drying past the threshold once,
+    with sensor noise and occasional spikes (a seeded recording, so every run replays the same samples). How
+    often a single read against the threshold flips, and how often SoilSampler's median, EMA and hysteresis do.
+    """
+    import random
+
+    sim = _install()
+    from machine import ADC, Pin
+    from XRPLib.soil_sampler import SoilSampler
+
+    rng = random.Random(8)
+    threshold = 30000
+    readings = 7200          # one reading every 0.5 s
+    burst = 5
+    trace = []
+    for k in range(readings * burst):
+        level = 40000 - 20000 * k / (readings * burst)     # crosses the threshold halfway
+        v = level + rng.gauss(0, 400)
+        if rng.random() < 0.002:
+            v += rng.choice((-1, 1)) * rng.uniform(5000, 20000)  # a loose connector or a pump surge
+        trace.append(int(v))
+    crossing = readings // 2
+    position = [0]
+
+    def replay(t):
+        v = trace[position[0]]
+        position[0] += 1
+        return v
+    sim.set_adc(40, replay)
+
+    sampler = SoilSampler([ADC(Pin(40))], burst=burst, hysteresis=200)
+    raw_flips = filtered_flips = 0
+    raw_dry = filtered_dry = False
+    detected = None
+    for k in range(readings):
+        raw = trace[k * burst]    # what one read_u16() per reading would have seen
+        if (raw < threshold) != raw_dry:
+            raw_dry = not raw_dry
+            raw_flips += 1
+        sampler.sample(0)
+        if sampler.is_dry(0, threshold) != filtered_dry:
+            filtered_dry = not filtered_dry
+            filtered_flips += 1
+            if filtered_dry and detected is None:
+                detected = k
+    print("Soil drying past the threshold once: a single read flips %d times, SoilSampler %d times, "
+          "%+.1f s from the true crossing" % (raw_flips, filtered_flips, (detected - crossing) * 0.5))
+    _check(filtered_flips == 1, "SoilSampler flipped %d times" % filtered_flips)
+    _check(raw_flips > 10 * filtered_flips, "the single read only flipped %d times" % raw_flips)
+    # The soil drops 2.8 units a reading, so it takes ~36 readings to leave the 100-unit band below the
+    # threshold; noise can carry the average out of it a little early
+    _check(-20 <= detected - crossing <= 120, "dry was detected %d readings from the crossing" % (detected - crossing))
+
+
+def benchmark_watering_latency():
+    """
+    main.py watering four plants whose soil all dries at once, 2 s in: how long after that each pump starts,
+    how many run at the same time, and the soil sampling period meanwhile; with the time one
+    autonomous_cycle_once() scan takes on the host. The same trace is replayed through the old sequential scan,
+    which read each plant and watered it inline before reading the next, for comparison.
+    """
+    import contextlib
+    import io
+    import json
+    import tempfile
+
+    plants = 4
+    with tempfile.TemporaryDirectory() as directory:
+        # Soil sensors on ADC pins 40-43, pumps on motors 1-4
+        with open(os.path.join(directory, "agxrp_config.json"), "w") as f:
+            json.dump({
+                "plant_pins": [{"led": 26 + i, "adc": i, "pump": 30 + i} for i in range(plants)],
+                "soil_adc_pins": [40 + i for i in range(plants)],
+                "moisture_thresholds": [30000] * plants,
+                "auto_water_seconds": [3.0] * plants,
+            }, f)
+        sim, agxrp = _load_main(flash_dir=directory)
+        import uasyncio as asyncio
+
+        dry_at = 2.0
+        for i in range(plants):
+            sim.set_adc(40 + i, lambda t: 50000 if t < dry_at else 10000)
+        pump_changes = []
+        on_change = agxrp["pump_scheduler"].on_change
+
+        def record_pump(i, on):
+            pump_changes.append((sim.clock.seconds(), i, on))
+            on_change(i, on)
+        agxrp["pump_scheduler"].on_change = record_pump
+        samples = []
+        sampler = agxrp["soil_sampler"]
+        sample = sampler.sample
+
+        def record_sample(plant):
+            if plant == 0:
+                samples.append(sim.clock.seconds())
+            return sample(plant)
+        sampler.sample = record_sample
+
+        async def run():
+            task = asyncio.create_task(agxrp["main"]())
+            await asyncio.sleep(12)
+            task.cancel()
+            start = time.perf_counter()
+            for _ in range(100):
+                await agxrp["autonomous_cycle_once"]()
+            return (time.perf_counter() - start) / 100
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            cycle = asyncio.run(run())
+
+        # The old main loop on a new simulation of the same config: scan, sleep 0.1 s, repeat
+        sim, agxrp = _load_main(flash_dir=directory)
+        import uasyncio as asyncio
+        for i in range(plants):
+            sim.set_adc(40 + i, lambda t: 50000 if t < dry_at else 10000)
+        old_starts = {}
+        old_samples = []
+        locks = [asyncio.Lock() for _ in range(plants)]
+
+        async def sequential_cycle_once():
+            # autonomous_cycle_once() before the pump scheduler, reading and watering one plant at a time
+            for i in range(plants):
+                value = agxrp["SOIL_ADCs"][i].read_u16()
+                if i == 0:
+                    old_samples.append(sim.clock.seconds())
+                if value < agxrp["moisture_thresholds"][i]:
+                    secs = float(agxrp["auto_water_seconds"][i])
+                    async with locks[i]:
+                        motor = agxrp["EncodedMotor"].get_default_encoded_motor(i + 1)
+                        motor.set_effort(1.0)
+                        old_starts.setdefault(i, sim.clock.seconds() - dry_at)
+                        await asyncio.sleep(secs)
+                        motor.set_effort(0.0)
+
+        async def run_sequential():
+            while sim.clock.seconds() < 16:
+                await sequential_cycle_once()
+                await asyncio.sleep(0.1)
+
+        asyncio.run(run_sequential())
+
+    starts = {}
+    running = worst = 0
+    for t, i, on in pump_changes:
+        running += 1 if on else -1
+        worst = max(worst, running)
+        if on:
+            starts.setdefault(i, t - dry_at)
+    periods = [b - a for a, b in zip(samples, samples[1:])]
+    old_periods = [b - a for a, b in zip(old_samples, old_samples[1:])]
+    print("Old: pumps start %s s after the soil dries, one at a time; samples every %.3f-%.3f s"
+          % (", ".join("%.2f" % old_starts[i] for i in sorted(old_starts)), min(old_periods), max(old_periods)))
+    print("New: pumps start %s s after the soil dries, at most %d running; samples every %.3f-%.3f s; "
+          "a %d-plant scan takes %.0f us on the host"
+          % (", ".join("%.2f" % starts[i] for i in sorted(starts)), worst, min(periods), max(periods),
+             plants, cycle * 1e6))
+    period = agxrp["SAMPLE_PERIOD_MS"] / 1000
+    _check(sorted(starts) == list(range(plants)), "only plants %s were watered" % sorted(starts))
+    _check(worst == agxrp["MAX_RUNNING_PUMPS"], "%d pumps ran at once" % worst)
+    # The filtered reading crosses the threshold in 3 samples, and the scan follows within a period
+    first = sorted(starts.values())
+    _check(first[1] <= 5 * period, "the first pumps started %.2f s after the soil dried" % first[1])
+    # The others wait for a pump to finish its 3 s, not for another scan
+    _check(first[-1] <= first[1] + 3 + period, "the last pump started %.2f s after the soil dried" % first[-1])
+    _check(max(periods) - period < 0.002 and min(periods) > period - 0.002, "watering held up sampling")
+    # The old scan waters the plants one after another, so the last waits for the three before it
+    _check(sorted(old_starts) == list(range(plants)), "the old scan only watered plants %s" % sorted(old_starts))
+    _check(first[-1] < max(old_starts.values()),
+           "the last pump started %.2f s after the soil dried, the old scan %.2f s"
+           % (first[-1], max(old_starts.values())))
+
+
+def benchmark_boot_to_first_sample():
+    """
+    main.py from the start of the program to its first soil sample, in host time (importing XRPLib, reading the
+    config and setting up the hardware) and simulated time; with the default config, and with a saved config
+    listing three plants but two soil sensor pins, which must still run the two plants that have one.
+    """
+    import contextlib
+    import io
+    import json
+    import tempfile
+
+    for name, saved in (("Default config", None),
+                        ("3 plants, 2 soil pins", {"plant_pins": [{"led": "LED", "adc": 0, "pump": 3},
+                                                                  {"led": 26, "adc": 1, "pump": 27},
+                                                                  {"led": 28, "adc": 2, "pump": 29}]})):
+        with tempfile.TemporaryDirectory() as directory:
+            if saved is not None:
+                with open(os.path.join(directory, "agxrp_config.json"), "w") as f:
+                    json.dump(saved, f)
+            sim = _install(flash_dir=directory)
+            import uasyncio as asyncio
+            first_sample = []
+
+            def soil(t):
+                if not first_sample:
+                    first_sample.append((time.perf_counter(), sim.clock.elapsed_us()))
+                return 40000
+            sim.set_adc(44, soil)
+            out = io.StringIO()
+            scans = []
+
+            async def run(agxrp):
+                cycle = agxrp["autonomous_cycle_once"]
+
+                async def counted_cycle():
+                    scans.append(sim.clock.elapsed_us())
+                    await cycle()
+                agxrp["autonomous_cycle_once"] = counted_cycle
+                task = asyncio.create_task(agxrp["main"]())
+                await asyncio.sleep(3)
+                crashed = task.done()
+                task.cancel()
+                return crashed
+
+            with contextlib.redirect_stdout(out):
+                start = time.perf_counter(), sim.clock.elapsed_us()
+                agxrp = runpy.run_path(_MAIN_PY, run_name="agxrp")["main"].__globals__
+                crashed = asyncio.run(run(agxrp))
+        host_ms = (first_sample[0][0] - start[0]) * 1000
+        sim_ms = (first_sample[0][1] - start[1]) / 1000
+        print("%s: first soil sample %.1f ms after start on the host, %.1f ms simulated; %d plants run, %d scans"
+              % (name, host_ms, sim_ms, len(agxrp["PLANT_PINS"]), len(scans)))
+        _check(not crashed, "%s: main() stopped" % name)
+        _check(first_sample[0][1] <= scans[0], "%s: the plants were scanned before the first sample" % name)
+        _check(sim_ms < 50, "%s: the first sample took %.1f ms" % (name, sim_ms))
+        _check(len(scans) >= 5, "%s: only %d scans in 3 s" % (name, len(scans)))
+        _check(len(agxrp["PLANT_PINS"]) == len(agxrp["SOIL_ADCs"]) == 2, "%s: plants and soil sensors differ" % name)
+        if saved is not None:
+            _check("using the first 2 plants" in out.getvalue(), "the config mismatch wasn't reported")
+
+
+def benchmark_moisture_history():
+    """
+    main.py's /api/history/<plant> on a MoistureHistory fed a known series every SAMPLE_PERIOD_MS for two and a
+    half hours: whether each resolution's CSV rows carry the min/mean/max and age_ms of the samples they cover,
+    and that an unknown res= is answered with 400; then the heap add() keeps and its peak, traced by tracemalloc,
+    over the samples that cross a minute boundary.
+    """
+    import tracemalloc
+
+    sim, agxrp = _load_main()
+    import uasyncio as asyncio
+    from XRPLib.control_scheduler import ControlScheduler
+    # Nothing drives the motors; keep the control loop's counters out of the heap figures
+    ControlScheduler.get_default_control_scheduler().stop()
+    plants = len(agxrp["PLANT_PINS"])
+    period_ms = agxrp["SAMPLE_PERIOD_MS"]
+    history = agxrp["moisture_history"] = agxrp["MoistureHistory"](plants, period_ms)
+    start_us = sim.clock.now_us
+
+    def value(k, plant):
+        # A saw per plant, so every minute and hour has a different min, mean and max
+        return 20000 + 1000 * plant + (k * 37) % 997 + k // 50
+
+    def add(k):
+        # Sample k is taken period_ms * (k + 1) after the history was created
+        sim.clock.advance_to(start_us + (k + 1) * period_ms * 1000)
+        history.add([value(k, p) for p in range(plants)])
+
+    per_minute = 60_000 // period_ms
+    per_hour = 60 * per_minute
+    total = 5 * per_hour // 2 + per_minute // 2
+    traced = total - 2 * per_minute
+    for k in range(traced):
+        add(k)
+    # The last two minutes with the arguments built up front, so only add() is traced. Only the second minute is
+    # measured: in the first, the ints add() stores replace ones allocated before tracing, whose frees don't count
+    values = [[value(k, p) for p in range(plants)] for k in range(traced, total)]
+
+    def add_traced(k):
+        sim.clock.advance_to(start_us + (k + 1) * period_ms * 1000)
+        history.add(values[k - traced])
+    tracemalloc.start()
+    try:
+        for k in range(traced, traced + per_minute):
+            add_traced(k)
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for k in range(traced + per_minute, total):
+            add_traced(k)
+        kept, peak = tracemalloc.get_traced_memory()
+        kept -= before
+        peak -= before
+    finally:
+        tracemalloc.stop()
+
+    class Recorder(_Writer):
+        # Keeps the response as well, to check the rows
+        def __init__(self):
+            super().__init__()
+            self.data = bytearray()
+
+        def write(self, data):
+            super().write(data)
+            self.data += data
+
+    async def get(path):
+        writer = Recorder()
+        await agxrp["handle_client"](_Reader(b"GET " + path + b" HTTP/1.1\r\n\r\n"), writer)
+        return writer.first[9:12], bytes(writer.data).split(b"\r\n\r\n", 1)[-1].decode()
+
+    def expected(plant, first, last, step_ms, age_step_ms):
+        # Rows for the completed spans of step_ms samples in [first, last), oldest first
+        spans = range(first, last, step_ms // period_ms)
+        rows = []
+        for i, k in enumerate(spans):
+            span = [value(j, plant) for j in range(k, k + step_ms // period_ms)]
+            rows.append("%d,%d,%d,%d" % ((len(spans) - 1 - i) * age_step_ms, min(span), sum(span) // len(span),
+                                         max(span)))
+        return rows
+
+    plant = plants - 1
+    minutes = total // per_minute
+    hours = total // per_hour
+    tiers = (
+        (b"raw", ["%d,%d" % ((total - 1 - k) * period_ms, value(k, plant)) for k in range(total - 240, total)]),
+        (b"minute", expected(plant, (minutes - 60) * per_minute, minutes * per_minute, 60_000, 60_000)),
+        (b"hour", expected(plant, 0, hours * per_hour, 3_600_000, 3_600_000)),
+    )
+    for res, rows in tiers:
+        status, body = asyncio.run(get(b"/api/history/%d?res=%s" % (plant, res)))
+        lines = body.split("\n")
+        print("res=%s: %s, %d rows, newest %s" % (res.decode(), status.decode(), len(lines) - 2, lines[-2]))
+        _check(status == b"200", "res=%s was answered %s" % (res.decode(), status.decode()))
+        _check(lines[1:-1] == rows, "res=%s rows differ from the samples, e.g. %s for %s"
+               % (res.decode(), next((a for a, b in zip(lines[1:], rows) if a != b), lines[-2]),
+                  next((b for a, b in zip(lines[1:], rows) if a != b), rows[-1])))
+    for path in (b"/api/history/0?res=day", b"/api/history/0?res=", b"/api/history/0?res=minutes"):
+        status, _ = asyncio.run(get(path))
+        print("%s: %s" % (path.decode(), status.decode()))
+        _check(status == b"400", "%s was answered %s" % (path.decode(), status.decode()))
+
+    print("%d add() calls across a minute boundary: %d bytes kept, peak %d bytes" % (per_minute, kept, peak))
+    _check(kept == 0, "add() kept %d bytes" % kept)
+    # The peak is the CPython ints a minute's rollup holds at once, 188 B; MicroPython keeps them as small ints
+    _check(peak < 256, "add() grew the heap by %d B at its peak" % peak)
+
+
+def benchmark_simulation():
+    """
+    How much faster than real time the simulator runs main.py for a minute, as `python -m XRPSim main.py`
+    does, and a straight(30) and turn(90); with how far the simulated robot really went.
+    """
+    import contextlib
+    import io
+
+    from .__main__ import main as run_script
+
+    _purge_xrplib()
+    out = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        sim = run_script([_MAIN_PY, "--seconds", "60"])
+    wall = time.perf_counter() - start
+    simulated = sim.clock.elapsed_us() / 1e6
+    print("main.py: %.0f s simulated in %.2f s (%.0fx real time), %d soil ADC reads"
+          % (simulated, wall, simulated / wall, sim.counters.get("adc.read_u16", 0)))
+    _check(simulated >= 60, "main.py stopped after %.1f s" % simulated)
+    _check(simulated / wall > 10, "main.py ran only %.1fx faster than real time" % (simulated / wall))
+    _check("Activating pump" in out.getvalue(), "main.py never watered its dry plants")
+
+    sim = _install()
+    from XRPLib.differential_drive import DifferentialDrive
+    drivetrain = DifferentialDrive.get_default_differential_drive()
+    timer = _track_pose(sim)
+    start = time.perf_counter()
+    begin = sim.clock.elapsed_us()
+    reached = drivetrain.straight(30, 0.5, timeout=10)
+    x, y, _ = sim.drive.pose()
+    distance = (x * x + y * y) ** 0.5
+    turned = drivetrain.turn(90, 0.5, timeout=10)
+    _, _, heading = sim.drive.pose()
+    timer.deinit()
+    wall = time.perf_counter() - start
+    simulated = (sim.clock.elapsed_us() - begin) / 1e6
+    print("straight(30), turn(90): really moved %.2f cm and turned %.1f degrees, %.1f s simulated in %.2f s"
+          % (distance, heading, simulated, wall))
+    _check(reached and turned, "a drive timed out")
+    _check(abs(distance - 30) < 0.5, "straight(30) moved %.2f cm" % distance)
+    _check(abs(heading - 90) < 2, "turn(90) turned %.1f degrees" % heading)
+    _check(simulated / wall > 10, "the drive ran only %.1fx faster than real time" % (simulated / wall))
+
+
+def benchmark_control_scheduler():
+    """
+    The shared ControlScheduler over one simulated second: tasks added out of phase order at different
+    dividers, checking each runs at its rate and in phase order within a tick, that a failing task doesn't stop
+    the others, and that the timer only fires on ticks where a task is due; then the stats of the default
+    scheduler running the motors and the IMU.
+    """
+    sim = _install()
+    from XRPLib.control_scheduler import ControlScheduler
+
+    scheduler = ControlScheduler(200)
+    log = []
+
+    def task(name, fail=False):
+        def run():
+            log.append((sim.clock.elapsed_us(), name))
+            if fail:
+                raise ValueError("always fails")
+        return run
+    # Added in the reverse of the order they must run in
+    tasks = [scheduler.add_task(task("user", fail=True), ControlScheduler.USER, 8, name="user"),
+             scheduler.add_task(task("imu"), ControlScheduler.IMU, 4, name="imu"),
+             scheduler.add_task(task("speed"), ControlScheduler.SPEED, 4, name="speed"),
+             scheduler.add_task(task("encoder"), ControlScheduler.ENCODER, 2, name="encoder")]
+    time.sleep(1)
+    scheduler.stop()
+    stats = scheduler.get_stats()
+    runs = {t.name: t.runs for t in tasks}
+    ticks = {}
+    for t, name in log:
+        # Each callback takes a few simulated microseconds, so group the runs by base tick
+        ticks.setdefault(t // scheduler.period_us, []).append(name)
+    order = ("encoder", "speed", "imu", "user")
+    in_order = all([n for n in order if n in names] == names for names in ticks.values())
+    print("Runs in 1 s: %s; %d timer callbacks; phases in order every tick: %s; %d errors counted"
+          % (", ".join("%s %d" % (n, runs[n]) for n in order), stats["cycles"], in_order, tasks[0].errors))
+    _check(abs(runs["encoder"] - 100) <= 1 and abs(runs["speed"] - 50) <= 1 and abs(runs["imu"] - 50) <= 1
+           and abs(runs["user"] - 25) <= 1, "tasks ran at the wrong rates: %s" % runs)
+    _check(in_order, "tasks ran out of phase order")
+    # Tasks with the same divider share ticks, so a later phase sees that tick's results
+    _check(all(("speed" in names) == ("imu" in names) for names in ticks.values()),
+           "tasks with the same divider ran on different ticks")
+    _check(stats["cycles"] <= 101, "the timer fired %d times for tasks due 100 times" % stats["cycles"])
+    _check(tasks[0].errors == runs["user"], "a failing task wasn't counted every time")
+
+    sim = _install()
+    from XRPLib.differential_drive import DifferentialDrive
+    from XRPLib.control_scheduler import ControlScheduler
+    drivetrain = DifferentialDrive.get_default_differential_drive()
+    scheduler = ControlScheduler.get_default_control_scheduler()
+    scheduler.reset_stats()
+    drivetrain.set_speed(10, 10)
+    time.sleep(1)
+    drivetrain.stop()
+    stats = scheduler.get_stats()
+    print("Default scheduler, driving for 1 s: %d timer callbacks; %s"
+          % (stats["cycles"], ", ".join("%s %d runs at %.0f Hz" % (t["name"], t["runs"], t["rate_hz"])
+                                        for t in stats["tasks"])))
+    for t in stats["tasks"]:
+        _check(abs(t["runs"] - t["rate_hz"]) <= 1, "%s ran %d times at %.0f Hz" % (t["name"], t["runs"], t["rate_hz"]))
+        _check(t["errors"] == 0, "%s failed %d times" % (t["name"], t["errors"]))
+
+
+def benchmark_encoder_fifo():
+    """
+    PIO FIFO operations (get + put) per control tick, with two motors under speed control,
+    and while DifferentialDrive.straight() also reads the encoders from its own loop.
+    """
+    sim = _install()
+    from XRPLib.control_scheduler import ControlScheduler
+    from XRPLib.differential_drive import DifferentialDrive
+    from XRPLib.encoded_motor import EncodedMotor
+
+    # No IMU, so the drivetrain's own loop reads the encoders for heading too
+    drivetrain = DifferentialDrive(EncodedMotor.get_default_encoded_motor(1),
+                                   EncodedMotor.get_default_encoded_motor(2))
+    scheduler = ControlScheduler.get_default_control_scheduler()
+
+    drivetrain.set_speed(10, 10)
+    scheduler.reset_stats()
+    ops = _fifo_ops(sim)
+    time.sleep(2)
+    per_tick = (_fifo_ops(sim) - ops) / scheduler.cycles
+    print("Speed control: %.1f FIFO ops per control tick" % per_tick)
+    drivetrain.stop()
+    # One put and one get per encoder read, two encoders a tick (draining the FIFO took 10)
+    _check(per_tick <= 4.0, "speed control took %.1f FIFO ops per tick" % per_tick)
+
+    scheduler.reset_stats()
+    ops = _fifo_ops(sim)
+    reached = drivetrain.straight(30, 0.5)
+    per_tick = (_fifo_ops(sim) - ops) / scheduler.cycles
+    left, right = drivetrain.get_left_encoder_position(), drivetrain.get_right_encoder_position()
+    true_left, true_right = sim.drive.wheel_travel()
+    error = max(abs(left - true_left), abs(right - true_right))
+    print("straight(30): %.1f FIFO ops per control tick; encoders read within %.3f cm of the wheels' travel"
+          % (per_tick, error))
+    _check(reached, "straight(30) timed out")
+    _check(per_tick < 13, "straight(30) took %.1f FIFO ops per tick (30.2 when draining)" % per_tick)
+    # The counts read on request are the current ones, not stale FIFO entries
+    _check(error < 0.05, "the encoders read %.3f cm from the wheels' travel" % error)
+
+
+def benchmark_encoder_bank():
+    """
+    One EncoderBank snapshot of the two drive motors while they turn in opposite directions: the order of its
+    PIO requests and reads, and its counts and positions against the simulated shafts and the motors' own reads.
+    """
+    sim = _install()
+    from XRPLib.encoder_bank import EncoderBank
+    from XRPLib.encoded_motor import EncodedMotor
+    from .models import COUNTS_PER_REV
+
+    left = EncodedMotor.get_default_encoded_motor(1)
+    right = EncodedMotor.get_default_encoded_motor(2)
+    bank = EncoderBank((left, right))
+    left.set_effort(-0.5)
+    right.set_effort(0.5)
+    time.sleep(1)
+    left.set_effort(0)
+    right.set_effort(0)
+
+    ops = []
+    for i, motor in enumerate((left, right)):
+        sm = motor._encoder.sm
+        for op in ("put", "get"):
+            def logged(*args, _op=op, _i=i, _fn=getattr(sm, op)):
+                ops.append("%s%d" % (_op, _i))
+                return _fn(*args)
+            setattr(sm, op, logged)
+    bank.update()
+    order = " ".join(ops)
+    # Shaft revolutions as each encoder counts them, with the motor's direction applied
+    true_counts = (-sim.motors["MOTOR_L"].counts(), sim.motors["MOTOR_R"].counts())
+    counts = list(bank.counts[:2])
+    positions = list(bank.positions[:2])
+    own = (left.get_position(), right.get_position())
+    print("EncoderBank.update(): %s; counts %s (shafts %s), positions %.4f and %.4f revs"
+          % (order, counts, list(true_counts), positions[0], positions[1]))
+    _check(order == "put0 put1 get0 get1", "the counts weren't all requested before being read: %s" % order)
+    _check(counts == list(true_counts), "the snapshot's counts differ from the shafts")
+    _check(all(abs(positions[i] - true_counts[i] / COUNTS_PER_REV) < 1e-4 for i in range(2)),
+           "the snapshot's positions don't match its counts")
+    _check(all(abs(positions[i] - own[i]) < 1e-4 for i in range(2)), "the snapshot differs from the motors' own reads")
+
+
+def benchmark_speed_jitter():
+    """
+    Speed measurement and tracking error for a motor held at 60 rpm, as the control timer's
+    callbacks are delayed by more and more jitter (up to 25 ms, so ticks are missed too),
+    with the default speed estimation and with period-based estimation and filtering.
+    """
+    errors = {}
+    for period_below_counts, filter_alpha in ((0, 1.0), (4, 0.5)):
+        for jitter_us in (0, 8000, 25000):
+            sim = _install(timer_jitter_us=jitter_us, seed=1)
+            from XRPLib.encoded_motor import EncodedMotor
+
+            motor = EncodedMotor.get_default_encoded_motor(2)
+            motor.set_speed_estimation(period_below_counts, filter_alpha)
+            model = sim.motors["MOTOR_R"]
+            motor.set_speed(60)
+            # Let the speed controller settle first
+            time.sleep(10)
+            measure_sq = track_sq = 0
+            samples = 300
+            for _ in range(samples):
+                time.sleep(0.01)
+                actual_rpm = model.speed() * 60
+                measure_sq += (motor.get_speed() - actual_rpm) ** 2
+                track_sq += (actual_rpm - 60) ** 2
+            motor.set_speed()
+            measure, track = (measure_sq / samples) ** 0.5, (track_sq / samples) ** 0.5
+            errors[period_below_counts, jitter_us] = measure, track
+            print("Estimation (%d, %.1f), timer jitter %5d us: measurement error %.2f rpm RMS, "
+                  "tracking error %.2f rpm RMS" % (period_below_counts, filter_alpha, jitter_us, measure, track))
+
+    # Assuming a fixed 20 ms between samples measured 10.1 / 25.7 rpm RMS and tracked to 2.7 / 12.7 rpm RMS
+    _check(errors[0, 8000][0] < 5 and errors[0, 8000][1] < 1.5, "8 ms of jitter still upsets the speed measurement")
+    _check(errors[0, 25000][1] < 5, "25 ms of jitter still upsets speed control")
+    for jitter_us in (0, 8000, 25000):
+        _check(errors[4, jitter_us][0] < errors[0, jitter_us][0],
+               "period-based estimation didn't improve the measurement at %d us of jitter" % jitter_us)
+    _check(errors[4, 25000][0] < 6, "period-based estimation measured %.2f rpm RMS off" % errors[4, 25000][0])
+
+
+def _record_pid_traces():
+    """
+    Record the (error, timestep) updates PID controllers see while driving the simulated robot,
+    with their gains: the speed controller holding 60 rpm, and the controllers of straight() and turn().
+    """
+    _install()
+    from XRPLib.differential_drive import DifferentialDrive
+    from XRPLib.encoded_motor import EncodedMotor
+    from XRPLib.pid import PID
+
+    traces = []
+
+    def recording_pid(**gains):
+        trace = []
+        traces.append((gains, trace))
+        pid = PID(**gains)
+        update_with_timestep = pid.update_with_timestep
+
+        def record(error, timestep, debug=False):
+            trace.append((error, timestep))
+            return update_with_timestep(error, timestep, debug)
+        pid.update_with_timestep = record
+        return pid
+
+    motor = EncodedMotor.get_default_encoded_motor(2)
+    motor.set_speed_controller(recording_pid(kp=0.035, ki=0.03))
+    motor.set_speed(60)
+    time.sleep(3)
+    motor.set_speed()
+
+    drivetrain = DifferentialDrive.get_default_differential_drive()
+    drivetrain.straight(30, 0.5,
+                        main_controller=recording_pid(kp=0.1, ki=0.04, kd=0.04, min_output=0.3, max_output=0.5,
+                                                      max_integral=10, tolerance=0.25, tolerance_count=3),
+                        secondary_controller=recording_pid(kp=0.075, kd=0.001))
+    drivetrain.turn(90, 0.5,
+                    main_controller=recording_pid(kp=0.2, ki=0.004, kd=0.0036, min_output=0.1, max_output=0.5,
+                                                  max_integral=30, tolerance=1, tolerance_count=3),
+                    secondary_controller=recording_pid(kp=0.25, max_derivative=5))
+    return traces
+
+
+def benchmark_fixed_point_pid():
+    """
+    Replays recorded error traces through PID and FixedPointPID: how far apart their outputs get and
+    whether they finish on the same update (the equivalence check), and the host time per update.
+    The host timing only compares the two; on the robot, run benchmark_pid_update() from XRPExamples/xrp_test.py.
+    """
+    traces = _record_pid_traces()
+    from XRPLib.fixed_point_pid import FixedPointPID
+    from XRPLib.pid import PID
+
+    for gains, trace in traces:
+        pid = PID(**gains)
+        fixed = FixedPointPID(**gains)
+        max_diff = 0
+        done_pid = done_fixed = None
+        for i, (error, timestep) in enumerate(trace):
+            diff = abs(pid.update_with_timestep(error, timestep) - fixed.update_with_timestep(error, timestep))
+            max_diff = max(max_diff, diff)
+            if done_pid is None and pid.is_done():
+                done_pid = i
+            if done_fixed is None and fixed.is_done():
+                done_fixed = i
+        print("%-60s %4d updates: max output difference %.4f, done at update %s / %s"
+              % (", ".join("%s=%g" % kv for kv in gains.items()), len(trace), max_diff, done_pid, done_fixed))
+        # Within the rounding of the fixed-point formats, and finishing together
+        _check(max_diff < 0.02, "FixedPointPID's output was %.4f from PID's" % max_diff)
+        _check(done_pid == done_fixed, "FixedPointPID finished at update %s, PID at %s" % (done_fixed, done_pid))
+
+    gains, trace = traces[0]
+    for controller in (PID(**gains), FixedPointPID(**gains)):
+        start = time.perf_counter()
+        for _ in range(20):
+            controller.clear_history()
+            for error, timestep in trace:
+                controller.update_with_timestep(error, timestep)
+        elapsed = time.perf_counter() - start
+        print("%s: %.2f us per update on this host" % (type(controller).__name__, elapsed / (20 * len(trace)) * 1e6))
+
+
+def benchmark_feedforward_settling():
+    """
+    Time for a motor to settle within 5% of a 60 rpm target from rest, with the default PID speed control
+    and with characterize()d feedforward added.
+    """
+    times = {}
+    for feedforward in (False, True):
+        sim = _install()
+        from XRPLib.encoded_motor import EncodedMotor
+
+        motor = EncodedMotor.get_default_encoded_motor(2)
+        model = sim.motors["MOTOR_R"]
+        if feedforward:
+            motor.characterize()
+            time.sleep(1)
+        motor.set_speed(60)
+        settled = None
+        for i in range(1, 1001):
+            time.sleep(0.01)
+            if abs(model.speed() * 60 - 60) > 3:
+                settled = None
+            elif settled is None:
+                settled = i * 0.01
+        motor.set_speed()
+        times[feedforward] = settled if settled is not None else float("inf")
+        print("%s: settled in %s" % ("PID + feedforward" if feedforward else "PID only",
+                                     "%.2f s" % settled if settled is not None else "more than 10 s"))
+    _check(times[True] < 0.5, "with feedforward, the motor took %.2f s to settle" % times[True])
+    _check(times[True] * 5 < times[False], "feedforward didn't settle much faster than PID alone")
+
+
+def _track_pose(sim):
+    # Keep the true pose integrated while the robot moves
+    from machine import Timer
+    timer = Timer(-1)
+    timer.init(freq=100, callback=lambda t: sim.drive.pose())
+    return timer
+
+
+def benchmark_motion_profiles():
+    """
+    Drives the square from XRPExamples/drive_examples.py (four 30 cm sides and 90 degree turns)
+    with straight()/turn(), then with straight_profiled()/turn_profiled() after characterizing the motors,
+    and reports the total time and how far from its starting pose the robot ends up. Then checks moves of no
+    length finish, and limits of 0 are refused.
+    """
+    times = {}
+    errors = {}
+    for profiled in (False, True):
+        sim = _install()
+        from XRPLib.differential_drive import DifferentialDrive
+
+        drivetrain = DifferentialDrive.get_default_differential_drive()
+        if profiled:
+            drivetrain.left_motor.characterize()
+            drivetrain.right_motor.characterize()
+            time.sleep(1)
+        timer = _track_pose(sim)
+        x0, y0, heading0 = sim.drive.pose()
+        start = sim.clock.elapsed_us()
+        for _ in range(4):
+            if profiled:
+                drivetrain.straight_profiled(30, 24, 100)
+                drivetrain.turn_profiled(90, 140, 700)
+            else:
+                drivetrain.straight(30, 0.8)
+                drivetrain.turn(90)
+        elapsed = (sim.clock.elapsed_us() - start) / 1e6
+        time.sleep(0.5)
+        timer.deinit()
+        x, y, heading = sim.drive.pose()
+        times[profiled] = elapsed
+        errors[profiled] = (((x - x0) ** 2 + (y - y0) ** 2) ** 0.5, abs(heading - heading0 - 360))
+        print("%s: square done in %.2f s, ending %.2f cm and %.1f degrees from the start"
+              % ("Profiled" if profiled else "straight()/turn()", elapsed, errors[profiled][0], heading - heading0 - 360))
+    # straight()/turn() took 11.24 s, ending 0.70 cm and 0.2 degrees off; profiled moves that stopped as soon as they
+    # were within tolerance ended 1.44 cm and 3.8 degrees off, and with the closing loop take 10.5 s, ending 0.3 cm
+    # and 0.3 degrees off
+    _check(times[True] < times[False] - 0.5, "the profiled square wasn't faster than straight()/turn()")
+    _check(errors[True][0] < 0.5 and errors[True][1] < 1,
+           "the profiled square ended %.2f cm and %.1f degrees off" % errors[True])
+    _check(errors[True][0] <= errors[False][0] and errors[True][1] <= errors[False][1] + 0.5,
+           "the profiled square ended farther off than straight()/turn()")
+
+    # Moves of no length are already done, and limits of 0 are refused up front rather than dividing by them
+    start = sim.clock.elapsed_us()
+    done = drivetrain.straight_profiled(0, max_jerk=300) and drivetrain.turn_profiled(0, max_jerk=2000)
+    _check(done and sim.clock.elapsed_us() - start < 1000000, "zero-length S-curve moves didn't finish")
+    from XRPLib.motion_profile import SCurveProfile, TrapezoidProfile
+    for make in (lambda: TrapezoidProfile(30, 20, 0), lambda: SCurveProfile(30, 20, 60, 0)):
+        try:
+            make()
+            refused = False
+        except ValueError:
+            refused = True
+        _check(refused, "a motion profile with a limit of 0 didn't raise ValueError")
+
+
+def benchmark_drive_http_latency():
+    """
+    HTTP response times from a uasyncio server on the same event loop as a straight(30) drive, calling the
+    blocking straight() from a task and awaiting straight_async(); then checks that cancelling a drive stops it.
+    """
+    max_latency = {}
+    for use_async in (False, True):
+        sim = _install()
+        import uasyncio as asyncio
+        from XRPLib.differential_drive import DifferentialDrive
+
+        drivetrain = DifferentialDrive.get_default_differential_drive()
+        latencies = []
+
+        async def handle(reader, writer):
+            await reader.readline()
+            writer.write(b"HTTP/1.0 200 OK\r\n\r\nok")
+            await writer.drain()
+            await writer.wait_closed()
+
+        async def client(port, done):
+            # Like a browser polling every 50 ms: a request that can't be sent on time (because the
+            # loop is blocked) would have waited in the server's backlog, so time it from when it was due
+            due = time.ticks_us()
+            while not done.is_set():
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"GET / HTTP/1.0\r\n\r\n")
+                await writer.drain()
+                await reader.read(-1)
+                await writer.wait_closed()
+                latencies.append(time.ticks_diff(time.ticks_us(), due) / 1000)
+                due = time.ticks_add(due, 50000)
+                wait = time.ticks_diff(due, time.ticks_us())
+                if wait > 0:
+                    await asyncio.sleep_ms((wait + 999) // 1000)
+
+        async def run():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            done = asyncio.Event()
+            requests = asyncio.create_task(client(server.sockets[0].getsockname()[1], done))
+            await asyncio.sleep_ms(100)
+            if use_async:
+                result = await drivetrain.straight_async(30)
+            else:
+                result = drivetrain.straight(30)
+            # Let the requests that came due during the drive be answered
+            await asyncio.sleep_ms(200)
+            done.set()
+            await requests
+            server.close()
+            return result
+
+        result = asyncio.run(run())
+        max_latency[use_async] = max(latencies)
+        print("%s: reached %s, %d requests, response time mean %.1f ms, max %.1f ms"
+              % ("straight_async()" if use_async else "straight()", result, len(latencies),
+                 sum(latencies) / len(latencies), max(latencies)))
+        _check(result, "the drive didn't reach its distance")
+    # Blocking straight() held requests for up to 2.3 s; straight_async() answers them in 0.1 ms
+    _check(max_latency[False] > 1000, "blocking straight() didn't hold up requests; the benchmark isn't measuring anything")
+    _check(max_latency[True] < 100, "requests waited up to %.1f ms during straight_async()" % max_latency[True])
+
+    motors = (sim.motors["MOTOR_L"], sim.motors["MOTOR_R"])
+
+    async def cancel():
+        drive = asyncio.create_task(drivetrain.straight_async(30))
+        await asyncio.sleep_ms(500)
+        drive.cancel()
+        try:
+            await drive
+        except asyncio.CancelledError:
+            pass
+        # Stopping is part of cancelling, not something left for later
+        return all(m.effort == 0 for m in motors)
+
+    travel = sum(sim.drive.wheel_travel()) / 2
+    stopped_at_once = asyncio.run(cancel())
+    cancelled_at = sum(sim.drive.wheel_travel()) / 2 - travel
+    time.sleep(0.5)
+    stopped = all(m.effort == 0 and abs(m.speed()) < 0.01 for m in motors)
+    coasted = sum(sim.drive.wheel_travel()) / 2 - travel - cancelled_at
+    print("Motors stopped after cancelling straight_async(): %s, %.2f cm into the drive, coasting %.2f cm after"
+          % (stopped, cancelled_at, coasted))
+    _check(stopped_at_once and stopped, "the motors kept running after straight_async() was cancelled")
+    _check(0 < cancelled_at < 30 and coasted < 2, "the drive carried on after it was cancelled")
+
+
+def benchmark_odometry():
+    """
+    Cost of each odometry update (host time and simulated hardware accesses), then drives a 30 cm square
+    through follow_waypoints() and back to the start with go_to_point(), comparing the odometry's pose with
+    the simulated robot's true pose; then drives straight while resetting the encoders, timed to land just
+    before a control scheduler tick, and checks the odometry still follows the robot.
+    """
+    sim = _install()
+    from XRPLib.control_scheduler import ControlScheduler
+    from XRPLib.differential_drive import DifferentialDrive
+
+    drivetrain = DifferentialDrive.get_default_differential_drive()
+    odometry = drivetrain.get_odometry()
+    scheduler = ControlScheduler.get_default_control_scheduler()
+    task = odometry._task
+
+    drivetrain.set_speed(10, 15)
+    time.sleep(0.5)
+    runs = 200
+    i2c = sim.counters.get("i2c.transactions", 0)
+    ops = _fifo_ops(sim)
+    start = time.perf_counter()
+    for _ in range(runs):
+        odometry._update()
+    host_us = (time.perf_counter() - start) * 1e6 / runs
+    ops = (_fifo_ops(sim) - ops) / runs
+    i2c = (sim.counters.get("i2c.transactions", 0) - i2c) / runs
+    print("Odometry update: %.1f us on the host, %.1f FIFO ops and %.1f I2C transactions per update"
+          % (host_us, ops, i2c))
+    # The update reuses speed control's encoder snapshot and the IMU's integrated yaw
+    _check(ops == 0 and i2c == 0, "an odometry update touches the hardware")
+    drivetrain.stop()
+    time.sleep(0.5)
+    odometry.reset_pose()
+
+    timer = _track_pose(sim)
+    x0, y0, heading0 = sim.drive.pose()
+    scheduler.reset_stats()
+    start = sim.clock.elapsed_us()
+    reached = drivetrain.follow_waypoints([(30, 0), (30, 30), (0, 30)], 20)
+    reached = drivetrain.go_to_point(0, 0, 20) and reached
+    elapsed = (sim.clock.elapsed_us() - start) / 1e6
+    time.sleep(0.5)
+    timer.deinit()
+    x, y, heading = sim.drive.pose()
+    ox, oy, oheading = odometry.get_pose()
+    print("Waypoint square: reached %s in %.2f s, %d odometry updates; true end (%.2f, %.2f, %.1f deg), "
+          "odometry (%.2f, %.2f, %.1f deg)"
+          % (reached, elapsed, task.runs, x - x0, y - y0, heading - heading0, ox, oy, oheading))
+    # The odometry started at the robot's true pose, facing along its x axis
+    cos_h, sin_h = math.cos(math.radians(heading0)), math.sin(math.radians(heading0))
+    true_x = (x - x0) * cos_h + (y - y0) * sin_h
+    true_y = (y - y0) * cos_h - (x - x0) * sin_h
+    position_error = math.hypot(ox - true_x, oy - true_y)
+    heading_error = abs(oheading - (heading - heading0))
+    _check(reached, "the waypoint square didn't reach its points")
+    # 0.08 cm and 0.0 degrees off after the square
+    _check(position_error < 0.5 and heading_error < 1,
+           "the odometry ended %.2f cm and %.2f degrees from the true pose" % (position_error, heading_error))
+
+    # Resetting the encoders must neither lose the motion up to the reset nor count the jump back to 0 as motion,
+    # even if the control scheduler comes due in the middle of it
+    odometry.reset_pose()
+    x0, y0, _ = sim.drive.pose()
+    drivetrain.set_effort(0.6, 0.6)
+    for i in range(300):
+        time.sleep_ms(3)
+        wait = sim.clock.next_due_us() - sim.clock.now_us - i % 40
+        if wait > 0:
+            time.sleep_us(wait)
+        drivetrain.reset_encoder_position()
+    drivetrain.stop()
+    time.sleep(0.3)
+    x, y, _ = sim.drive.pose()
+    travel = math.hypot(x - x0, y - y0)
+    odometry_travel = math.hypot(odometry.get_x(), odometry.get_y())
+    print("Straight with 300 encoder resets: true travel %.2f cm, odometry %.2f cm" % (travel, odometry_travel))
+    # Resyncing without bringing the pose up to date first kept only 2.06 of 24.51 cm
+    _check(abs(odometry_travel - travel) < 0.2, "the odometry lost track of the robot across encoder resets")
+
+
+def benchmark_path_following():
+    """
+    Route time for the 30 cm square as a chain of straight()/turn() calls, which stop and settle at every corner,
+    and as one follow_path() through its corners, without and with the motors' feedforward characterized.
+    """
+    square = [(30, 0), (30, 30), (0, 30), (0, 0)]
+    times = {}
+    errors = {}
+    for mode in ("chained", "path", "path + feedforward"):
+        sim = _install()
+        from XRPLib.differential_drive import DifferentialDrive
+
+        drivetrain = DifferentialDrive.get_default_differential_drive()
+        if mode == "path + feedforward":
+            drivetrain.left_motor.characterize()
+            drivetrain.right_motor.characterize()
+            time.sleep(1)
+        drivetrain.get_odometry()
+        timer = _track_pose(sim)
+        x0, y0, heading0 = sim.drive.pose()
+        start = sim.clock.elapsed_us()
+        if mode == "chained":
+            for _ in range(4):
+                drivetrain.straight(30, 0.8)
+                drivetrain.turn(90)
+        else:
+            drivetrain.follow_path(square, 24)
+        elapsed = (sim.clock.elapsed_us() - start) / 1e6
+        time.sleep(0.5)
+        timer.deinit()
+        x, y, heading = sim.drive.pose()
+        times[mode] = elapsed
+        errors[mode] = ((x - x0) ** 2 + (y - y0) ** 2) ** 0.5
+        print("%s: route done in %.2f s, ending %.2f cm from the start"
+              % ("straight()/turn()" if mode == "chained" else "follow_path() (%s)" % mode, elapsed, errors[mode]))
+    # straight()/turn() took 11.24 s; follow_path() 9.40 s, and 6.32 s with feedforward
+    _check(times["path"] < times["chained"], "follow_path() wasn't faster than chained straight()/turn()")
+    _check(times["path + feedforward"] < times["chained"] * 0.7,
+           "follow_path() with feedforward took %.2f s" % times["path + feedforward"])
+    # follow_path() stops on progress along the path, so it keeps whatever it's off to the side at the end:
+    # 2.08 cm without feedforward, 0.32 cm with it (chained moves end 0.70 cm off)
+    _check(errors["path"] < 3 and errors["path + feedforward"] < 1,
+           "follow_path() ended %.2f cm (%.2f cm with feedforward) from the end"
+           % (errors["path"], errors["path + feedforward"]))
+
+
+def benchmark_imu_fifo():
+    """
+    Yaw error after spinning the robot for 5 s with the control timer's callbacks jittered by up to 25 ms,
+    reading the gyro's output registers once per sample and batching it in the sensor's FIFO, at several
+    data rates; with the Python wakeups and I2C transactions each took, and whether every gyro sample the
+    sensor produced was integrated.
+    """
+    from .lsm6dso import TAG_GYRO
+
+    def gyro_samples_read(sim):
+        # Samples the sensor has produced, less those still waiting in its FIFO
+        waiting = sum(1 for word in sim.imu.fifo if word[0] >> 3 == TAG_GYRO)
+        return sim.imu.fifo_samples[TAG_GYRO] - waiting
+
+    wakeups = {}
+    for use_fifo in (False, True):
+        for rate in ("208Hz", "833Hz", "1660Hz"):
+            sim = _install(timer_jitter_us=25000, seed=1)
+            from XRPLib.encoded_motor import EncodedMotor
+            from XRPLib.imu import IMU
+
+            imu = IMU(use_fifo=use_fifo)
+            imu.gyro_rate(rate)
+            imu.calibrate(0.5)
+            left = EncodedMotor.get_default_encoded_motor(1)
+            right = EncodedMotor.get_default_encoded_motor(2)
+            timer = _track_pose(sim)
+            _, _, heading0 = sim.drive.pose()
+            imu.reset_yaw()
+            runs = imu._update_task.runs
+            i2c = sim.counters.get("i2c.transactions", 0)
+            produced = gyro_samples_read(sim)
+            integrated = imu.fifo_samples
+            left.set_effort(-0.6)
+            right.set_effort(0.6)
+            time.sleep(5)
+            left.set_effort(0)
+            right.set_effort(0)
+            time.sleep(1)
+            timer.deinit()
+            _, _, heading = sim.drive.pose()
+            error = imu.get_yaw() - (heading - heading0)
+            wakeups[use_fifo, rate] = (imu._update_task.runs - runs) / 6
+            line = "%s at %6s: yaw error %6.2f degrees, %3.0f wakeups/s, %4.0f I2C transactions/s" % (
+                "FIFO     " if use_fifo else "Registers", rate, error,
+                wakeups[use_fifo, rate], (sim.counters.get("i2c.transactions", 0) - i2c) / 6)
+            if use_fifo:
+                produced = gyro_samples_read(sim) - produced
+                integrated = imu.fifo_samples - integrated
+                line += ", %d of %d samples integrated, %d dropped" % (integrated, produced, sim.imu.fifo_dropped)
+            print(line)
+            # Up to 0.11 degrees off after the spin, in either mode
+            _check(abs(error) < 0.5, "yaw ended %.2f degrees off at %s" % (error, rate))
+            if use_fifo:
+                _check(sim.imu.fifo_dropped == 0, "the sensor's FIFO overflowed at %s" % rate)
+                _check(produced > 0 and integrated == produced,
+                       "%d of %d gyro samples integrated at %s" % (integrated, produced, rate))
+                # 50 wakeups/s against 200 reading the registers
+                _check(wakeups[True, rate] * 4 <= wakeups[False, rate], "batching didn't cut wakeups at %s" % rate)
+
+
+def benchmark_imu_read():
+    """
+    The IMU's output-register getters with the simulated sensor holding known rates and accelerations: whether
+    each returns the right values, how many I2C transactions it takes, and whether it reads into the same buffer
+    every call; then the peak heap growth per call, traced by tracemalloc, with the I2C read itself left out.
+    """
+    import tracemalloc
+
+    sim = _install()
+    gyro = (12.5, -20.0, 31.25)
+    accel = (0.125, -0.25, 0.96875)
+    sim.imu.gyro_dps = gyro
+    sim.imu.accel_g = accel
+    from XRPLib.control_scheduler import ControlScheduler
+    from XRPLib.imu import IMU
+
+    imu = IMU()
+    # Let the sensor sample the new values, then keep the IMU's own updates out of the counts
+    time.sleep(0.1)
+    ControlScheduler.get_default_control_scheduler().stop()
+
+    # Every buffer read into, kept alive so a new one can't reuse an old one's id
+    buffers = []
+    read_into = imu.i2c.readfrom_mem_into
+
+    def recording_read_into(addr, memaddr, buf):
+        buffers.append(buf)
+        read_into(addr, memaddr, buf)
+
+    # The sensor's resolution at the IMU's full scales, from 4.375 mdps per LSB at 125 dps and 0.061 mg per LSB at 2 g
+    mdps_per_lsb = 4.375 * imu._gyro_scale_factor
+    mg_per_lsb = 0.061 * imu._acc_scale_factor
+    expected_gyro = [round(v * 1000 / mdps_per_lsb) * mdps_per_lsb for v in gyro]
+    expected_acc = [round(v * 1000 / mg_per_lsb) * mg_per_lsb for v in accel]
+    getters = (
+        (imu.get_acc_x, [expected_acc[0]]),
+        (imu.get_acc_y, [expected_acc[1]]),
+        (imu.get_acc_z, [expected_acc[2]]),
+        (imu.get_acc_rates, expected_acc),
+        (imu.get_gyro_x_rate, [expected_gyro[0]]),
+        (imu.get_gyro_y_rate, [expected_gyro[1]]),
+        (imu.get_gyro_z_rate, [expected_gyro[2]]),
+        (imu.get_gyro_rates, expected_gyro),
+        (imu.get_acc_gyro_rates, expected_acc + expected_gyro),
+    )
+    runs = 1000
+    for getter, expected in getters:
+        del buffers[:]
+        imu.i2c.readfrom_mem_into = recording_read_into
+        i2c = sim.counters.get("i2c.transactions", 0)
+        for _ in range(runs):
+            value = getter()
+        transactions = (sim.counters.get("i2c.transactions", 0) - i2c) / runs
+        values = value if isinstance(value, list) else [value]
+        if getter == imu.get_acc_gyro_rates:
+            values = list(value[0]) + list(value[1])
+
+        # The getter's own allocations: the read leaves the buffer holding the last reading
+        imu.i2c.readfrom_mem_into = lambda addr, memaddr, buf: None
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            for _ in range(runs):
+                getter()
+            peak = tracemalloc.get_traced_memory()[1] - start
+        finally:
+            tracemalloc.stop()
+        persistent = all(buf is buffers[0] for buf in buffers)
+        print("%s: %.0f I2C transactions per call, %s buffer, peak heap growth %d B, returned %s"
+              % (getter.__name__, transactions, "the same" if persistent else "a new", peak,
+                 ", ".join("%.3f" % v for v in values)))
+        _check(all(abs(v - w) < 1e-3 for v, w in zip(values, expected)) and len(values) == len(expected),
+               "%s returned %s, not %s" % (getter.__name__, values, expected))
+        _check(transactions == 1, "%s took %.1f I2C transactions" % (getter.__name__, transactions))
+        _check(persistent, "%s read into a new buffer" % getter.__name__)
+        # Calling a method that returns a float peaks at 128 B on CPython; reading into a new bytearray and
+        # slicing it per axis, as the getters did, peaks at 455 B
+        _check(peak < 200, "%s grew the heap by %d B at its peak" % (getter.__name__, peak))
+    imu.i2c.readfrom_mem_into = read_into
+
+
+def benchmark_imu_fusion():
+    """
+    Host time per MahonyFilter update, then pitch, roll and yaw error over a 10-minute trace of the robot
+    standing still and tilting onto a 15 degree ramp once a minute, while the gyro's bias drifts up to
+    0.2 dps on every axis after calibration, with gyro integration alone and with fusion.
+    """
+    _install()
+    from XRPLib.mahony_filter import MahonyFilter
+    fusion = MahonyFilter()
+    runs = 20000
+    start = time.perf_counter()
+    for _ in range(runs):
+        fusion.update(0.01, -0.02, 0.03, 0.0, 0.01, 1.0, 0.0048)
+    print("MahonyFilter.update: %.2f us on the host" % ((time.perf_counter() - start) * 1e6 / runs))
+
+    import math
+
+    def pitch(t):
+        # Up onto the ramp over 2 s, 20 s on it, back down over 2 s, once a minute
+        phase = t % 60
+        if phase < 2:
+            return 7.5 * phase
+        if phase < 22:
+            return 15
+        if phase < 24:
+            return 15 - 7.5 * (phase - 22)
+        return 0
+
+    def pitch_rate(t):
+        phase = t % 60
+        return 7.5 if phase < 2 else -7.5 if 22 <= phase < 24 else 0
+
+    worst = {}
+    for use_fusion in (False, True):
+        sim = _install()
+        from XRPLib.imu import IMU
+
+        imu = IMU(use_fusion=use_fusion)
+        # The bias would otherwise be learned while standing still
+        imu.track_bias = False
+        imu.calibrate(1)
+        start = sim.clock.seconds()
+        bias = lambda t: 0.2 * (t - start) / 600
+        sim.imu.gyro_dps = lambda t: (pitch_rate(t - start) + bias(t), bias(t), bias(t))
+        sim.imu.accel_g = lambda t: (0.0, math.sin(math.radians(pitch(t - start))), math.cos(math.radians(pitch(t - start))))
+        imu.reset_pitch()
+        imu.reset_roll()
+        imu.reset_yaw()
+        worst_pitch = worst_roll = 0
+        for _ in range(1200):
+            time.sleep(0.5)
+            worst_pitch = max(worst_pitch, abs(imu.get_pitch() - pitch(sim.clock.seconds() - start)))
+            worst_roll = max(worst_roll, abs(imu.get_roll()))
+        worst[use_fusion] = max(worst_pitch, worst_roll)
+        print("%s: after 10 minutes, pitch error %.2f (max %.2f), roll error %.2f (max %.2f), yaw drift %.2f degrees"
+              % ("Fusion     " if use_fusion else "Gyro only  ", imu.get_pitch() - pitch(sim.clock.seconds() - start),
+                 worst_pitch, imu.get_roll(), worst_roll, imu.get_yaw()))
+    # Gravity as the accelerometer sees it, level at the end of the trace, and nothing left over
+    gravity = imu.get_gravity()
+    linear = imu.get_linear_acceleration()
+    print("Fusion gravity (%.1f, %.1f, %.1f) mg, linear acceleration (%.1f, %.1f, %.1f) mg" % (tuple(gravity) + tuple(linear)))
+    # Gyro integration alone drifted almost 60 degrees; fusion stays within 0.08 of the true pitch and roll.
+    # Nothing corrects the yaw, which has no gravity reference
+    _check(worst[False] > 10, "gyro integration didn't drift; the benchmark isn't measuring anything")
+    _check(worst[True] < 1, "fused pitch or roll was %.2f degrees off" % worst[True])
+    _check(abs(gravity[0]) < 20 and abs(gravity[1]) < 20 and abs(gravity[2] - 1000) < 20,
+           "the gravity vector was (%.1f, %.1f, %.1f) mg when level" % tuple(gravity))
+    _check(all(abs(v) < 20 for v in linear), "the linear acceleration was (%.1f, %.1f, %.1f) mg standing still" % tuple(linear))
+
+
+def benchmark_imu_calibration():
+    """
+    Simulated start-up time of IMU.get_default_imu() on a cold start, which calibrates, and a warm start, which
+    loads the offsets saved for the board; then the yaw error over 5 minutes after the gyro's bias has shifted
+    0.3 dps since they were saved, standing still with a spin once a minute, with the offsets fixed and tracked;
+    and how stale offsets are relearned while standing still.
+    """
+    import os
+    import tempfile
+
+    bias = (0.5, -0.4, 0.6)
+    shifted = tuple(b + 0.3 for b in bias)
+    with tempfile.TemporaryDirectory() as directory:
+        # One flash directory for all the runs, so the warm starts find what the cold start saved
+        path = os.path.join(directory, "imu_calibration.json")
+        took = {}
+        offsets = {}
+        for start in ("Cold", "Warm"):
+            sim = _install(flash_dir=directory)
+            sim.imu.gyro_dps = bias
+            from XRPLib.imu import IMU
+            begin = sim.clock.elapsed_us()
+            imu = IMU.get_default_imu()
+            took[start] = (sim.clock.elapsed_us() - begin) / 1e6
+            offsets[start] = list(imu.gyro_offsets)
+            print("%s start: get_default_imu() took %.3f s" % (start, took[start]))
+        _check(offsets["Warm"] == offsets["Cold"], "the warm start didn't restore the saved offsets")
+        _check(took["Warm"] < took["Cold"] / 10, "the warm start wasn't faster than calibrating")
+
+        errors = {}
+        for track_bias in (False, True):
+            sim = _install(flash_dir=directory)
+            sim.imu.gyro_dps = shifted
+            from XRPLib.encoded_motor import EncodedMotor
+            from XRPLib.imu import IMU
+            imu = IMU.get_default_imu()
+            imu.track_bias = track_bias
+            with open(path) as f:
+                saved = f.read()
+            left = EncodedMotor.get_default_encoded_motor(1)
+            right = EncodedMotor.get_default_encoded_motor(2)
+            timer = _track_pose(sim)
+            _, _, heading0 = sim.drive.pose()
+            imu.reset_yaw()
+            for _ in range(5):
+                time.sleep(57)
+                left.set_effort(-0.6)
+                right.set_effort(0.6)
+                time.sleep(2)
+                left.set_effort(0)
+                right.set_effort(0)
+                time.sleep(1)
+            timer.deinit()
+            _, _, heading = sim.drive.pose()
+            errors[track_bias] = imu.get_yaw() - (heading - heading0)
+            print("%s: yaw error %6.2f degrees after 5 minutes, gyro z offset %.3f dps (bias %.3f), %d updates"
+                  % ("Bias tracked" if track_bias else "Offsets fixed", errors[track_bias],
+                     imu.gyro_offsets[2] / 1000, shifted[2], imu.bias_updates))
+            with open(path) as f:
+                _check(f.read() == saved, "the control loop wrote the offsets to flash")
+        _check(abs(errors[True]) < 5, "tracking the bias left %.2f degrees of yaw error" % errors[True])
+        _check(abs(errors[True]) < abs(errors[False]) / 10, "tracking the bias didn't reduce the yaw error")
+        imu.save_calibration()
+        with open(path) as f:
+            _check(f.read() != saved, "save_calibration() didn't write the tracked offsets")
+
+    # Offsets that are 0.9 dps off for 2 minutes standing still: loaded stale from flash, or made stale by the
+    # bias shifting after calibrate(), with the FIFO and the output registers
+    for use_fifo in (True, False):
+        for stale in ("saved", "shifted"):
+            sim = _install()
+            from XRPLib.imu import IMU
+            imu = IMU(use_fifo=use_fifo)
+            if stale == "saved":
+                imu.gyro_offsets = [0, 0, 900]
+                imu.save_calibration()
+                imu.load_calibration()
+            else:
+                imu.calibrate()
+                sim.imu.gyro_dps = (0, 0, 0.9)
+            imu.reset_yaw()
+            time.sleep(120)
+            print("%s, offsets %s: yaw error %6.2f degrees after 2 minutes, gyro z offset %.3f dps, %d updates"
+                  % ("FIFO     " if use_fifo else "Registers", stale.ljust(7), imu.get_yaw(),
+                     imu.gyro_offsets[2] / 1000, imu.bias_updates))
+            _check(imu.bias_updates > 0, "stale offsets were never updated")
+            _check(abs(imu.gyro_offsets[2] - sim.imu.gyro_dps[2] * 1000) < 50, "stale offsets weren't relearned")
+            # Replacing the offsets waits for RELEARN_TIME, drifting 0.9 degrees a second meanwhile
+            _check(abs(imu.get_yaw()) < (2 if stale == "saved" else 8), "stale offsets drifted the yaw too far")
+
+
+def benchmark_imu_load():
+    """
+    Yaw error after spinning the robot for 5 s while a busy program (e.g. the web server) delays the control
+    timer's callbacks by up to 0, 10 and 25 ms, and ticks that come due meanwhile are absorbed into the late
+    callback, as MicroPython's soft timers do; reading the gyro's output registers once per callback, and
+    batching it in the sensor's FIFO. Then how long calibrate(0.5) takes when the ticks counters wrap during it.
+    """
+    for use_fifo in (False, True):
+        for jitter_ms in (0, 10, 25):
+            sim = _install(timer_jitter_us=jitter_ms * 1000, timer_coalesce=True, seed=1)
+            from XRPLib.encoded_motor import EncodedMotor
+            from XRPLib.imu import IMU
+
+            imu = IMU(use_fifo=use_fifo)
+            imu.calibrate(0.5)
+            left = EncodedMotor.get_default_encoded_motor(1)
+            right = EncodedMotor.get_default_encoded_motor(2)
+            timer = _track_pose(sim)
+            _, _, heading0 = sim.drive.pose()
+            imu.reset_yaw()
+            coalesced = sim.counters.get("timer.coalesced", 0)
+            left.set_effort(-0.6)
+            right.set_effort(0.6)
+            time.sleep(5)
+            left.set_effort(0)
+            right.set_effort(0)
+            time.sleep(1)
+            timer.deinit()
+            _, _, heading = sim.drive.pose()
+            error = imu.get_yaw() - (heading - heading0)
+            absorbed = sim.counters.get("timer.coalesced", 0) - coalesced
+            print("%s with up to %2d ms of timer delay: yaw error %7.2f degrees of %.0f, %d ticks absorbed" % (
+                "FIFO     " if use_fifo else "Registers", jitter_ms, error, heading - heading0, absorbed))
+            if jitter_ms and not use_fifo:
+                _check(absorbed > 0, "no ticks were absorbed; the benchmark isn't loading the timer")
+            # Worst is 0.45 degrees of 627, reading the registers with 1063 ticks absorbed
+            _check(abs(error) < 1, "yaw ended %.2f degrees off with up to %d ms of timer delay" % (error, jitter_ms))
+
+    from .clock import SimulationComplete
+    # Half a second before both ticks_ms() and ticks_us() wrap
+    sim = _install(start_us=(1 << 30) * 1000 - 500000)
+    from XRPLib.imu import IMU
+    imu = IMU()
+    begin = sim.clock.elapsed_us()
+    sim.clock.set_deadline(10)
+    took = None
+    try:
+        imu.calibrate(0.5)
+        took = (sim.clock.elapsed_us() - begin) / 1e6
+        print("calibrate(0.5) across the ticks wrap took %.3f s" % took)
+    except SimulationComplete:
+        print("calibrate(0.5) across the ticks wrap hadn't finished after 10 s")
+    sim.clock.set_deadline(None)
+    # 0.605 s, with the sensor settling first
+    _check(took is not None and took < 1, "calibrate(0.5) didn't finish promptly across the ticks wrap")
+
+
+BENCHMARKS = (
+    benchmark_http_requests,
+    benchmark_sse_events,
+    benchmark_pump_duty_cycle,
+    benchmark_soil_false_triggers,
+    benchmark_watering_latency,
+    benchmark_boot_to_first_sample,
+    benchmark_moisture_history,
+    benchmark_simulation,
+    benchmark_control_scheduler,
+    benchmark_encoder_fifo,
+    benchmark_encoder_bank,
+    benchmark_speed_jitter,
+    benchmark_fixed_point_pid,
+    benchmark_feedforward_settling,
+    benchmark_motion_profiles,
+    benchmark_drive_http_latency,
+    benchmark_odometry,
+    benchmark_path_following,
+    benchmark_imu_fifo,
+    benchmark_imu_read,
+    benchmark_imu_fusion,
+    benchmark_imu_calibration,
+    benchmark_imu_load,
+)
+
+
+def main():
+    failed = []
+    for benchmark in BENCHMARKS:
+        print("==", benchmark.__name__)
+        try:
+            benchmark()
+        except AssertionError as e:
+            print("FAILED:", e)
+            failed.append(benchmark.__name__)
+    if failed:
+        print("%d of %d benchmarks failed: %s" % (len(failed), len(BENCHMARKS), ", ".join(failed)))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
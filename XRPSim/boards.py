@@ -0,0 +1,68 @@
+"""
+Pin maps for the simulated XRP controllers.
+XRPLib only refers to pins by name, so the GPIO numbers here just need to be distinct;
+they follow the real boards where main.py relies on a number (e.g. the user button on 36).
+"""
+
+XRP_RP2350 = {
+    "machine": "SparkFun XRP Controller with RP2350B",
+    "dual_pwm_motors": True,
+    "pins": {
+        "MOTOR_L_ENCODER_A": 4,  "MOTOR_L_ENCODER_B": 5,
+        "MOTOR_L_IN_1": 6,       "MOTOR_L_IN_2": 7,
+        "MOTOR_R_ENCODER_A": 12, "MOTOR_R_ENCODER_B": 13,
+        "MOTOR_R_IN_1": 14,      "MOTOR_R_IN_2": 15,
+        "MOTOR_3_ENCODER_A": 0,  "MOTOR_3_ENCODER_B": 1,
+        "MOTOR_3_IN_1": 2,       "MOTOR_3_IN_2": 3,
+        "MOTOR_4_ENCODER_A": 8,  "MOTOR_4_ENCODER_B": 9,
+        "MOTOR_4_IN_1": 10,      "MOTOR_4_IN_2": 11,
+        "SERVO_1": 16, "SERVO_2": 17, "SERVO_3": 33, "SERVO_4": 32,
+        "RANGE_TRIGGER": 20, "RANGE_ECHO": 21,
+        "I2C_SDA_0": 22, "I2C_SCL_0": 23,
+        "I2C_SDA_1": 38, "I2C_SCL_1": 39,
+        "BOARD_USER_BUTTON": 36,
+        "BOARD_NEOPIXEL": 37,
+        "LINE_L": 44, "LINE_R": 45,
+        "BOARD_VIN_MEASURE": 46,
+        "LED": 25,
+    },
+    # ADC readings (0-65535) of pins with nothing else driving them
+    "adc_defaults": {"BOARD_VIN_MEASURE": 45000},
+}
+
+XRP_RP2040 = {
+    "machine": "SparkFun XRP Controller (Beta) with RP2040",
+    "dual_pwm_motors": False,
+    "pins": {
+        "MOTOR_L_ENCODER_A": 4,  "MOTOR_L_ENCODER_B": 5,
+        "MOTOR_L_IN_1": 6,       "MOTOR_L_IN_2": 7,
+        "MOTOR_R_ENCODER_A": 12, "MOTOR_R_ENCODER_B": 13,
+        "MOTOR_R_IN_1": 14,      "MOTOR_R_IN_2": 15,
+        "MOTOR_3_ENCODER_A": 0,  "MOTOR_3_ENCODER_B": 1,
+        "MOTOR_3_IN_1": 2,       "MOTOR_3_IN_2": 3,
+        "MOTOR_4_ENCODER_A": 8,  "MOTOR_4_ENCODER_B": 9,
+        "MOTOR_4_IN_1": 10,      "MOTOR_4_IN_2": 11,
+        "SERVO_1": 16, "SERVO_2": 17,
+        "I2C_SDA_1": 18, "I2C_SCL_1": 19,
+        "RANGE_TRIGGER": 20, "RANGE_ECHO": 21,
+        "BOARD_USER_BUTTON": 22,
+        "LINE_L": 26, "LINE_R": 27,
+        "BOARD_VIN_MEASURE": 28,
+        "LED": 25,
+    },
+    "adc_defaults": {"BOARD_VIN_MEASURE": 45000},
+}
+
+BOARDS = {
+    "rp2350": XRP_RP2350,
+    "rp2040": XRP_RP2040,
+}
+
+# Motor name prefix -> which side of the robot it drives (None for the auxiliary motors).
+# The left motor is mounted mirrored, matching flip_dir=True in EncodedMotor.
+MOTORS = (
+    ("MOTOR_L", "left"),
+    ("MOTOR_R", "right"),
+    ("MOTOR_3", None),
+    ("MOTOR_4", None),
+)
@@ -0,0 +1,138 @@
+import heapq
+
+# MicroPython's ticks_* values wrap at 2**30
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD >> 1
+
+
+class SimulationComplete(BaseException):
+    """
+    Raised out of whatever the simulated program is doing when the clock reaches its deadline.
+    It derives from BaseException so the program's own ``except Exception`` handlers don't swallow it.
+    """
+    pass
+
+
+def ticks_add(ticks: int, delta: int) -> int:
+    return (ticks + delta) & TICKS_MAX
+
+def ticks_diff(ticks1: int, ticks2: int) -> int:
+    return ((ticks1 - ticks2 + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+class VirtualClock:
+
+    def __init__(self, start_us: int = 0, tick_cost_us: int = 1):
+        """
+        Simulated time, in integer microseconds. Time only moves when the program sleeps,
+        reads the ticks counters, or an event loop waits; timer callbacks due along the way
+        are run in order at their scheduled time, the way soft timers interrupt a running program.
+
+        :param start_us: The initial time; use a value just below a multiple of 2**30 ms to test ticks wrap-around
+        :type start_us: int
+        :param tick_cost_us: How far each ticks_ms()/ticks_us() read moves the clock, so busy-wait loops terminate
+        :type tick_cost_us: int
+        """
+        self.now_us = start_us
+        self.start_us = start_us
+        self.tick_cost_us = tick_cost_us
+        self.deadline_us = None
+
+        self._timers = []   # heap of (due_us, seq, timer, generation)
+        self._seq = 0
+        self._in_callback = False
+        # Cleared by machine.disable_irq() to hold back timer callbacks
+        self.irq_enabled = True
+
+    def elapsed_us(self) -> int:
+        """
+        :return: The simulated time since the clock was created, in microseconds
+        :rtype: int
+        """
+        return self.now_us - self.start_us
+
+    def seconds(self) -> float:
+        return self.now_us / 1_000_000
+
+    def set_deadline(self, seconds: float):
+        """
+        Stop the simulation with SimulationComplete once this much simulated time has passed.
+
+        :param seconds: The simulated run time from now, or None for no deadline
+        :type seconds: float
+        """
+        if seconds is None:
+            self.deadline_us = None
+        else:
+            self.deadline_us = self.now_us + int(seconds * 1_000_000)
+
+    def schedule(self, timer, due_us: int, generation: int):
+        """
+        Queue a timer to fire at due_us. Timers are rescheduled by the caller, and a timer
+        whose generation no longer matches its entry (deinit/re-init) is skipped.
+        """
+        self._seq += 1
+        heapq.heappush(self._timers, (due_us, self._seq, timer, generation))
+
+    def advance(self, us: int):
+        self.advance_to(self.now_us + max(0, int(us)))
+
+    def advance_to(self, target_us: int):
+        """
+        Move the clock forward to target_us, running the timer callbacks that come due on the way.
+        """
+        if self._in_callback or not self.irq_enabled:
+            # A callback that reads the ticks or sleeps just moves time; the outer advance, or
+            # enable_irq(), fires anything that comes due
+            self.now_us = max(self.now_us, target_us)
+            return
+        while self._timers and self._timers[0][0] <= target_us:
+            self.now_us = max(self.now_us, self._timers[0][0])
+            self._check_deadline()
+            due_us, _, timer, generation = heapq.heappop(self._timers)
+            if generation != timer._generation:
+                continue
+            self._in_callback = True
+            try:
+                timer._fire(due_us)
+            finally:
+                self._in_callback = False
+        self.now_us = max(self.now_us, target_us)
+        self._check_deadline()
+
+    def next_due_us(self):
+        """
+        :return: When the next timer fires, or None if no timers are running
+        """
+        while self._timers and self._timers[0][3] != self._timers[0][2]._generation:
+            heapq.heappop(self._timers)
+        return self._timers[0][0] if self._timers else None
+
+    def _check_deadline(self):
+        if self.deadline_us is not None and self.now_us >= self.deadline_us:
+            # Only raise once, so cleanup code that sleeps can still run
+            self.deadline_us = None
+            raise SimulationComplete("simulated time limit reached")
+
+    # --- The MicroPython time module, backed by this clock ---
+
+    def ticks_us(self) -> int:
+        self.advance(self.tick_cost_us)
+        return self.now_us & TICKS_MAX
+
+    def ticks_ms(self) -> int:
+        self.advance(self.tick_cost_us)
+        return (self.now_us // 1000) & TICKS_MAX
+
+    def ticks_cpu(self) -> int:
+        return self.ticks_us()
+
+    def sleep(self, seconds: float):
+        self.advance(int(seconds * 1_000_000))
+
+    def sleep_ms(self, ms: int):
+        self.advance(int(ms * 1000))
+
+    def sleep_us(self, us: int):
+        self.advance(int(us))
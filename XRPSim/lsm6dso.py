@@ -0,0 +1,221 @@
+from collections import deque
+
+FIFO_CTRL1 = 0x07
+FIFO_CTRL2 = 0x08
+FIFO_CTRL3 = 0x09
+FIFO_CTRL4 = 0x0A
+WHO_AM_I = 0x0F
+CTRL1_XL = 0x10
+CTRL2_G = 0x11
+CTRL3_C = 0x12
+CTRL10_C = 0x19
+OUT_TEMP_L = 0x20
+OUTZ_H_A = 0x2D
+FIFO_STATUS1 = 0x3A
+FIFO_STATUS2 = 0x3B
+FIFO_DATA_OUT_TAG = 0x78
+FIFO_DATA_OUT_Z_H = 0x7E
+
+# FS_XL field -> full scale in g, FS_G field (including FS_125) -> full scale in dps
+_ACCEL_FS = {0: 2, 1: 16, 2: 4, 3: 8}
+_GYRO_FS = {0: 250, 1: 125, 2: 500, 4: 1000, 6: 2000}
+# ODR and BDR fields -> Hz
+_RATES = {1: 12.5, 2: 26, 3: 52, 4: 104, 5: 208, 6: 416, 7: 833, 8: 1666, 9: 3333, 10: 6667}
+# DEC_TS_BATCH field -> timestamp words per fastest-batched sample
+_TS_DECIMATION = {1: 1, 2: 8, 3: 32}
+
+TAG_GYRO = 0x01
+TAG_ACCEL = 0x02
+TAG_TIMESTAMP = 0x04
+FIFO_MODE_BYPASS = 0
+TIMESTAMP_US_PER_LSB = 25
+# The FIFO's 3 kbytes hold this many tagged words
+FIFO_WORDS = 438
+
+
+class LSM6DSO:
+
+    def __init__(self, sim, gyro_dps=(0.0, 0.0, 0.0), accel_g=(0.0, 0.0, 1.0), temperature=25.0):
+        """
+        A register-level model of the LSM6DSO accelerometer/gyroscope, as seen over I2C.
+        The output registers are filled from the signals below at the moment they are read,
+        scaled by whatever full-scale ranges the driver has configured.
+        Signals can be constants or functions of the simulated time in seconds.
+
+        The FIFO is modelled too: once FIFO_CTRL3/4 set batch data rates and a FIFO mode, gyro and
+        accelerometer samples (and, with CTRL10_C's TIMESTAMP_EN, timestamp words) are queued at their
+        own rates on the simulated clock, as 7-byte tagged words read from FIFO_DATA_OUT_TAG. A burst
+        read past FIFO_DATA_OUT_Z_H wraps back to the next word's tag, like the real part. When the
+        FIFO is full, the oldest words are dropped and the overrun is flagged in FIFO_STATUS2.
+
+        :param sim: The simulation providing the clock and the drive model
+        :type sim: Simulation
+        :param gyro_dps: Angular rate about x, y, z in degrees per second; the drive model's yaw rate is added to z
+        :type gyro_dps: tuple<float> or function
+        :param accel_g: Acceleration along x, y, z in g
+        :type accel_g: tuple<float> or function
+        :param temperature: Die temperature in degrees Celsius
+        :type temperature: float or function
+        """
+        self.sim = sim
+        self.gyro_dps = gyro_dps
+        self.accel_g = accel_g
+        self.temperature = temperature
+        self.drive = None
+        self.regs = bytearray(0x80)
+        self.fifo = deque()
+        # Counts of what the FIFO has been given and lost, to check drivers against
+        self.fifo_samples = {TAG_GYRO: 0, TAG_ACCEL: 0, TAG_TIMESTAMP: 0}
+        self.fifo_dropped = 0
+        # The FIFO batches samples from the simulated clock, like a machine.Timer
+        self._generation = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Restore the power-on register values.
+        """
+        for i in range(len(self.regs)):
+            self.regs[i] = 0
+        self.regs[WHO_AM_I] = 0x6C
+        self.regs[CTRL3_C] = 0x04   # IF_INC
+        self._word_offset = 0
+        self._overrun = False
+        self._configure_fifo()
+
+    def _gyro_raw(self, t):
+        gyro = list(self.sim.value(self.gyro_dps, t))
+        if self.drive is not None:
+            gyro[2] += self.drive.yaw_rate()
+        g_fs = _GYRO_FS.get((self.regs[CTRL2_G] >> 1) & 0x7, 250)
+        mdps_per_lsb = 4.375 * g_fs / 125
+        return [self._clamp16(gyro[axis] * 1000 / mdps_per_lsb) for axis in range(3)]
+
+    def _accel_raw(self, t):
+        accel = self.sim.value(self.accel_g, t)
+        a_fs = _ACCEL_FS[(self.regs[CTRL1_XL] >> 2) & 0x3]
+        mg_per_lsb = 0.061 * a_fs / 2
+        return [self._clamp16(accel[axis] * 1000 / mg_per_lsb) for axis in range(3)]
+
+    def _sample(self):
+        t = self.sim.clock.seconds()
+        temperature = self.sim.value(self.temperature, t)
+        self._put16(OUT_TEMP_L, self._clamp16((temperature - 25) * 256))
+        gyro = self._gyro_raw(t)
+        accel = self._accel_raw(t)
+        for axis in range(3):
+            if self.regs[CTRL2_G] >> 4:
+                self._put16(0x22 + 2 * axis, gyro[axis])
+            if self.regs[CTRL1_XL] >> 4:
+                self._put16(0x28 + 2 * axis, accel[axis])
+
+    @staticmethod
+    def _clamp16(value):
+        return max(-32768, min(32767, round(value))) & 0xFFFF
+
+    def _put16(self, reg, raw):
+        self.regs[reg] = raw & 0xFF
+        self.regs[reg + 1] = raw >> 8
+
+    # --- FIFO ---
+
+    def _configure_fifo(self):
+        # Restart batching from the current FIFO_CTRL3/4 and CTRL10_C settings
+        self._generation += 1
+        mode = self.regs[FIFO_CTRL4] & 0x7
+        if mode == FIFO_MODE_BYPASS:
+            self.fifo.clear()
+            self._word_offset = 0
+            self._overrun = False
+            return
+        self._gyro_hz = _RATES.get(self.regs[FIFO_CTRL3] >> 4, 0)
+        self._accel_hz = _RATES.get(self.regs[FIFO_CTRL3] & 0xF, 0)
+        fastest = max(self._gyro_hz, self._accel_hz)
+        if fastest == 0:
+            return
+        self._period_us = 1_000_000 / fastest
+        self._gyro_every = round(fastest / self._gyro_hz) if self._gyro_hz else 0
+        self._accel_every = round(fastest / self._accel_hz) if self._accel_hz else 0
+        self._ts_every = _TS_DECIMATION.get(self.regs[FIFO_CTRL4] >> 6, 0) if self.regs[CTRL10_C] & 0x20 else 0
+        self._batch = 0
+        self._next_us = self.sim.clock.now_us + self._period_us
+        self.sim.clock.schedule(self, round(self._next_us), self._generation)
+
+    def _fire(self, due_us: int):
+        # A batch data rate tick: queue the samples due now
+        t = due_us / 1_000_000
+        if self._ts_every and self._batch % self._ts_every == 0:
+            ts = (due_us // TIMESTAMP_US_PER_LSB) & 0xFFFFFFFF
+            self._push(TAG_TIMESTAMP, ts.to_bytes(4, "little") + bytes(2))
+        if self._gyro_every and self._batch % self._gyro_every == 0:
+            self._push(TAG_GYRO, b"".join(v.to_bytes(2, "little") for v in self._gyro_raw(t)))
+        if self._accel_every and self._batch % self._accel_every == 0:
+            self._push(TAG_ACCEL, b"".join(v.to_bytes(2, "little") for v in self._accel_raw(t)))
+        self._batch += 1
+        self._next_us += self._period_us
+        self.sim.clock.schedule(self, round(self._next_us), self._generation)
+
+    def _push(self, tag, data):
+        self.fifo_samples[tag] += 1
+        if len(self.fifo) >= FIFO_WORDS:
+            self.fifo.popleft()
+            self._word_offset = 0
+            self.fifo_dropped += 1
+            self._overrun = True
+        # TAG_CNT and the parity bit aren't modelled
+        self.fifo.append(bytes([tag << 3]) + data)
+
+    def _fifo_status(self):
+        words = len(self.fifo)
+        watermark = self.regs[FIFO_CTRL1] | (self.regs[FIFO_CTRL2] & 0x1) << 8
+        status2 = (words >> 8) & 0x3
+        if watermark and words >= watermark:
+            status2 |= 0x80   # FIFO_WTM_IA
+        if self._overrun:
+            status2 |= 0x40 | 0x08   # FIFO_OVR_IA, FIFO_OVR_LATCHED
+            self._overrun = False
+        return bytes([words & 0xFF, status2])
+
+    def _read_fifo_byte(self) -> int:
+        if not self.fifo:
+            return 0
+        word = self.fifo[0]
+        value = word[self._word_offset]
+        self._word_offset += 1
+        if self._word_offset == len(word):
+            self.fifo.popleft()
+            self._word_offset = 0
+        return value
+
+    # --- I2C ---
+
+    def read(self, reg: int, n: int) -> bytes:
+        """
+        Handle an I2C register read of n bytes starting at reg.
+        """
+        if FIFO_DATA_OUT_TAG <= reg <= FIFO_DATA_OUT_Z_H:
+            # Words are popped as they're read, whatever the register pointer
+            self._word_offset = reg - FIFO_DATA_OUT_TAG
+            return bytes(self._read_fifo_byte() for _ in range(n))
+        if reg <= OUTZ_H_A and reg + n > OUT_TEMP_L:
+            self._sample()
+        if reg <= FIFO_STATUS2 and reg + n > FIFO_STATUS1:
+            self.regs[FIFO_STATUS1:FIFO_STATUS2 + 1] = self._fifo_status()
+        if self.regs[CTRL3_C] & 0x04:
+            return bytes(self.regs[(reg + i) & 0x7F] for i in range(n))
+        return bytes(self.regs[reg] for _ in range(n))
+
+    def write(self, reg: int, data: bytes):
+        """
+        Handle an I2C register write starting at reg.
+        """
+        for i, b in enumerate(data):
+            r = (reg + i) & 0x7F if self.regs[CTRL3_C] & 0x04 else reg
+            if r == CTRL3_C and b & 0x81:
+                # BOOT / SW_RESET: the reset completes instantly and both bits self-clear
+                self.reset()
+                continue
+            if r != WHO_AM_I:
+                self.regs[r] = b
+            if r in (FIFO_CTRL3, FIFO_CTRL4, CTRL10_C):
+                self._configure_fifo()
@@ -0,0 +1,170 @@
+import math
+
+# Encoder counts per output shaft revolution, as in XRPLib.encoder.Encoder.resolution
+COUNTS_PER_REV = 12 * (30/14) * (28/16) * (36/9) * (26/8)
+
+
+class MotorModel:
+
+    def __init__(self, sim, name: str, in1: int, in2: int, dual_pwm: bool,
+                 free_rpm: float = 90, tau: float = 0.05, brake_tau: float = 0.01, deadband: float = 0.05):
+        """
+        A geared DC motor with a quadrature encoder. The shaft speed follows the applied effort
+        as a first-order lag, and position is integrated exactly between effort changes, so
+        the model only does work when the program drives or reads the motor.
+        Positive effort turns the shaft in the direction that counts the encoder up.
+
+        :param sim: The simulation the motor's drive pins live in
+        :type sim: Simulation
+        :param name: The pin name prefix, e.g. "MOTOR_L"
+        :type name: str
+        :param in1: The GPIO of the IN_1 drive pin
+        :type in1: int
+        :param in2: The GPIO of the IN_2 drive pin
+        :type in2: int
+        :param dual_pwm: True if both pins are PWM (DualPWMMotor), False for direction + PWM (SinglePWMMotor)
+        :type dual_pwm: bool
+        :param free_rpm: The output shaft speed at full effort, in rpm
+        :type free_rpm: float
+        :param tau: The time constant of the speed response, in seconds
+        :type tau: float
+        :param brake_tau: The time constant when braking, in seconds
+        :type brake_tau: float
+        :param deadband: Efforts smaller than this don't overcome friction
+        :type deadband: float
+        """
+        self.sim = sim
+        self.name = name
+        self.in1 = in1
+        self.in2 = in2
+        self.dual_pwm = dual_pwm
+        self.free_rps = free_rpm / 60
+        self.tau = tau
+        self.brake_tau = brake_tau
+        self.deadband = deadband
+
+        self.effort = 0.0
+        self.braking = False
+        self.speed_rps = 0.0
+        self.position = 0.0     # output shaft revolutions
+        self._t_us = sim.clock.now_us
+
+    def _advance(self):
+        now = self.sim.clock.now_us
+        dt = (now - self._t_us) / 1_000_000
+        self._t_us = now
+        if dt <= 0:
+            return
+        if self.braking or abs(self.effort) < self.deadband:
+            target = 0.0
+        else:
+            target = self.effort * self.free_rps
+        tau = self.brake_tau if self.braking else self.tau
+        decay = math.exp(-dt / tau)
+        self.position += target * dt + (self.speed_rps - target) * tau * (1 - decay)
+        self.speed_rps = target + (self.speed_rps - target) * decay
+
+    def drive_changed(self):
+        """
+        Re-read the drive pins; called whenever one of them is written.
+        """
+        self._advance()
+        if self.dual_pwm:
+            d1 = self.sim.pwm_duty.get(self.in1, 0)
+            d2 = self.sim.pwm_duty.get(self.in2, 0)
+            self.braking = d1 >= 65535 and d2 >= 65535
+            self.effort = (d2 - d1) / 65535
+        else:
+            duty = self.sim.pwm_duty.get(self.in2, 0)
+            self.braking = duty >= 65535
+            direction = self.sim.output_level(self.in1)
+            self.effort = (-1 if direction else 1) * min(duty, 65534) / 65534
+
+    def counts(self) -> int:
+        """
+        :return: The encoder count, as the PIO counter would hold it
+        :rtype: int
+        """
+        self._advance()
+        return math.floor(self.position * COUNTS_PER_REV)
+
+    def speed(self) -> float:
+        """
+        :return: The output shaft speed, in revolutions per second
+        :rtype: float
+        """
+        self._advance()
+        return self.speed_rps
+
+
+class DriveModel:
+
+    def __init__(self, left: MotorModel, right: MotorModel, wheel_diam: float = 6.0, track_width: float = 15.5):
+        """
+        Turns the two drive motors into robot motion. The left motor is mounted mirrored,
+        so it drives the robot forward when its shaft turns backward.
+
+        :param wheel_diam: The wheel diameter, in cm
+        :type wheel_diam: float
+        :param track_width: The distance between the wheels, in cm
+        :type track_width: float
+        """
+        self.left = left
+        self.right = right
+        self.wheel_diam = wheel_diam
+        self.track_width = track_width
+        # The pose, integrated from the wheels' travel each time pose() is called
+        self.x = 0.0
+        self.y = 0.0
+        self._heading = 0.0
+        self._travel = self.wheel_travel()
+
+    def wheel_travel(self):
+        """
+        :return: How far the left and right wheels have rolled forward, in cm
+        :rtype: tuple<float>
+        """
+        circumference = math.pi * self.wheel_diam
+        self.left._advance()
+        self.right._advance()
+        return -self.left.position * circumference, self.right.position * circumference
+
+    def pose(self):
+        """
+        The robot's true pose, integrated as a constant-curvature arc since the last call. Call it at
+        least every few tens of milliseconds while the robot moves (e.g. from a Timer) to track curved paths.
+
+        :return: x and y in cm (starting at the origin, facing +x), and the heading in degrees (counterclockwise positive)
+        :rtype: tuple<float>
+        """
+        left, right = self.wheel_travel()
+        d_left = left - self._travel[0]
+        d_right = right - self._travel[1]
+        self._travel = (left, right)
+        d_heading = (d_right - d_left) / self.track_width
+        distance = (d_left + d_right) / 2
+        if abs(d_heading) < 1e-9:
+            chord = distance
+        else:
+            chord = 2 * distance / d_heading * math.sin(d_heading / 2)
+        middle = self._heading + d_heading / 2
+        self.x += chord * math.cos(middle)
+        self.y += chord * math.sin(middle)
+        self._heading += d_heading
+        return self.x, self.y, math.degrees(self._heading)
+
+    def wheel_speeds(self):
+        """
+        :return: The forward speed of the left and right wheels, in cm/s
+        :rtype: tuple<float>
+        """
+        circumference = math.pi * self.wheel_diam
+        return -self.left.speed() * circumference, self.right.speed() * circumference
+
+    def yaw_rate(self) -> float:
+        """
+        :return: The robot's rate of turn, in degrees per second (counterclockwise positive)
+        :rtype: float
+        """
+        left, right = self.wheel_speeds()
+        return math.degrees((right - left) / self.track_width)
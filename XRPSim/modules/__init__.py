@@ -0,0 +1,4 @@
+"""
+Stand-ins for the MicroPython-only modules XRPLib and main.py import.
+XRPSim.install() registers them in sys.modules under their MicroPython names.
+"""
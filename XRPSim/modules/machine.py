@@ -0,0 +1,272 @@
+"""
+Simulated MicroPython machine module.
+"""
+import errno
+
+from ..simulation import current
+
+
+class Pin:
+
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    ALT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    # Replaced with the board's named pins by XRPSim.install()
+    board = type("board", (), {})
+
+    def __init__(self, id, mode=-1, pull=-1, *, value=None, **kwargs):
+        self.id = current().pin_id(id)
+        self.init(mode, pull, value=value)
+
+    def init(self, mode=-1, pull=-1, *, value=None, **kwargs):
+        sim = current()
+        state = sim.pin_state(self.id)
+        if mode != -1:
+            state.mode = mode
+        if pull != -1:
+            state.pull = pull
+        if value is not None:
+            sim.write_pin(self.id, value)
+
+    def value(self, x=None):
+        sim = current()
+        if x is None:
+            return sim.input_level(self.id)
+        sim.write_pin(self.id, x)
+
+    def __call__(self, x=None):
+        return self.value(x)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def high(self):
+        self.value(1)
+
+    def low(self):
+        self.value(0)
+
+    def toggle(self):
+        sim = current()
+        sim.write_pin(self.id, not sim.output_level(self.id))
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        # Edges aren't simulated; the handler is kept so programs that register one still run
+        self._irq_handler = handler
+
+    def __repr__(self):
+        return "Pin(GPIO%d)" % self.id
+
+
+class ADC:
+
+    def __init__(self, pin):
+        sim = current()
+        self._key = sim.pin_id(pin)
+
+    def read_u16(self) -> int:
+        sim = current()
+        sim.count("adc.read_u16")
+        return sim.read_adc(self._key)
+
+
+class PWM:
+
+    def __init__(self, pin, freq=None, duty_u16=None, duty_ns=None, invert=False):
+        self._pin_id = pin.id if isinstance(pin, Pin) else current().pin_id(pin)
+        self._freq = 1000
+        self._duty = 0
+        if freq is not None:
+            self.freq(freq)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+        if duty_ns is not None:
+            self.duty_ns(duty_ns)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        value = int(value)
+        if value < 0 or value > 65535:
+            raise ValueError("duty_u16 must be from 0 to 65535")
+        self._duty = value
+        current().write_pwm(self._pin_id, value)
+
+    def duty_ns(self, value=None):
+        period_ns = 1_000_000_000 // self._freq
+        if value is None:
+            return self._duty * period_ns // 65535
+        self.duty_u16(min(65535, int(value) * 65535 // period_ns))
+
+    def deinit(self):
+        self.duty_u16(0)
+
+
+class Timer:
+
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self._generation = 0
+        self._period_us = 0
+        self._mode = Timer.PERIODIC
+        self._callback = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, *, mode=PERIODIC, freq=-1, period=-1, tick_hz=1000, callback=None):
+        clock = current().clock
+        if freq > 0:
+            period_us = round(1_000_000 / freq)
+        elif period > 0:
+            period_us = round(period * 1_000_000 / tick_hz)
+        else:
+            raise ValueError("period or freq must be given")
+        self._generation += 1
+        self._period_us = max(1, period_us)
+        self._mode = mode
+        self._callback = callback
+        self._nominal_us = clock.now_us + self._period_us
+        clock.schedule(self, self._nominal_us + self._jitter(), self._generation)
+
+    def _jitter(self) -> int:
+        sim = current()
+        return sim.random.randint(0, sim.timer_jitter_us) if sim.timer_jitter_us else 0
+
+    def deinit(self):
+        self._generation += 1
+
+    def _fire(self, due_us: int):
+        sim = current()
+        if self._mode == Timer.PERIODIC:
+            # Reschedule first so a callback can deinit() or re-init() the timer. Jitter delays
+            # each callback but not the ones after it, which stay on the timer's own schedule
+            self._nominal_us += self._period_us
+            if sim.timer_coalesce:
+                while self._nominal_us <= due_us:
+                    # This tick came due while the callback was pending, so it's absorbed into it
+                    self._nominal_us += self._period_us
+                    sim.count("timer.coalesced")
+            sim.clock.schedule(self, self._nominal_us + self._jitter(), self._generation)
+        else:
+            self._generation += 1
+        sim.count("timer.callback")
+        if self._callback is not None:
+            self._callback(self)
+
+
+class I2C:
+
+    def __init__(self, id=0, *, scl=None, sda=None, freq=400000, timeout=50000):
+        self.id = id
+        self.freq = freq
+
+    def _device(self, addr):
+        device = current().i2c_devices.get(self.id, {}).get(addr)
+        if device is None:
+            raise OSError(errno.EIO, "no I2C device at 0x%02x" % addr)
+        return device
+
+    def scan(self) -> list:
+        return sorted(current().i2c_devices.get(self.id, {}))
+
+    def readfrom_mem_into(self, addr, memaddr, buf, *, addrsize=8):
+        sim = current()
+        sim.count("i2c.transactions")
+        sim.count("i2c.bytes", memoryview(buf).nbytes)
+        # Any writable buffer, e.g. an array('h') to decode int16 registers in place
+        view = memoryview(buf).cast("B")
+        view[:] = self._device(addr).read(memaddr, len(view))
+
+    def readfrom_mem(self, addr, memaddr, nbytes, *, addrsize=8) -> bytes:
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf)
+        return bytes(buf)
+
+    def writeto_mem(self, addr, memaddr, buf, *, addrsize=8):
+        sim = current()
+        sim.count("i2c.transactions")
+        sim.count("i2c.bytes", len(buf))
+        self._device(addr).write(memaddr, bytes(buf))
+
+    def writeto(self, addr, buf, stop=True) -> int:
+        # A bare write sets the register pointer (first byte), followed by data
+        if len(buf) > 1:
+            self.writeto_mem(addr, buf[0], buf[1:])
+        else:
+            self._device(addr)
+        return len(buf)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        self.readfrom_mem_into(addr, 0, buf)
+
+    def readfrom(self, addr, nbytes, stop=True) -> bytes:
+        return self.readfrom_mem(addr, 0, nbytes)
+
+
+def disable_irq():
+    """
+    Holds back timer callbacks until enable_irq(), so code between the two runs without being interrupted.
+    """
+    clock = current().clock
+    state = clock.irq_enabled
+    clock.irq_enabled = False
+    return state
+
+def enable_irq(state):
+    clock = current().clock
+    clock.irq_enabled = state
+    if state:
+        # Run the callbacks that came due while they were held back
+        clock.advance(0)
+
+def time_pulse_us(pin, pulse_level, timeout_us=1000000) -> int:
+    """
+    Measures the rangefinder echo: the pulse length for Simulation.range_cm,
+    or -1 if that is out of range (None or beyond the timeout).
+    """
+    sim = current()
+    cm = sim.value(sim.range_cm)
+    if cm is None:
+        sim.clock.advance(timeout_us)
+        return -1
+    pulse = int(cm * 2 * 29.1)
+    if pulse > timeout_us:
+        sim.clock.advance(timeout_us)
+        return -1
+    sim.clock.advance(pulse)
+    return pulse
+
+def unique_id() -> bytes:
+    return b"XRPSIM00"
+
+def freq(hz=None):
+    return 150_000_000
+
+def idle():
+    current().clock.advance(1000)
+
+def lightsleep(time_ms=None):
+    current().clock.sleep_ms(time_ms or 0)
+
+def reset():
+    from ..clock import SimulationComplete
+    raise SimulationComplete("machine.reset()")
+
+def soft_reset():
+    reset()
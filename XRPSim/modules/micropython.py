@@ -0,0 +1,39 @@
+"""
+Simulated MicroPython micropython module.
+"""
+
+
+def const(value):
+    return value
+
+
+def native(fn):
+    return fn
+
+
+def viper(fn):
+    return fn
+
+
+def schedule(fn, arg):
+    fn(arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def opt_level(level=None):
+    return 0
+
+
+def mem_info(verbose=False):
+    pass
+
+
+def heap_lock():
+    pass
+
+
+def heap_unlock():
+    return 0
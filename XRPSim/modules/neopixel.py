@@ -0,0 +1,29 @@
+"""
+Simulated MicroPython neopixel module; the colours written are kept in ``shown``.
+"""
+
+
+class NeoPixel:
+
+    def __init__(self, pin, n, bpp=3, timing=1):
+        self.pin = pin
+        self.n = n
+        self.bpp = bpp
+        self.buf = [(0,) * bpp for _ in range(n)]
+        self.shown = list(self.buf)
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, index, value):
+        self.buf[index] = tuple(value)
+
+    def __getitem__(self, index):
+        return self.buf[index]
+
+    def fill(self, value):
+        for i in range(self.n):
+            self.buf[i] = tuple(value)
+
+    def write(self):
+        self.shown = list(self.buf)
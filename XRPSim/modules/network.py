@@ -0,0 +1,55 @@
+"""
+Simulated MicroPython network module. Interfaces come up immediately and
+report the addresses a Pico W would use; sockets are the host's own.
+"""
+
+STA_IF = 0
+AP_IF = 1
+AUTH_OPEN = 0
+AUTH_WPA_PSK = 2
+AUTH_WPA2_PSK = 3
+AUTH_WPA_WPA2_PSK = 4
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_GOT_IP = 3
+
+
+class WLAN:
+
+    _config = ({}, {})
+    _active = [False, False]
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+
+    def active(self, value=None):
+        if value is None:
+            return WLAN._active[self.interface]
+        WLAN._active[self.interface] = bool(value)
+
+    def config(self, *args, **kwargs):
+        if args:
+            return WLAN._config[self.interface].get(args[0])
+        WLAN._config[self.interface].update(kwargs)
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        WLAN._config[STA_IF]["ssid"] = ssid
+
+    def disconnect(self):
+        WLAN._config[STA_IF].pop("ssid", None)
+
+    def isconnected(self) -> bool:
+        if self.interface == AP_IF:
+            return WLAN._active[AP_IF]
+        return WLAN._active[STA_IF] and "ssid" in WLAN._config[STA_IF]
+
+    def status(self, param=None):
+        return STAT_GOT_IP if self.isconnected() else STAT_IDLE
+
+    def ifconfig(self, config=None):
+        if self.interface == AP_IF:
+            return ("192.168.4.1", "255.255.255.0", "192.168.4.1", "0.0.0.0")
+        return ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+
+    def scan(self) -> list:
+        return []
@@ -0,0 +1,215 @@
+"""
+Simulated MicroPython rp2 module.
+
+PIO programs are assembled into a list of instructions (so size limits are checked) but not
+executed. Instead, a StateMachine attached to a motor's encoder pins behaves like
+XRPLib's quadrature counter program: the X register follows the simulated encoder count.
+Programs that pull from the TX FIFO answer each word put() that differs from X by pushing X;
+programs that don't keep pushing X into the 4-deep RX FIFO. Pushes don't block, so they are
+dropped while the RX FIFO is full.
+"""
+from collections import deque
+
+from ..simulation import current
+
+PIO_INSTRUCTION_MEMORY = 32
+
+
+class PIO:
+
+    IN_LOW = 0
+    IN_HIGH = 1
+    OUT_LOW = 2
+    OUT_HIGH = 3
+    SHIFT_LEFT = 0
+    SHIFT_RIGHT = 1
+    JOIN_NONE = 0
+    JOIN_TX = 1
+    JOIN_RX = 2
+    IRQ_SM0 = 0x100
+    IRQ_SM1 = 0x200
+    IRQ_SM2 = 0x400
+    IRQ_SM3 = 0x800
+
+    def __init__(self, id):
+        self.id = id
+
+    def state_machine(self, id, program=None, *args, **kwargs):
+        sm = StateMachine(self.id * 4 + id)
+        if program is not None:
+            sm.init(program, *args, **kwargs)
+        return sm
+
+
+class PIOASMError(Exception):
+    pass
+
+
+class Instruction:
+
+    def __init__(self, op, args):
+        self.op = op
+        self.args = args
+        self.delay = 0
+        self.sideset = None
+
+    def side(self, value):
+        self.sideset = value
+        return self
+
+    def __getitem__(self, delay):
+        self.delay = delay
+        return self
+
+    def __repr__(self):
+        return "%s(%s)" % (self.op, ", ".join(repr(a) for a in self.args))
+
+
+class _Operand:
+
+    def __init__(self, name, inner=None):
+        self.name = name
+        self.inner = inner
+
+    def __repr__(self):
+        if self.inner is not None:
+            return "%s(%r)" % (self.name, self.inner)
+        return self.name
+
+
+class Program:
+
+    def __init__(self, name, instructions, labels, options):
+        self.name = name
+        self.instructions = instructions
+        self.labels = labels
+        self.options = options
+
+    def ops(self):
+        """
+        :return: The instruction names in program order, e.g. ["jmp", "mov", "push", ...]
+        :rtype: list<str>
+        """
+        return [i.op for i in self.instructions]
+
+
+def asm_pio(**options):
+    """
+    Assemble a PIO program written with the MicroPython PIO DSL into a Program.
+    """
+    def assemble(fn):
+        instructions = []
+        labels = {}
+
+        def emitter(op):
+            def emit(*args):
+                instruction = Instruction(op, args)
+                instructions.append(instruction)
+                return instruction
+            return emit
+
+        def label(name):
+            labels[name] = len(instructions)
+
+        def marker(name):
+            return lambda inner: _Operand(name, inner)
+
+        env = {"__builtins__": __builtins__, "label": label,
+               "wrap_target": lambda: labels.__setitem__("wrap_target", len(instructions)),
+               "wrap": lambda: labels.__setitem__("wrap", len(instructions)),
+               "invert": marker("invert"), "reverse": marker("reverse"),
+               "rel": marker("rel")}
+        for op in ("jmp", "wait", "in_", "out", "push", "pull", "mov", "irq", "set", "nop"):
+            env[op] = emitter(op)
+        for name in ("x", "y", "osr", "isr", "pins", "pindirs", "pc", "null", "status", "exec",
+                     "gpio", "pin", "block", "noblock", "iffull", "ifempty", "clear",
+                     "not_x", "x_dec", "not_y", "y_dec", "x_not_y", "not_osre"):
+            env[name] = _Operand(name)
+        type(fn)(fn.__code__, env)()
+
+        if len(instructions) > PIO_INSTRUCTION_MEMORY:
+            raise PIOASMError("%s: %d instructions, PIO memory holds %d"
+                              % (fn.__name__, len(instructions), PIO_INSTRUCTION_MEMORY))
+        for instruction in instructions:
+            if instruction.op == "jmp" and isinstance(instruction.args[-1], str) \
+                    and instruction.args[-1] not in labels:
+                raise PIOASMError("unknown label " + instruction.args[-1])
+        return Program(fn.__name__, instructions, labels, options)
+    return assemble
+
+
+class StateMachine:
+
+    FIFO_DEPTH = 4
+
+    def __init__(self, id, program=None, *args, **kwargs):
+        self.id = id
+        self.program = None
+        self._motor = None
+        self._active = False
+        self._x_offset = 0
+        self._on_request = False
+        self._rx = deque()
+        if program is not None:
+            self.init(program, *args, **kwargs)
+
+    def init(self, program, freq=-1, *, in_base=None, **kwargs):
+        sim = current()
+        self.program = program
+        self._on_request = "pull" in program.ops()
+        self._motor = sim.encoder_motor(sim.pin_id(in_base)) if in_base is not None else None
+        self._rx.clear()
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+
+    def restart(self):
+        self._rx.clear()
+
+    def _x(self) -> int:
+        counts = self._motor.counts() if self._motor is not None else 0
+        return (counts - self._x_offset) & 0xFFFFFFFF
+
+    def _run(self):
+        # The program outruns the CPU, so by the time we look, every free FIFO slot has been filled
+        if self._active and not self._on_request:
+            while len(self._rx) < self.FIFO_DEPTH:
+                self._rx.append(self._x())
+
+    def exec(self, instr: str):
+        current().count("sm.exec")
+        instr = instr.replace(" ", "")
+        if instr.startswith("set(x,"):
+            value = int(instr[6:-1], 0)
+            counts = self._motor.counts() if self._motor is not None else 0
+            self._x_offset = counts - value
+        else:
+            raise NotImplementedError("StateMachine.exec(%r) is not simulated" % instr)
+
+    def get(self, buf=None, shift=0) -> int:
+        current().count("sm.get")
+        self._run()
+        if not self._rx:
+            raise RuntimeError("StateMachine.get() with nothing to receive would block forever")
+        value = self._rx.popleft()
+        self._run()
+        return value >> shift
+
+    def put(self, value, shift=0):
+        current().count("sm.put")
+        if self._active and self._on_request:
+            x = self._x()
+            if (value << shift) & 0xFFFFFFFF != x and len(self._rx) < self.FIFO_DEPTH:
+                self._rx.append(x)
+
+    def rx_fifo(self) -> int:
+        self._run()
+        return len(self._rx)
+
+    def tx_fifo(self) -> int:
+        return 0
+
+    def irq(self, handler=None, trigger=0, hard=False):
+        pass
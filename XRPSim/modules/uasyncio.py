@@ -0,0 +1,178 @@
+"""
+Simulated MicroPython uasyncio module: CPython's asyncio running on the virtual clock.
+
+The event loop reads the time from the simulation's clock, and when it has nothing to do
+but wait for a timer it skips the clock straight to it (after a non-blocking poll of its
+sockets), so programs run as fast as the host allows. With Simulation(realtime=True)
+the loop waits in real time instead.
+"""
+import asyncio
+import selectors
+import time as _host_time
+from asyncio import *  # noqa: F401,F403
+from asyncio import CancelledError, TimeoutError, Event, Lock, create_task, gather, sleep, wait_for
+
+from ..simulation import current
+
+
+class _VirtualTimeSelector(selectors.BaseSelector):
+
+    def __init__(self, sim):
+        self._sim = sim
+        self._selector = selectors.DefaultSelector()
+
+    def register(self, fileobj, events, data=None):
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._selector.modify(fileobj, events, data)
+
+    def get_key(self, fileobj):
+        return self._selector.get_key(fileobj)
+
+    def get_map(self):
+        return self._selector.get_map()
+
+    def close(self):
+        self._selector.close()
+
+    def select(self, timeout=None):
+        clock = self._sim.clock
+        if self._sim.realtime:
+            start = _host_time.perf_counter()
+            events = self._selector.select(timeout)
+            clock.advance(int((_host_time.perf_counter() - start) * 1_000_000))
+            return events
+        events = self._selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            # Only sockets can wake the loop now, and they need real time
+            events = self._selector.select(0.01)
+            clock.advance(10_000)
+            return events
+        # Round up so the loop sees the timer as due
+        clock.advance_to(clock.now_us + int(timeout * 1_000_000) + 1)
+        return []
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+
+    def __init__(self):
+        self._sim = current()
+        super().__init__(_VirtualTimeSelector(self._sim))
+
+    def time(self):
+        return self._sim.clock.seconds()
+
+
+def new_event_loop():
+    return VirtualTimeEventLoop()
+
+
+def run(coro):
+    with asyncio.Runner(loop_factory=new_event_loop) as runner:
+        return runner.run(coro)
+
+
+def get_event_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        loop = new_event_loop()
+        asyncio.set_event_loop(loop)
+        return loop
+
+
+async def sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+async def wait_for_ms(aw, timeout_ms):
+    return await asyncio.wait_for(aw, timeout_ms / 1000)
+
+
+class Stream:
+
+    def __init__(self, reader, writer):
+        """
+        MicroPython's combined reader/writer stream, on top of CPython's StreamReader/StreamWriter.
+        Unlike CPython, wait_closed() closes the stream first.
+        """
+        self._reader = reader
+        self._writer = writer
+
+    def get_extra_info(self, name, default=None):
+        return self._writer.get_extra_info(name, default)
+
+    async def read(self, n=-1):
+        return await self._reader.read(n)
+
+    async def readinto(self, buf):
+        data = await self._reader.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+    async def readexactly(self, n):
+        return await self._reader.readexactly(n)
+
+    async def readline(self):
+        return await self._reader.readline()
+
+    def write(self, buf):
+        self._writer.write(bytes(buf))
+
+    async def drain(self):
+        await self._writer.drain()
+
+    def close(self):
+        self._writer.close()
+
+    async def wait_closed(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+    async def aclose(self):
+        await self.wait_closed()
+
+    async def awrite(self, buf, off=0, sz=-1):
+        self.write(buf[off:] if sz < 0 else buf[off:off + sz])
+        await self.drain()
+
+
+async def open_connection(host, port, **kwargs):
+    reader, writer = await asyncio.open_connection(host, port, **kwargs)
+    stream = Stream(reader, writer)
+    return stream, stream
+
+
+async def start_server(callback, host, port, backlog=5, **kwargs):
+    port = current().http_ports.get(port, port)
+
+    async def connected(reader, writer):
+        stream = Stream(reader, writer)
+        await callback(stream, stream)
+
+    return await asyncio.start_server(connected, host, port, backlog=backlog, **kwargs)
+
+
+class ThreadSafeFlag:
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
@@ -0,0 +1,79 @@
+"""
+Simulated MicroPython uctypes module, covering the unsigned integer fields and
+bitfields XRPLib uses to view register copies held in bytearrays.
+addressof() hands out an id that struct() maps back to the buffer.
+"""
+
+# Field descriptor layout: offset in bits 0-16, bitfield position at BF_POS, length at BF_LEN, type above
+BF_POS = 17
+BF_LEN = 22
+
+UINT8 = 1 << 28
+UINT16 = 2 << 28
+UINT32 = 3 << 28
+BFUINT8 = 4 << 28
+BFUINT16 = 5 << 28
+BFUINT32 = 6 << 28
+
+_SIZES = {UINT8: 1, UINT16: 2, UINT32: 4, BFUINT8: 1, BFUINT16: 2, BFUINT32: 4}
+
+LITTLE_ENDIAN = 0
+BIG_ENDIAN = 1
+NATIVE = 2
+
+_buffers = {}
+
+
+def addressof(obj) -> int:
+    _buffers[id(obj)] = obj
+    return id(obj)
+
+
+def bytearray_at(addr, size):
+    return memoryview(_buffers[addr])[:size]
+
+
+def sizeof(layout, layout_type=NATIVE) -> int:
+    return max((d & 0xFFFF) + _SIZES[d & (0xF << 28)] for d in layout.values())
+
+
+class struct:
+
+    def __init__(self, addr, layout, layout_type=NATIVE):
+        object.__setattr__(self, "_buf", _buffers[addr])
+        object.__setattr__(self, "_layout", layout)
+        object.__setattr__(self, "_big", layout_type == BIG_ENDIAN)
+
+    def _field(self, name):
+        try:
+            d = self._layout[name]
+        except KeyError:
+            raise AttributeError(name)
+        kind = d & (0xF << 28)
+        offset = d & 0xFFFF
+        size = _SIZES[kind]
+        pos = (d >> BF_POS) & 0x1F
+        length = (d >> BF_LEN) & 0x1F
+        return kind, offset, size, pos, length
+
+    def _get_word(self, offset, size):
+        return int.from_bytes(self._buf[offset:offset + size], "big" if self._big else "little")
+
+    def _set_word(self, offset, size, value):
+        self._buf[offset:offset + size] = value.to_bytes(size, "big" if self._big else "little")
+
+    def __getattr__(self, name):
+        kind, offset, size, pos, length = self._field(name)
+        word = self._get_word(offset, size)
+        if kind >= BFUINT8:
+            return (word >> pos) & ((1 << length) - 1)
+        return word
+
+    def __setattr__(self, name, value):
+        kind, offset, size, pos, length = self._field(name)
+        value = int(value)
+        if kind >= BFUINT8:
+            mask = ((1 << length) - 1) << pos
+            word = self._get_word(offset, size)
+            value = (word & ~mask) | ((value << pos) & mask)
+        self._set_word(offset, size, value & ((1 << (8 * size)) - 1))
@@ -0,0 +1,283 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from .boards import BOARDS, MOTORS
+from .clock import VirtualClock, ticks_add, ticks_diff
+from .lsm6dso import LSM6DSO
+from .models import MotorModel, DriveModel
+
+_current = None
+
+
+def current():
+    """
+    :return: The installed simulation
+    :rtype: Simulation
+    """
+    if _current is None:
+        raise RuntimeError("XRPSim is not installed; call XRPSim.install() first")
+    return _current
+
+
+class _PinState:
+
+    def __init__(self):
+        self.mode = None
+        self.pull = None
+        self.level = 0
+
+
+class Simulation:
+
+    def __init__(self, board: str = "rp2350", start_us: int = 0, tick_cost_us: int = 1,
+                 realtime: bool = False, http_ports: dict = None, timer_jitter_us: int = 0, seed: int = 0,
+                 timer_coalesce: bool = False):
+        """
+        The simulated robot: a virtual clock, the board's pins, the motors, the IMU and
+        the other sensors behind the fake machine/rp2 modules.
+
+        Inputs are scripted with set_adc(), set_pin(), the imu signals and range_cm; each
+        can be a constant or a function of the simulated time in seconds.
+
+        :param board: "rp2350" for the XRP, or "rp2040" for the XRP Beta
+        :type board: str
+        :param start_us: The initial clock value, in microseconds
+        :type start_us: int
+        :param tick_cost_us: How far each ticks read moves the clock
+        :type tick_cost_us: int
+        :param realtime: Make event loops wait in real time instead of skipping ahead, e.g. to use the web UI from a browser
+        :type realtime: bool
+        :param http_ports: Maps ports the program listens on to host ports, e.g. {80: 8080}
+        :type http_ports: dict
+        :param timer_jitter_us: Delay each timer callback by a random amount up to this, like interrupt latency and
+                                garbage collection do; a jitter longer than the timer's period makes it miss ticks
+        :type timer_jitter_us: int
+        :param seed: Seeds the simulation's random numbers, so runs with jitter are repeatable
+        :type seed: int
+        :param timer_coalesce: Run a late periodic callback once for all the ticks that came due while it waited, like
+                               MicroPython's soft timers, which don't queue a callback that's already pending;
+                               otherwise the missed ticks' callbacks run back to back
+        :type timer_coalesce: bool
+        """
+        self.board_name = board
+        self.board = BOARDS[board]
+        self.clock = VirtualClock(start_us, tick_cost_us)
+        self.realtime = realtime
+        self.http_ports = http_ports or {}
+        self.timer_jitter_us = timer_jitter_us
+        self.timer_coalesce = timer_coalesce
+        self.random = random.Random(seed)
+
+        self.pins = {}          # GPIO -> _PinState
+        self.pin_sources = {}   # GPIO -> scripted input level
+        self.adc_sources = {}   # GPIO or ADC channel -> scripted reading
+        self.pwm_duty = {}      # GPIO -> duty_u16
+        for name, value in self.board["adc_defaults"].items():
+            self.adc_sources[self.pin_id(name)] = value
+        self.range_cm = 100.0
+
+        self.motors = {}
+        self._drive_pins = {}    # drive GPIO -> MotorModel
+        self._encoder_pins = {}  # encoder A/B GPIO -> MotorModel
+        for name, side in MOTORS:
+            motor = MotorModel(self, name, self.pin_id(name + "_IN_1"), self.pin_id(name + "_IN_2"),
+                               self.board["dual_pwm_motors"])
+            self.motors[name] = motor
+            self._drive_pins[motor.in1] = motor
+            self._drive_pins[motor.in2] = motor
+            self._encoder_pins[self.pin_id(name + "_ENCODER_A")] = motor
+            self._encoder_pins[self.pin_id(name + "_ENCODER_B")] = motor
+        self.drive = DriveModel(self.motors["MOTOR_L"], self.motors["MOTOR_R"])
+
+        self.imu = LSM6DSO(self)
+        self.imu.drive = self.drive
+        self.i2c_devices = {0: {}, 1: {0x6B: self.imu}}
+
+        # Calls to the fake hardware, for performance regression tests
+        self.counters = {}
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def pin_id(self, pin) -> int:
+        """
+        :param pin: A GPIO number, a board pin name, or a machine.Pin
+        :return: The GPIO number
+        :rtype: int
+        """
+        if hasattr(pin, "id"):
+            return pin.id
+        if isinstance(pin, str):
+            try:
+                return self.board["pins"][pin]
+            except KeyError:
+                raise ValueError("unknown pin name: " + pin)
+        return int(pin)
+
+    def value(self, source, t: float = None):
+        """
+        Evaluate a scripted signal: a constant, or a function of the simulated time in seconds.
+        """
+        if callable(source):
+            return source(self.clock.seconds() if t is None else t)
+        return source
+
+    def pin_state(self, pin_id: int) -> _PinState:
+        state = self.pins.get(pin_id)
+        if state is None:
+            state = self.pins[pin_id] = _PinState()
+        return state
+
+    # --- Scripting inputs ---
+
+    def set_adc(self, pin, source):
+        """
+        :param pin: The pin (or, for ADC(n) with a small n, the channel number) to drive
+        :param source: The reading (0-65535), or a function of time returning it
+        """
+        self.adc_sources[self.pin_id(pin)] = source
+
+    def set_pin(self, pin, source):
+        """
+        :param pin: The input pin to drive
+        :param source: The level (0 or 1), or a function of time returning it; None to release it
+        """
+        if source is None:
+            self.pin_sources.pop(self.pin_id(pin), None)
+        else:
+            self.pin_sources[self.pin_id(pin)] = source
+
+    # --- Used by the fake modules ---
+
+    def input_level(self, pin_id: int) -> int:
+        if pin_id in self.pin_sources:
+            return 1 if self.value(self.pin_sources[pin_id]) else 0
+        state = self.pin_state(pin_id)
+        if state.mode == 1:   # Pin.OUT reads back what was written
+            return state.level
+        return 1 if state.pull == 1 else 0   # Pin.PULL_UP
+
+    def output_level(self, pin_id: int) -> int:
+        return self.pin_state(pin_id).level
+
+    def write_pin(self, pin_id: int, level: int):
+        self.pin_state(pin_id).level = 1 if level else 0
+        motor = self._drive_pins.get(pin_id)
+        if motor is not None:
+            motor.drive_changed()
+
+    def write_pwm(self, pin_id: int, duty: int):
+        self.pwm_duty[pin_id] = duty
+        motor = self._drive_pins.get(pin_id)
+        if motor is not None:
+            motor.drive_changed()
+
+    def read_adc(self, key: int) -> int:
+        v = self.value(self.adc_sources.get(key, 0))
+        return max(0, min(65535, int(v)))
+
+    def encoder_motor(self, pin_id: int):
+        return self._encoder_pins.get(pin_id)
+
+
+_saved = {}
+
+_FAKE_MODULES = ("machine", "rp2", "network", "neopixel", "uctypes", "micropython", "uasyncio")
+
+
+def install(board: str = "rp2350", flash_dir: str = None, **kwargs) -> Simulation:
+    """
+    Create a Simulation and make XRPLib importable under CPython: the fake MicroPython
+    modules are registered in sys.modules, the time module gets ticks_*/sleep_* functions
+    and a sleep() backed by the virtual clock, and sys.implementation._machine names the board.
+    Keyword arguments are passed on to Simulation.
+
+    The working directory stands in for the board's flash filesystem, where programs keep files such as
+    saved settings and IMU offsets, so it's changed to flash_dir until uninstall(). By default that's a new
+    empty directory, removed again on uninstall(), so runs neither leave files behind nor read old ones.
+
+    :param flash_dir: The directory to use as the board's flash, kept as it is, or None for a temporary one
+    :type flash_dir: str
+    :return: The new simulation
+    :rtype: Simulation
+    """
+    global _current
+    from .modules import machine, rp2, network, neopixel, uctypes, micropython, uasyncio
+
+    uninstall()
+    sim = Simulation(board, **kwargs)
+    _current = sim
+
+    # Keep modules importable from the old working directory once it's changed
+    cwd = os.getcwd()
+    sys.path[:] = [cwd if entry in ("", ".") else entry for entry in sys.path]
+    _saved["cwd"] = cwd
+    if flash_dir is None:
+        flash_dir = _saved["flash_tmp"] = tempfile.mkdtemp(prefix="xrpsim-flash-")
+    sim.flash_dir = os.path.abspath(flash_dir)
+    os.chdir(sim.flash_dir)
+
+    for name, module in zip(_FAKE_MODULES, (machine, rp2, network, neopixel, uctypes, micropython, uasyncio)):
+        _saved["module:" + name] = sys.modules.get(name)
+        sys.modules[name] = module
+    machine.Pin.board = type("board", (), dict(sim.board["pins"]))
+
+    clock = sim.clock
+    patches = {
+        "ticks_ms": clock.ticks_ms,
+        "ticks_us": clock.ticks_us,
+        "ticks_cpu": clock.ticks_cpu,
+        "ticks_add": ticks_add,
+        "ticks_diff": ticks_diff,
+        "sleep": clock.sleep,
+        "sleep_ms": clock.sleep_ms,
+        "sleep_us": clock.sleep_us,
+        # MicroPython's time() has whole-second resolution
+        "time": lambda: clock.now_us // 1_000_000,
+        "time_ns": lambda: clock.now_us * 1000,
+    }
+    for name, fn in patches.items():
+        _saved["time:" + name] = getattr(time, name, None)
+        setattr(time, name, fn)
+
+    _saved["machine_name"] = getattr(sys.implementation, "_machine", None)
+    sys.implementation._machine = sim.board["machine"]
+    return sim
+
+
+def uninstall():
+    """
+    Remove the fake modules and restore the time module.
+    Modules imported while the simulation was installed (e.g. XRPLib) keep their references.
+    """
+    global _current
+    if _current is None:
+        return
+    os.chdir(_saved.pop("cwd"))
+    if "flash_tmp" in _saved:
+        shutil.rmtree(_saved.pop("flash_tmp"), ignore_errors=True)
+    for key, saved in _saved.items():
+        kind, _, name = key.partition(":")
+        if kind == "module":
+            if saved is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = saved
+        elif kind == "time":
+            if saved is None:
+                delattr(time, name)
+            else:
+                setattr(time, name, saved)
+    if _saved.get("machine_name") is None:
+        try:
+            del sys.implementation._machine
+        except AttributeError:
+            pass
+    else:
+        sys.implementation._machine = _saved["machine_name"]
+    _saved.clear()
+    _current = None
@@ -7,6 +7,12 @@ from machine import Pin, ADC
 import gc
 from XRPLib.encoded_motor import EncodedMotor
 from XRPLib.board import Board
+from XRPLib.pump_scheduler import PumpScheduler
+from XRPLib.moisture_history import MoistureHistory
+from XRPLib.soil_sampler import SoilSampler
+from XRPLib.config_store import ConfigStore
+
+_BOOT_MS = time.ticks_ms()  # for the boot-to-first-sample benchmark
 
 # -------------------------------
 # Global configuration & hardware
@@ -15,23 +21,72 @@ from XRPLib.board import Board
 # False = autonomous | True = Config
 is_config_mode = False
 
-# Two plants by default
-moisture_thresholds = [1000, 1000]      # per-plant soil moisture thresholds
-auto_water_seconds = [3.0, 3.0]         # per-plant pump runtime when dry
-
 _server_obj = None  # asyncio server object (so we can close it cleanly)
 
+# Soil sensors are sampled at this fixed rate in both modes, independent of watering
+SAMPLE_PERIOD_MS = 500
+
+# Each soil reading is the median of a burst of ADC samples, smoothed by an EMA.
+# Plants switch dry/wet only outside threshold +/- MOISTURE_HYSTERESIS/2 so pumps don't chatter.
+SOIL_BURST_SAMPLES = 5
+MOISTURE_HYSTERESIS = 200
+
+# Pump limits (enforced by the pump scheduler)
+MAX_RUNNING_PUMPS = 2       # pumps allowed to run at the same time (supply current)
+PUMP_MAX_ON_SECONDS = 60    # max run time per pump within any duty window...
+PUMP_DUTY_WINDOW_S = 300    # ...of this many seconds
+
+# Server-Sent Events (/api/events) settings
+MAX_EVENT_SUBSCRIBERS = 3   # concurrent open event streams
+EVENT_HEARTBEAT_S = 15      # comment line sent when nothing changed for this long
+
+# Settings changed from the web UI are saved here; changes made within
+# CONFIG_SAVE_DELAY_MS of each other are written to flash together.
+CONFIG_PATH = "agxrp_config.json"
+CONFIG_SAVE_DELAY_MS = 5000
+
 # --- Hardware Pin Assignments (update these for your wiring) ---
-PLANT_PINS = [
-    {"led": "LED", "adc": 0, "pump": 3},   # Plant 1: LED, ADC0, GP3
-    {"led": 4, "adc": 1, "pump": 5},       # Plant 2: GP4, ADC1, GP5
-    # {"led": 6, "adc": 2, "pump": 7},     # Plant 3 example
-    # {"led": 8, "adc": 3, "pump": 9},     # Plant 4 example
-]
+# These are the defaults; a saved config file overrides them (plant count included).
+# The file is read once, here at start-up, since the hardware below is set up from it.
+config = ConfigStore(CONFIG_PATH, {
+    "plant_pins": [
+        {"led": "LED", "adc": 0, "pump": 3},   # Plant 1: LED, ADC0, GP3
+        {"led": 4, "adc": 1, "pump": 5},       # Plant 2: GP4, ADC1, GP5
+        # {"led": 6, "adc": 2, "pump": 7},     # Plant 3 example
+        # {"led": 8, "adc": 3, "pump": 9},     # Plant 4 example
+    ],
+    "soil_adc_pins": [44, 45],              # soil sensor pins, one per plant
+    "moisture_thresholds": [1000, 1000],    # per-plant soil moisture thresholds
+    "auto_water_seconds": [3.0, 3.0],       # per-plant pump runtime when dry
+}, CONFIG_SAVE_DELAY_MS)
+
+PLANT_PINS = config.get("plant_pins")
+SOIL_ADC_PINS = config.get("soil_adc_pins")
+if len(SOIL_ADC_PINS) != len(PLANT_PINS):
+    # Every plant needs a soil sensor; run the plants that have one (the saved lists are left as they are)
+    _n = min(len(PLANT_PINS), len(SOIL_ADC_PINS))
+    print("Config: %d plants but %d soil sensor pins; using the first %d plants"
+          % (len(PLANT_PINS), len(SOIL_ADC_PINS), _n))
+    PLANT_PINS = PLANT_PINS[:_n]
+    SOIL_ADC_PINS = SOIL_ADC_PINS[:_n]
+
+
+def _per_plant(key, fill):
+    """A per-plant setting from the config, padded/trimmed to the plant count."""
+    values = config.get(key)
+    n = len(PLANT_PINS)
+    if len(values) != n:
+        values = (values + [fill] * n)[:n]
+        config.set(key, values)
+    return values
+
 
 # NOTE: These pins (36, 44) are board-specific; keep as-is per your original code.
 USER_BUTTON  = Pin(36, Pin.IN, Pin.PULL_UP) #pin 36 is the USER button on the XRP Control board
-SOIL_ADCs = [ADC(Pin(44)), ADC(Pin(45)) ]       # create ADC objects acting on the soil sensor pins
+SOIL_ADCs = [ADC(Pin(p)) for p in SOIL_ADC_PINS]  # create ADC objects acting on the soil sensor pins
+
+moisture_thresholds = _per_plant("moisture_thresholds", 1000)
+auto_water_seconds = _per_plant("auto_water_seconds", 3.0)
 
 # --- Initialize hardware for all plants ---
 leds  = [Pin(p["led"],  Pin.OUT) for p in PLANT_PINS]
@@ -41,13 +96,90 @@ pumps = [Pin(p["pump"], Pin.OUT) for p in PLANT_PINS]
 # --- Global state for all plants ---
 led_states = [False] * len(PLANT_PINS)
 adc_values = [0]     * len(PLANT_PINS)
-
-# A simple per-plant lock so pump actions don't overlap
-pump_locks = [asyncio.Lock() for _ in PLANT_PINS]
+pump_running = [False] * len(PLANT_PINS)
 
 
 board = Board.get_default_board()
 
+# --------------------------
+# Cached state for the web UI
+# --------------------------
+# Requests never touch the ADCs: the sampling loops refresh adc_values and the
+# JSON snapshot is only re-encoded after something in it has changed.
+_state_version = 0       # bumped on every change to the snapshot contents
+_snapshot_version = -1   # version the cached body was built from
+_snapshot_body = b'{}'
+# Set on every change; wakes /api/events subscribers. Two Events take turns so a change leaves the
+# one subscribers were given set, rather than pulsing set()/clear(): a subscriber that has checked the
+# version but isn't waiting yet still wakes. (One that sleeps through two changes waits for the third.)
+_state_events = (asyncio.Event(), asyncio.Event())
+_state_changed = _state_events[0]
+
+
+def mark_state_changed():
+    global _state_version, _state_changed
+    _state_version += 1
+    _state_changed.set()
+    _state_changed = _state_events[_state_version & 1]
+    _state_changed.clear()
+
+
+def sample_soil():
+    """Sample every soil sensor into adc_values (the only place the soil ADCs are read)."""
+    changed = False
+    for i in range(len(PLANT_PINS)):
+        try:
+            val = soil_sampler.sample(i)
+        except Exception as e:
+            print("ADC read fail plant", i, e)
+            val = 0
+        if val != adc_values[i]:
+            adc_values[i] = val
+            changed = True
+    moisture_history.add(adc_values)
+    if changed:
+        mark_state_changed()
+
+
+def _on_pump_change(i, on):
+    # Called by the pump scheduler whenever a pump starts or stops
+    if pump_running[i] != on:
+        pump_running[i] = on
+        mark_state_changed()
+
+
+# Filtered soil acquisition (median + EMA); consumers read adc_values, never the ADCs
+soil_sampler = SoilSampler(SOIL_ADCs, burst=SOIL_BURST_SAMPLES, hysteresis=MOISTURE_HYSTERESIS)
+
+# Bounded per-plant soil history (raw samples plus minute/hour rollups), fed by sample_soil()
+moisture_history = MoistureHistory(len(PLANT_PINS), SAMPLE_PERIOD_MS)
+
+# The scheduler owns every pump motor; all watering goes through its job queue
+pump_scheduler = PumpScheduler(
+    [EncodedMotor.get_default_encoded_motor(i + 1) for i in range(len(PLANT_PINS))],
+    max_running=MAX_RUNNING_PUMPS,
+    max_on_seconds=PUMP_MAX_ON_SECONDS,
+    duty_window=PUMP_DUTY_WINDOW_S,
+    on_change=_on_pump_change,
+)
+
+
+def get_snapshot_body():
+    """JSON bytes for /api/snapshot, rebuilt only when the state has changed."""
+    global _snapshot_body, _snapshot_version
+    if _snapshot_version != _state_version:
+        import json
+        _snapshot_body = json.dumps({
+            "mode": "config" if is_config_mode else "autonomous",
+            "soil": adc_values,
+            "soil_var": [soil_sampler.variance(i) for i in range(len(adc_values))],
+            "pumps": pump_running,
+            "thresholds": moisture_thresholds,
+            "water": auto_water_seconds,
+        }).encode()
+        _snapshot_version = _state_version
+    return _snapshot_body
+
 def _send_json(sock, obj, code=200):
     import json
     body = json.dumps(obj).encode()
@@ -79,9 +211,9 @@ def create_ap():
 # --------------------
 # HTTP / HTML frontend
 # --------------------
-def generate_html():
-    # (kept your HTML; small IDs could be added to threshold/water inputs if you wire up those JS functions)
-    html = """<!DOCTYPE html>
+# The page is split around the per-plant boxes so it can be built for any
+# number of plants; see render_page() for how it is cached and served.
+_HTML_HEAD = """<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta name="viewport" content="width=device-width, initial-scale=1.0">
@@ -104,51 +236,33 @@ button:active{translate:1px 1px}
 </head>
 <body>
 <div class="plants-area">
-  <div class="plant-box">
-    <header>Plant 1</header>
-    <div class="attribute">
-      <p>Soil moisture:</p>
-      <input id="soil-field0" class="text-box" type="text" readonly>
-    </div>
-    <div class="attribute">
-      <p>Pump for:</p>
-      <input id="pump0" class="text-box" type="text">
-      <button class="start-btn" onclick="runPump(0)">Start</button>
-    </div>
-    <div class="attribute">
-      <p>Moisture threshold:</p>
-      <input id="threshold0" class="text-box" type="text">
-      <button class="apply-btn" onclick="applyThreshold(0)">Apply</button>
-    </div>
-    <div class="attribute">
-      <p>Water seconds:</p>
-      <input id="water0" class="text-box" type="text">
-      <button class="apply-btn" onclick="applyWater(0)">Apply</button>
-    </div>
-  </div>
-  <div class="plant-box">
-    <header>Plant 2</header>
+"""
+
+_HTML_PLANT_BOX = """  <div class="plant-box">
+    <header>Plant {num}</header>
     <div class="attribute">
       <p>Soil moisture:</p>
-      <input id="soil-field1" class="text-box" type="text" readonly>
+      <input id="soil-field{i}" class="text-box" type="text" readonly>
     </div>
     <div class="attribute">
       <p>Pump for:</p>
-      <input id="pump1" class="text-box" type="text">
-      <button class="start-btn" onclick="runPump(1)">Start</button>
+      <input id="pump{i}" class="text-box" type="text">
+      <button class="start-btn" onclick="runPump({i})">Start</button>
     </div>
     <div class="attribute">
       <p>Moisture threshold:</p>
-      <input id="threshold1" class="text-box" type="text">
-      <button class="apply-btn" onclick="applyThreshold(1)">Apply</button>
+      <input id="threshold{i}" class="text-box" type="text">
+      <button class="apply-btn" onclick="applyThreshold({i})">Apply</button>
     </div>
     <div class="attribute">
       <p>Water seconds:</p>
-      <input id="water1" class="text-box" type="text">
-      <button class="apply-btn" onclick="applyWater(1)">Apply</button>
+      <input id="water{i}" class="text-box" type="text">
+      <button class="apply-btn" onclick="applyWater({i})">Apply</button>
     </div>
   </div>
-</div>
+"""
+
+_HTML_TAIL = """</div>
 <div class="auto-button-container">
   <button class="auto-button" onclick="toggleAutonomous()">Autonomous Mode</button>
 </div>
@@ -172,21 +286,38 @@ async function applyWater(i){
   try { await fetch('/api/set_water/' + i + '/' + v, { method: 'POST' }); }
   catch(e){ console.log("error setting water duration:", e); }
 }
- async function updateSoil(i){
-                try{
-                    const res = await fetch('/api/update_soil/' + i, { method: 'GET' });
-                    const json_res = await res.json();
-                    document.getElementById("soil-field" + i).value = json_res.raw;
-                } catch (e){
-                    console.log("error updating soil moisture: ", e)
-                }
-            }
-
-            setInterval(() => updateSoil(0), 1000);
-            setInterval(() => updateSoil(1), 1000);
-            updateSoil(0);
-            updateSoil(1);
-        
+function applySnapshot(s){
+  for (let i = 0; i < s.soil.length; i++){
+    const soil = document.getElementById("soil-field" + i);
+    if (!soil) continue;
+    soil.value = s.soil[i] + (s.pumps[i] ? " (watering)" : "");
+    document.getElementById("threshold" + i).placeholder = s.thresholds[i];
+    document.getElementById("water" + i).placeholder = s.water[i];
+  }
+}
+// One request per second for every plant, instead of one request per plant
+async function updateSnapshot(){
+  try {
+    const res = await fetch('/api/snapshot', { method: 'GET' });
+    applySnapshot(await res.json());
+  } catch (e){
+    console.log("error updating snapshot: ", e);
+  }
+}
+let pollTimer = null;
+function startPolling(){
+  if (pollTimer) return;
+  pollTimer = setInterval(updateSnapshot, 1000);
+  updateSnapshot();
+}
+// Prefer the pushed event stream; fall back to polling if it is refused or drops
+if (window.EventSource){
+  const events = new EventSource('/api/events');
+  events.onmessage = (e) => applySnapshot(JSON.parse(e.data));
+  events.onerror = () => { events.close(); startPolling(); };
+} else {
+  startPolling();
+}
 async function toggleAutonomous(){
   try { await fetch('/api/toggle_mode', { method: 'POST' }); }
   catch(e){ console.log("error toggling mode:", e); }
@@ -194,128 +325,495 @@ async function toggleAutonomous(){
 </script>
 </body>
 </html>"""
-    return html
 
 
-async def handle_client(reader, writer):
-    """Async HTTP 1.0/1.1 handler (very small, just enough for this UI)."""
+def generate_html():
+    """Build the dashboard page for the current PLANT_PINS (one box per plant)."""
+    parts = [_HTML_HEAD]
+    for i in range(len(PLANT_PINS)):
+        parts.append(_HTML_PLANT_BOX.format(i=i, num=i + 1))
+    parts.append(_HTML_TAIL)
+    return ''.join(parts)
+
+
+# Pre-rendered page: built once per configuration change (not per request),
+# gzip-compressed when the firmware supports it, and served with an ETag so
+# repeat visits get a 304.
+PAGE_CHUNK_SIZE = 512   # bytes handed to the socket per write, so slow clients don't buffer a full copy
+
+_page_key = None        # configuration the cached page was rendered for
+_page_body = b''
+_page_gzip = None       # gzip-compressed body, or None if compression is unavailable
+_page_etag = b''
+_page_hdr_plain = b''
+_page_hdr_gzip = b''
+_page_not_modified = b''
+
+
+def _gzip(data):
+    """Gzip-compress `data`, or return None if this build can't compress."""
     try:
-        req = await reader.read(1024)
-        if not req:
-            return
-        try:
-            req_s = req.decode()
-        except:
-            req_s = str(req)
+        import deflate, io
+        stream = io.BytesIO()
+        with deflate.DeflateIO(stream, deflate.GZIP) as f:
+            f.write(data)
+        return stream.getvalue()
+    except Exception:
+        pass
+    try:
+        import gzip  # host CPython
+        return gzip.compress(data)
+    except ImportError:
+        return None
+
+
+def render_page():
+    """Render the page and its response headers into the cache if the configuration changed."""
+    global _page_key, _page_body, _page_gzip, _page_etag
+    global _page_hdr_plain, _page_hdr_gzip, _page_not_modified
+    key = len(PLANT_PINS)
+    if key == _page_key:
+        return
+    _page_body = generate_html().encode()
+    _page_gzip = _gzip(_page_body)
+    if _page_gzip is not None and len(_page_gzip) >= len(_page_body):
+        _page_gzip = None
+    try:
+        from binascii import crc32
+        tag = crc32(_page_body)
+    except ImportError:
+        tag = len(_page_body)
+    _page_etag = ('"%08x"' % tag).encode()
+
+    common = (b'Content-Type: text/html\r\nCache-Control: no-cache\r\n'
+              b'Vary: Accept-Encoding\r\nETag: ' + _page_etag + b'\r\n')
+    _page_hdr_plain = (b'HTTP/1.1 200 OK\r\n' + common +
+                       b'Content-Length: %d\r\nConnection: close\r\n\r\n' % len(_page_body))
+    if _page_gzip is not None:
+        _page_hdr_gzip = (b'HTTP/1.1 200 OK\r\n' + common + b'Content-Encoding: gzip\r\n'
+                          b'Content-Length: %d\r\nConnection: close\r\n\r\n' % len(_page_gzip))
+    _page_not_modified = (b'HTTP/1.1 304 Not Modified\r\nCache-Control: no-cache\r\n'
+                          b'ETag: ' + _page_etag + b'\r\nConnection: close\r\n\r\n')
+    _page_key = key
+    gc.collect()
+
+
+# -----------------------------
+# HTTP request parsing / routing
+# -----------------------------
+# The request head is read into one preallocated buffer and parsed in place,
+# and responses are written from pre-encoded constants, so a dashboard polling
+# every second doesn't churn the heap (GC pauses delay pump shutoff).
+_REQ_BUF = bytearray(1024)
+_REQ_MV = memoryview(_REQ_BUF)
+_BODY_BUF = bytearray(64)      # scratch space for small JSON bodies
+_BODY_MV = memoryview(_BODY_BUF)
+
+_HDR_TEXT = b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\n'
+_HDR_JSON = (b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+             b'Cache-Control: no-store\r\nConnection: close\r\n\r\n')
+_RESP_OK = _HDR_TEXT + b'OK'
+_RESP_BAD_REQUEST = b'HTTP/1.1 400 Bad Request\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nERR'
+_HDR_JSON_ACCEPTED = (b'HTTP/1.1 202 Accepted\r\nContent-Type: application/json\r\n'
+                      b'Cache-Control: no-store\r\nConnection: close\r\n\r\n')
+_HDR_CSV = (b'HTTP/1.1 200 OK\r\nContent-Type: text/csv\r\n'
+            b'Cache-Control: no-store\r\nConnection: close\r\n\r\n')
+_HDR_EVENTS = (b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+               b'Cache-Control: no-store\r\nConnection: keep-alive\r\n\r\n')
+_RESP_BUSY = (b'HTTP/1.1 503 Service Unavailable\r\nContent-Type: text/plain\r\n'
+              b'Retry-After: 5\r\nConnection: close\r\n\r\nBusy')
+_RESP_NOT_FOUND = b'HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nNot Found'
+
+_SP, _CR, _LF = 0x20, 0x0D, 0x0A
+_SLASH, _QMARK, _DOT, _MINUS, _ZERO = 0x2F, 0x3F, 0x2E, 0x2D, 0x30
+_PLUS, _LOWER_E, _UPPER_E = 0x2B, 0x65, 0x45
+
+
+def _scan(buf, pos, end, ch):
+    """Index of the first `ch` in buf[pos:end], or `end` if there is none."""
+    while pos < end and buf[pos] != ch:
+        pos += 1
+    return pos
+
+
+def _match(buf, pos, end, lit):
+    """True if buf[pos:end] starts with `lit` (compared byte by byte, no slice copies)."""
+    n = len(lit)
+    if pos + n > end:
+        return False
+    for i in range(n):
+        if buf[pos + i] != lit[i]:
+            return False
+    return True
+
+
+def _parse_digits(buf, pos, end):
+    """Parse the unsigned decimal digits buf[pos:end]; there must be at least one, and nothing else."""
+    if pos >= end:
+        raise ValueError('bad number')
+    val = 0
+    while pos < end:
+        d = buf[pos] - _ZERO
+        if d < 0 or d > 9:
+            raise ValueError('bad number')
+        val = val * 10 + d
+        pos += 1
+    return val
+
+
+def _parse_int(buf, pos, end):
+    """Parse a decimal integer from buf[pos:end]."""
+    if pos < end and buf[pos] == _MINUS:
+        return -_parse_digits(buf, pos + 1, end)
+    return _parse_digits(buf, pos, end)
+
+
+def _parse_float(buf, pos, end):
+    """Parse a decimal number from buf[pos:end], in the forms float() takes: "3", "-1.25", ".5",
+    "+2", "1e3", "2.5E-1". Unlike float(), "inf" and "nan" are rejected (never a valid setting),
+    and so are exponents that would overflow or underflow a single-precision float."""
+    neg = pos < end and buf[pos] == _MINUS
+    if neg or (pos < end and buf[pos] == _PLUS):
+        pos += 1
+    exp_at = _scan(buf, pos, end, _LOWER_E)
+    if exp_at == end:
+        exp_at = _scan(buf, pos, end, _UPPER_E)
+    dot = _scan(buf, pos, exp_at, _DOT)
+    if dot == pos and dot + 1 >= exp_at:
+        raise ValueError('bad number')  # no digits before the exponent: "", ".", "e5"
+    # The sign was taken above, so every part from here on is bare digits: "--3", "1.-5" are rejected
+    val = _parse_digits(buf, pos, dot) if dot > pos else 0
+    frac = dot + 1
+    if frac < exp_at:
+        val += _parse_digits(buf, frac, exp_at) / 10 ** (exp_at - frac)
+    if exp_at < end:
+        exp = exp_at + 1
+        exp_neg = exp < end and buf[exp] == _MINUS
+        if exp_neg or (exp < end and buf[exp] == _PLUS):
+            exp += 1
+        power = _parse_digits(buf, exp, end)
+        if power > 38:
+            raise ValueError('bad number')
+        val *= 10.0 ** (-power if exp_neg else power)
+    return -val if neg else val
+
+
+def _put_int(buf, pos, val):
+    """Write `val` as decimal digits into buf at pos; returns the index after the last digit."""
+    if val < 0:
+        buf[pos] = _MINUS
+        pos += 1
+        val = -val
+    start = pos
+    while True:
+        buf[pos] = _ZERO + val % 10
+        pos += 1
+        val //= 10
+        if not val:
+            break
+    # Digits were written least significant first; reverse them in place
+    i, j = start, pos - 1
+    while i < j:
+        buf[i], buf[j] = buf[j], buf[i]
+        i += 1
+        j -= 1
+    return pos
+
+
+def _put_bytes(buf, pos, lit):
+    for i in range(len(lit)):
+        buf[pos + i] = lit[i]
+    return pos + len(lit)
+
+
+def _find(buf, pos, end, lit):
+    """Index of the first occurrence of `lit` in buf[pos:end], or -1."""
+    last = end - len(lit)
+    while pos <= last:
+        if _match(buf, pos, end, lit):
+            return pos
+        pos += 1
+    return -1
+
+
+def _contains(buf, pos, end, lit):
+    """True if `lit` occurs anywhere in buf[pos:end]."""
+    return _find(buf, pos, end, lit) >= 0
+
+
+def _header_value(buf, pos, end, name):
+    """
+    Find header `name` (lower case, without the colon) in the header block buf[pos:end].
+    Returns the index where its value starts, or -1. Header names are compared case-insensitively.
+    """
+    n = len(name)
+    while True:
+        pos = _scan(buf, pos, end, _LF) + 1
+        if pos + n >= end:
+            return -1
+        i = 0
+        # OR-ing 0x20 lower-cases ASCII letters and leaves '-' and digits alone
+        while i < n and (buf[pos + i] | 0x20) == name[i]:
+            i += 1
+        if i == n and buf[pos + n] == 0x3A:  # ':'
+            pos += n + 1
+            while pos < end and buf[pos] == _SP:
+                pos += 1
+            return pos
+
+
+async def _write_chunked(writer, data):
+    """Write a large buffer in PAGE_CHUNK_SIZE pieces, draining between them."""
+    mv = memoryview(data)
+    for pos in range(0, len(data), PAGE_CHUNK_SIZE):
+        writer.write(mv[pos:pos + PAGE_CHUNK_SIZE])
+        await writer.drain()
 
-        first_line = req_s.split('\n', 1)[0].strip()  # "POST /api/pump/0/2 HTTP/1.1"
-        parts = first_line.split()
-        if len(parts) < 2:
-            return
-        method, path = parts[0], parts[1]
-
-        # Serve HTML
-        if method == 'GET' and path == '/':
-            body = generate_html()
-            resp = (
-                'HTTP/1.1 200 OK\r\n'
-                'Content-Type: text/html\r\n'
-                'Connection: close\r\n\r\n' + body
-            )
-            writer.write(resp.encode())
-            await writer.drain()
-            return
 
-        # Toggle mode (UI button) — flips to autonomous and button task will also work
-        if method == 'POST' and path == '/api/toggle_mode':
-            global is_config_mode
-            is_config_mode = not is_config_mode
-            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nOK')
+def _path_index(buf, pos, end, limit):
+    """Parse a plant index path segment and check it against `limit`."""
+    idx = _parse_int(buf, pos, end)
+    if idx < 0 or idx >= limit:
+        raise ValueError('bad plant index')
+    return idx
+
+
+# Route handlers are called as handler(writer, buf, arg, path_end, req_len):
+#   buf[arg:path_end] is the part of the path after the matched prefix,
+#   buf[path_end:req_len] is the query string (if any) and the header block.
+# The request buffer is shared by every connection, so handlers must finish
+# reading it before their first `await`.
+
+async def _route_index(writer, buf, arg, end, n):
+    render_page()
+    value = _header_value(buf, end, n, b'if-none-match')
+    if value >= 0 and _contains(buf, value, _scan(buf, value, n, _CR), _page_etag):
+        writer.write(_page_not_modified)
+        return
+    value = _header_value(buf, end, n, b'accept-encoding')
+    if _page_gzip is not None and value >= 0 and _contains(buf, value, _scan(buf, value, n, _CR), b'gzip'):
+        writer.write(_page_hdr_gzip)
+        await _write_chunked(writer, _page_gzip)
+    else:
+        writer.write(_page_hdr_plain)
+        await _write_chunked(writer, _page_body)
+
+
+async def _route_toggle_mode(writer, buf, arg, end, n):
+    # Toggle mode (UI button) — flips to autonomous and button task will also work
+    global is_config_mode
+    is_config_mode = not is_config_mode
+    mark_state_changed()
+    writer.write(_RESP_OK)
+
+
+async def _route_update_soil(writer, buf, arg, end, n):
+    idx = _path_index(buf, arg, end, len(adc_values))
+    raw_val = adc_values[idx]
+    pos = _put_bytes(_BODY_BUF, 0, b'{"raw": ')
+    pos = _put_int(_BODY_BUF, pos, raw_val)
+    _BODY_BUF[pos] = 0x7D  # '}'
+    writer.write(_HDR_JSON)
+    writer.write(_BODY_MV[:pos + 1])
+
+
+async def _route_snapshot(writer, buf, arg, end, n):
+    writer.write(_HDR_JSON)
+    writer.write(get_snapshot_body())
+
+
+_event_subscribers = 0
+
+
+async def _route_events(writer, buf, arg, end, n):
+    # Long-lived text/event-stream: one "data:" event per state change, or a
+    # heartbeat comment every EVENT_HEARTBEAT_S. Ends when config mode is left.
+    global _event_subscribers
+    if _event_subscribers >= MAX_EVENT_SUBSCRIBERS:
+        writer.write(_RESP_BUSY)
+        return
+    _event_subscribers += 1
+    try:
+        writer.write(_HDR_EVENTS)
+        sent_version = -1
+        while is_config_mode:
+            if sent_version != _state_version:
+                sent_version = _state_version
+                writer.write(b'data: ')
+                writer.write(get_snapshot_body())
+                writer.write(b'\n\n')
+            else:
+                writer.write(b': ping\n\n')
             await writer.drain()
-            return
-        
-        #API: get soil moisture
-        if method == 'GET' and path.startswith('/api/update_soil/'):
-            try:
-                _, _, _, idx_str = path.split('/')
-                idx = int(idx_str)
-                if idx < 0 or idx >= len(SOIL_ADCs): raise ValueError('bad plant index')
-                raw_val = SOIL_ADCs[idx].read_u16()
-                import json
-                body = json.dumps({"raw": raw_val}).encode()
-                hdr = (
-                    "HTTP/1.1 200 OK\r\n"
-                    "Content-Type: application/json\r\n"
-                    "Cache-Control: no-store\r\n"
-                    "Connection: close\r\n\r\n"
-                ).encode()
-                writer.write(hdr + body)
-            except Exception as e:
-                print('error reading soil sensor', e)
-                writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nERR')
+            if sent_version == _state_version:
+                try:
+                    await asyncio.wait_for(_state_changed.wait(), EVENT_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        _event_subscribers -= 1
+
+
+_HISTORY_RES = (
+    (b'raw', MoistureHistory.RAW),
+    (b'minute', MoistureHistory.MINUTE),
+    (b'hour', MoistureHistory.HOUR),
+)
+
+
+async def _route_history(writer, buf, arg, end, n):
+    # /api/history/<plant>?res=raw|minute|hour  -> CSV, oldest row first
+    plant = _path_index(buf, arg, end, len(PLANT_PINS))
+    tier = MoistureHistory.RAW
+    query_end = _scan(buf, end, n, _SP)
+    value = _find(buf, end, query_end, b'res=')
+    if value >= 0:
+        value += 4
+        value_end = _scan(buf, value, query_end, 0x26)  # '&'
+        for name, res in _HISTORY_RES:
+            if value_end - value == len(name) and _match(buf, value, value_end, name):
+                tier = res
+                break
+        else:
+            raise ValueError('bad res')
+
+    writer.write(_HDR_CSV)
+    if tier == MoistureHistory.RAW:
+        writer.write(b'age_ms,value\n')
+    else:
+        writer.write(b'age_ms,min,mean,max\n')
+    # Rows are formatted into one small buffer and flushed whenever it fills up
+    line = bytearray(256)
+    pos = 0
+    for row in moisture_history.rows(plant, tier):
+        if pos > len(line) - 32:
+            writer.write(memoryview(line)[:pos])
             await writer.drain()
-            return
+            pos = 0
+        for k in range(len(row)):
+            if k:
+                line[pos] = 0x2C  # ','
+                pos += 1
+            pos = _put_int(line, pos, row[k])
+        line[pos] = _LF
+        pos += 1
+    writer.write(memoryview(line)[:pos])
+
+
+async def _route_pump(writer, buf, arg, end, n):
+    # /api/pump/<idx>/<secs>
+    sep = _scan(buf, arg, end, _SLASH)
+    idx = _path_index(buf, arg, sep, len(PLANT_PINS))
+    secs = _parse_float(buf, sep + 1, end)
+    # Runs in the background; poll /api/job/<id> for progress
+    job_id = pump_scheduler.submit(idx, secs)
+    pos = _put_bytes(_BODY_BUF, 0, b'{"job": ')
+    pos = _put_int(_BODY_BUF, pos, job_id)
+    _BODY_BUF[pos] = 0x7D  # '}'
+    writer.write(_HDR_JSON_ACCEPTED)
+    writer.write(_BODY_MV[:pos + 1])
+
+
+async def _route_job(writer, buf, arg, end, n):
+    # /api/job/<id>
+    job = pump_scheduler.status(_parse_int(buf, arg, end))
+    if job is None:
+        writer.write(_RESP_NOT_FOUND)
+        return
+    import json
+    writer.write(_HDR_JSON)
+    writer.write(json.dumps(job.to_dict()).encode())
+
+
+async def _route_set_threshold(writer, buf, arg, end, n):
+    # /api/set_threshold/<idx>/<value>
+    sep = _scan(buf, arg, end, _SLASH)
+    idx = _path_index(buf, arg, sep, len(moisture_thresholds))
+    moisture_thresholds[idx] = _parse_int(buf, sep + 1, end)
+    config.set("moisture_thresholds", moisture_thresholds)
+    mark_state_changed()
+    writer.write(_RESP_OK)
+
+
+async def _route_set_water(writer, buf, arg, end, n):
+    # /api/set_water/<idx>/<secs>
+    sep = _scan(buf, arg, end, _SLASH)
+    idx = _path_index(buf, arg, sep, len(auto_water_seconds))
+    water_secs = _parse_float(buf, sep + 1, end)
+    if water_secs < 0:
+        raise ValueError('Please enter non-negative seconds')
+    if water_secs > PUMP_MAX_ON_SECONDS:
+        raise ValueError('seconds exceeds pump duty-cycle limit')
+    auto_water_seconds[idx] = water_secs
+    config.set("auto_water_seconds", auto_water_seconds)
+    mark_state_changed()
+    writer.write(_RESP_OK)
+
+
+# (method, path, match path as prefix?, handler) — checked in order
+_ROUTES = (
+    (b'GET',  b'/',                   False, _route_index),
+    (b'POST', b'/api/toggle_mode',    False, _route_toggle_mode),
+    (b'GET',  b'/api/snapshot',       False, _route_snapshot),
+    (b'GET',  b'/api/events',         False, _route_events),
+    (b'GET',  b'/api/update_soil/',   True,  _route_update_soil),
+    (b'POST', b'/api/pump/',          True,  _route_pump),
+    (b'GET',  b'/api/job/',           True,  _route_job),
+    (b'GET',  b'/api/history/',       True,  _route_history),
+    (b'POST', b'/api/set_threshold/', True,  _route_set_threshold),
+    (b'POST', b'/api/set_water/',     True,  _route_set_water),
+)
+
+
+def _find_route(buf, method_end, path_start, path_end):
+    for route in _ROUTES:
+        method, path, is_prefix, _ = route
+        if method_end != len(method) or not _match(buf, 0, method_end, method):
+            continue
+        if not is_prefix and path_end - path_start != len(path):
+            continue
+        if _match(buf, path_start, path_end, path):
+            return route
+    return None
+
+
+async def _read_request(reader):
+    """Read the request head into _REQ_BUF; returns the number of bytes read."""
+    if hasattr(reader, 'readinto'):
+        return await reader.readinto(_REQ_MV) or 0
+    # CPython's StreamReader has no readinto()
+    data = await reader.read(len(_REQ_BUF))
+    _REQ_BUF[:len(data)] = data
+    return len(data)
 
-        # API: pump (indexes 0..N-1)
-        if method == 'POST' and path.startswith('/api/pump/'):
-            try:
-                _, _, _, idx_str, sec_str = path.split('/')
-                idx = int(idx_str)
-                secs = float(sec_str)
-                if idx < 0 or idx >= len(PLANT_PINS):
-                    raise ValueError('bad plant index')
-                if secs <= 0:
-                    raise ValueError('seconds must be > 0')
-
-                async with pump_locks[idx]:
-                    motor = EncodedMotor.get_default_encoded_motor(idx + 1)
-                    motor.set_effort(1.0)
-                    await asyncio.sleep(secs)
-                    motor.set_effort(0.0)
-
-                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nOK')
-            except Exception as e:
-                print('pump route error:', e)
-                writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nERR')
-            await writer.drain()
-            return
 
-        # API: set per-plant moisture threshold
-        if method == 'POST' and path.startswith('/api/set_threshold/'):
-            try:
-                _, _, _, idx_str, val_str = path.split('/')
-                idx = int(idx_str)
-                threshold_val = int(val_str)
-                if idx < 0 or idx >= len(moisture_thresholds):
-                    raise ValueError('bad plant index') 
-                moisture_thresholds[idx] = threshold_val
-                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nOK')
-            except Exception as e:
-                print('set_threshold error:', e)
-                writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nERR')
-            await writer.drain()
+async def handle_client(reader, writer):
+    """Async HTTP 1.0/1.1 handler (very small, just enough for this UI)."""
+    try:
+        n = await _read_request(reader)
+        if not n:
             return
+        buf = _REQ_BUF
+
+        # Request line: "POST /api/pump/0/2 HTTP/1.1"
+        method_end = _scan(buf, 0, n, _SP)
+        path_start = method_end + 1
+        line_end = path_start
+        while line_end < n and buf[line_end] not in (_SP, _CR, _LF):
+            line_end += 1
+        if line_end <= path_start:
+            return
+        path_end = _scan(buf, path_start, line_end, _QMARK)
 
-        # API: set per-plant autonomous watering duration (seconds)
-        if method == 'POST' and path.startswith('/api/set_water/'):
+        route = _find_route(buf, method_end, path_start, path_end)
+        if route is None:
+            writer.write(_RESP_NOT_FOUND)
+        else:
             try:
-                _, _, _, idx_str, val_str = path.split('/')
-                idx = int(idx_str)
-                water_secs = float(val_str)
-                if idx < 0 or idx >= len(auto_water_seconds):
-                    raise ValueError('bad plant index')
-                if water_secs < 0:
-                    raise ValueError('Please enter non-negative seconds')  # FIX: variable name
-                auto_water_seconds[idx] = water_secs
-                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nOK')
+                await route[3](writer, buf, path_start + len(route[1]), path_end, n)
             except Exception as e:
-                print('set_water error:', e)
-                writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nERR')
-            await writer.drain()
-            return
-
-        # Not found
-        writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\nNot Found')
+                print('route error:', route[1], e)
+                writer.write(_RESP_BAD_REQUEST)
         await writer.drain()
 
     except Exception as e:
@@ -362,14 +860,13 @@ async def config_mode_task():
     global _server_obj
 
     # Ensure all pumps off when entering config
-    for i in range(len(PLANT_PINS)):
-        try:
-            motor = EncodedMotor.get_default_encoded_motor(i + 1)
-            motor.set_effort(0.0)
-        except Exception as e:
-            print("Motor init off error:", e)
+    try:
+        pump_scheduler.cancel_all()
+    except Exception as e:
+        print("Motor init off error:", e)
 
     ap = create_ap()
+    render_page()
 
     # Start server
     _server_obj = await start_webserver()
@@ -391,29 +888,31 @@ async def config_mode_task():
             pass
 
 
+async def sampler_task():
+    """Sample every soil sensor at a fixed rate, in both modes, so readings never wait on watering."""
+    sample_soil()
+    print("First soil sample", time.ticks_diff(time.ticks_ms(), _BOOT_MS), "ms after boot")
+    while True:
+        await asyncio.sleep_ms(SAMPLE_PERIOD_MS)
+        sample_soil()
+
+
 async def autonomous_cycle_once():
-    """One short autonomous scan of all plants."""
-    for i in range(len(PLANT_PINS)):
-        try:
-            adc_values[i] = SOIL_ADCs[i].read_u16()
-        except Exception as e:
-            print("ADC read fail plant", i, e)
-            adc_values[i] = 0
+    """One short autonomous scan of all plants.
 
+    Dry plants are handed to the pump scheduler and watered concurrently (up to
+    MAX_RUNNING_PUMPS at once); the scan itself never waits for a pump."""
+    for i in range(len(PLANT_PINS)):
         print(f"Plant {i+1} ADC Value: {adc_values[i]} (threshold {moisture_thresholds[i]})")
 
-        if adc_values[i] < moisture_thresholds[i]:
-            # Soil is "dry" by your convention: lower value = drier.
+        try:
             secs = float(auto_water_seconds[i])
-            print(f"Plant {i+1} soil is dry. Activating pump for {secs} seconds.")
-            try:
-                async with pump_locks[i]:
-                    motor = EncodedMotor.get_default_encoded_motor(i + 1)
-                    motor.set_effort(1.0)
-                    await asyncio.sleep(secs)
-                    motor.set_effort(0.0)
-            except Exception as e:
-                print("Pump error:", e)
+            if soil_sampler.is_dry(i, moisture_thresholds[i]) and secs > 0 and not pump_scheduler.is_busy(i):
+                # Soil is "dry" by your convention: lower value = drier.
+                print(f"Plant {i+1} soil is dry. Activating pump for {secs} seconds.")
+                pump_scheduler.submit(i, secs)
+        except Exception as e:
+            print("Pump error:", e)
 
 
 # -------------------
@@ -432,6 +931,7 @@ async def button_watcher():
                 await asyncio.sleep_ms(50)
                 if USER_BUTTON.value() == 0:
                     is_config_mode = not is_config_mode
+                    mark_state_changed()
                     print("Button pressed -> is_config_mode:", is_config_mode)
                     # wait for release
                     while USER_BUTTON.value() == 0:
@@ -450,8 +950,13 @@ async def main():
 
     print("Starting Pico (u)asyncio app...")
 
-    # Kick off the button watcher (no threads)
+    # Kick off the soil sampler first, then the button watcher, pump scheduler and config saver (no threads)
+    asyncio.create_task(sampler_task())
     asyncio.create_task(button_watcher())
+    asyncio.create_task(pump_scheduler.run())
+    asyncio.create_task(config.autosave())
+    # Let the sampler take its first reading before anything acts on adc_values
+    await asyncio.sleep_ms(0)
 
     # Start in autonomous unless user flips the mode
     while True:
@@ -463,22 +968,28 @@ async def main():
             await config_mode_task()  # returns when mode flips to False
             # loop continues, next iteration will run autonomous
         else:
-            # Run a single quick autonomous cycle, then yield back to loop
+            # Run a single quick autonomous cycle, then wait for the next sample
             board.led_off()
             await autonomous_cycle_once()
-            await asyncio.sleep(0.1)
+            await asyncio.sleep_ms(SAMPLE_PERIOD_MS)
 
         gc.collect()
 
 
-# Entry point
-try:
-    asyncio.run(main())
-finally:
-    # Ensure pumps off if we ever exit
+# Entry point (MicroPython runs main.py as __main__; the simulator can also import it)
+if __name__ == "__main__":
     try:
-        for i in range(len(PLANT_PINS)):
-            motor = EncodedMotor.get_default_encoded_motor(i + 1)
-            motor.set_effort(0.0)
-    except:
-        pass
\ No newline at end of file
+        asyncio.run(main())
+    finally:
+        # Ensure pumps off if we ever exit
+        try:
+            for i in range(len(PLANT_PINS)):
+                motor = EncodedMotor.get_default_encoded_motor(i + 1)
+                motor.set_effort(0.0)
+        except:
+            pass
+        # Don't lose settings changed just before exit
+        try:
+            config.flush()
+        except Exception as e:
+            print("Config save failed:", e)
\ No newline at end of file